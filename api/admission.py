@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Tuple
+
+from fastapi import HTTPException
+
+import metrics
+
+# ================= CONFIG =================
+def _parse_lanes(raw: str) -> Dict[str, Tuple[int, int, float]]:
+    # "chat=8/32/2.0,shap=2/8/3" -> name=concurrency/queue/latency budget in seconds
+    lanes = {}
+    for item in raw.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            limit, queue, budget = value.split("/")
+            lanes[name.strip()] = (int(limit), int(queue), float(budget))
+    return lanes
+
+
+LANES = {
+    "chat": (8, 32, 2.0),
+    "predict": (4, 32, 1.0),
+    "timeline": (2, 8, 5.0),
+    "habit": (4, 32, 1.0),
+    "shap": (2, 8, 3.0),
+    **_parse_lanes(os.getenv("ADMISSION_LANES", "")),
+}
+RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+SERVICE_EWMA = 0.2  # weight of the newest request in the service-time estimate
+
+
+# ================= LANES =================
+class Overloaded(HTTPException):
+    """503 raised when a lane sheds a request; callers with a cheap fallback catch it to degrade."""
+
+
+class Lane:
+    """Concurrency limit + bounded FIFO queue for one endpoint group.
+
+    A request runs at once when a slot is free, otherwise it queues. It is shed
+    (503 + Retry-After) up front when the queue is full or the expected wait
+    (queue position x average service time / slots) is over the latency budget,
+    and also when it has waited the whole budget. Priority requests take a slot
+    straight away, even past the limit, and are never shed; their slots are
+    counted apart, so finishing one never admits an extra normal request.
+
+    All bookkeeping happens on the event loop, so no locks are needed.
+    """
+
+    def __init__(self, name: str, limit: int, queue: int, budget: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue = max(0, queue)
+        self.budget = budget
+        self.active = 0            # normal requests holding one of the `limit` slots
+        self.priority_active = 0   # priority requests, on top of the limit
+        self.service_s = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def expected_wait(self) -> float:
+        return (len(self._waiters) + 1) / self.limit * self.service_s
+
+    def _shed(self, reason: str):
+        metrics.inc(f"admission.shed[{self.name}]")
+        raise Overloaded(
+            status_code=503,
+            detail=f"Server is busy ({reason}), please retry",
+            headers={"Retry-After": str(RETRY_AFTER_S)},
+        )
+
+    async def _acquire(self, priority: bool):
+        if priority:
+            metrics.inc(f"admission.priority[{self.name}]")
+            self.priority_active += 1
+            return
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            metrics.inc(f"admission.admitted[{self.name}]")
+            return
+        if len(self._waiters) >= self.queue:
+            self._shed("queue full")
+        if self.expected_wait() > self.budget:
+            self._shed("latency budget")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        metrics.inc(f"admission.queued[{self.name}]")
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.budget)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self._shed("timed out in queue")
+        except asyncio.CancelledError:  # client went away while queued
+            self._abandon(waiter)
+            raise
+        metrics.inc(f"admission.admitted[{self.name}]")
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done():
+            self._release()  # a slot was handed over just as we gave up; pass it on
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def _release(self, priority: bool = False):
+        if priority:
+            self.priority_active -= 1
+            return
+        # Hand the slot straight to the next live waiter so nobody can jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self, priority: bool = False):
+        await self._acquire(priority)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.service_s = elapsed if self.service_s == 0 else (1 - SERVICE_EWMA) * self.service_s + SERVICE_EWMA * elapsed
+            self._release(priority)
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "priority_active": self.priority_active,
+            "queued": len(self._waiters),
+            "limit": self.limit,
+            "queue": self.queue,
+            "budget_s": self.budget,
+            "service_ms": round(self.service_s * 1000, 2),
+        }
+
+
+ADMISSION: Dict[str, Lane] = {name: Lane(name, *spec) for name, spec in LANES.items()}
+
+
+def snapshot() -> Dict[str, dict]:
+    return {name: lane.snapshot() for name, lane in ADMISSION.items()}
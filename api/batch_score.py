@@ -0,0 +1,194 @@
+"""Offline emotion + intent scoring for large text exports.
+
+    python batch_score.py journals.csv scored.csv --text-column entry --id-column entry_id
+    python batch_score.py chats.jsonl scored.jsonl --workers 8 --no-emotion
+
+Input is streamed in chunks and fanned out to a process pool; each worker loads
+the active models once. Results are appended in input order and a checkpoint is
+written after every chunk, so rerunning the same command after an interruption
+resumes where it stopped. Emotion labels follow /api/predict (keyword override,
+then the model with its Neutral handling) without the request-size limits, and
+intents follow predict_intent.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+CHUNK_ROWS = 2000
+OUTPUT_FIELDS = ["row", "id", "emotion", "emotion_confidence", "secondary_emotion", "intent", "intent_confidence"]
+
+Row = Tuple[int, str, str]  # (row number, id, text)
+
+# ================= WORKER =================
+_models = {}
+
+
+def _init_worker(kinds: List[str]):
+    # Runs once per worker process: import the serving code and activate the same model versions
+    from model_registry import REGISTRY
+    for kind in kinds:
+        _models[kind] = REGISTRY.activate(kind, persist=False)
+
+
+def score_chunk(rows: List[Row]) -> List[dict]:
+    import inference
+    from chatbot_engine import predict_intent_batch
+
+    em, im = _models.get("emotion"), _models.get("intent")
+    cleaned = [inference.clean_text(text or "") for _, _, text in rows]
+    results = [{"row": row_no, "id": row_id} for row_no, row_id, _ in rows]
+
+    if em is not None:
+        todo = [i for i, t in enumerate(cleaned) if t and not inference.get_keyword_emotion(t)]
+        probs = inference.emotion_probs(em, [cleaned[i] for i in todo]) if todo else []
+        decided = dict(zip(todo, (inference.decide_emotion(em, p) for p in probs)))
+        for i, text in enumerate(cleaned):
+            if not text:
+                continue
+            override = inference.get_keyword_emotion(text)
+            d = inference.PredictResponse(emotion=override, confidence=1.0) if override else decided[i]
+            results[i].update(emotion=d.emotion, emotion_confidence=round(d.confidence, 6), secondary_emotion=d.secondary_emotion)
+
+    if im is not None:
+        todo = [i for i, t in enumerate(cleaned) if t]
+        for i, (tag, conf) in zip(todo, predict_intent_batch([cleaned[i] for i in todo], im)):
+            results[i].update(intent=tag, intent_confidence=round(conf, 6))
+    return results
+
+
+# ================= INPUT / OUTPUT =================
+def read_rows(path: str, text_column: str, id_column: Optional[str], skip: int = 0) -> Iterator[Row]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for row_no, record in enumerate(records):
+            if row_no < skip:
+                continue
+            row_id = record.get(id_column, "") if id_column else row_no
+            yield row_no, str(row_id), record.get(text_column) or ""
+
+
+def chunked(rows: Iterator[Row], size: int) -> Iterator[List[Row]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ResultWriter:
+    """Appends scored chunks to CSV/JSONL and records a checkpoint after each one."""
+
+    def __init__(self, path: str, input_path: str, resume: bool):
+        self.path = path
+        self.checkpoint_path = path + ".ckpt"
+        self.is_csv = path.endswith(".csv")
+        self.input_path = os.path.abspath(input_path)
+        state = self._read_checkpoint() if resume else None
+        self.rows_done = state["rows_done"] if state else 0
+        if state:
+            # Drop anything written after the last checkpoint (a chunk cut off mid-write)
+            with open(path, "r+b") as f:
+                f.truncate(state["output_bytes"])
+            self.f = open(path, "a", encoding="utf-8", newline="")
+        else:
+            self.f = open(path, "w", encoding="utf-8", newline="")
+            if self.is_csv:
+                csv.writer(self.f).writerow(OUTPUT_FIELDS)
+        self.csv = csv.DictWriter(self.f, fieldnames=OUTPUT_FIELDS) if self.is_csv else None
+
+    def _read_checkpoint(self) -> Optional[dict]:
+        if not (os.path.exists(self.checkpoint_path) and os.path.exists(self.path)):
+            return None
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("input") != self.input_path:
+            raise SystemExit(f"{self.checkpoint_path} belongs to {state.get('input')}, not {self.input_path}")
+        return state
+
+    def write(self, results: List[dict]):
+        for r in results:
+            if self.csv:
+                self.csv.writerow(r)
+            else:
+                self.f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.rows_done += len(results)
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"input": self.input_path, "rows_done": self.rows_done, "output_bytes": self.f.tell()}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def close(self, finished: bool):
+        self.f.close()
+        if finished and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+# ================= RUN =================
+def run(args) -> int:
+    kinds = [k for k, off in (("emotion", args.no_emotion), ("intent", args.no_intent)) if not off]
+    if not kinds:
+        raise SystemExit("Nothing to score: both --no-emotion and --no-intent given")
+    writer = ResultWriter(args.output, args.input, resume=not args.restart)
+    if writer.rows_done:
+        print(f"Resuming after {writer.rows_done} rows", file=sys.stderr)
+
+    chunks = chunked(read_rows(args.input, args.text_column, args.id_column, skip=writer.rows_done), args.chunk_rows)
+    t0 = time.perf_counter()
+    scored = 0
+    finished = False
+    try:
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(kinds,)) as pool:
+            # Keep a bounded window of chunks in flight and write them back strictly in order
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(score_chunk, chunk))
+                if len(pending) >= args.workers * 2:
+                    scored += _drain(pending.popleft(), writer, scored, t0)
+            while pending:
+                scored += _drain(pending.popleft(), writer, scored, t0)
+        finished = True
+    finally:
+        writer.close(finished)
+    elapsed = time.perf_counter() - t0
+    print(f"Scored {scored} rows in {elapsed:.1f}s ({scored / max(elapsed, 1e-9):.0f} rows/s, {args.workers} workers)", file=sys.stderr)
+    return scored
+
+
+def _drain(future, writer: ResultWriter, scored: int, t0: float) -> int:
+    results = future.result()
+    writer.write(results)
+    done = scored + len(results)
+    print(f"  {writer.rows_done} rows written, {done / (time.perf_counter() - t0):.0f} rows/s", file=sys.stderr)
+    return len(results)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Score a CSV/JSONL text export with the emotion and intent models.")
+    p.add_argument("input", help=".csv or .jsonl input")
+    p.add_argument("output", help=".csv or .jsonl output (appended; a .ckpt file next to it tracks progress)")
+    p.add_argument("--text-column", default="text")
+    p.add_argument("--id-column", default=None, help="column copied to the output 'id' (default: row number)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    p.add_argument("--no-emotion", action="store_true")
+    p.add_argument("--no-intent", action="store_true")
+    p.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,147 @@
+"""Latency vs accuracy of candidate habit regressors, as a Pareto table.
+
+    python bench_habit_models.py --csv habits.csv
+    python bench_habit_models.py --csv habits.csv --export hgb --out data/trained/mood_score_model.pkl
+
+Every candidate is a Pipeline([("scaler", MinMaxScaler()), ("model", ...)]) fitted
+on the same columns as the shipped mood_score_model.pkl, so any of them loads as
+a drop-in replacement (forests through the compiled engine, everything else
+through sklearn; SHAP via TreeExplainer or shap_summary.BackgroundExplainer).
+Accuracy is on a seeded 80/20 split; --export refits the chosen candidate on
+all rows. Columns:
+
+    single_ms   median sklearn predict() of one DataFrame row, as /api/habit-prediction
+    engine_ms   same through the compiled NumPy forest (forests only)
+    rows_per_s  batch predict() throughput over --batch rows
+    shap_ms     SHAP per row over 200 rows, explainer construction excluded
+    size_kb     pickled artifact size, a proxy for resident memory
+"""
+import argparse
+import pickle
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import RidgeCV
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler, PolynomialFeatures
+
+from forest_engine import compile_forest, is_forest
+from shap_summary import make_explainer
+from train_models import HABIT_COLUMNS, HABIT_TARGET, SEED
+
+ALPHAS = np.logspace(-3, 3, 13)
+
+CANDIDATES = {
+    "rf400": RandomForestRegressor(n_estimators=400, random_state=SEED),  # shipped model
+    "rf100_d12": RandomForestRegressor(n_estimators=100, max_depth=12, min_samples_leaf=2, random_state=SEED),
+    "rf30_d8": RandomForestRegressor(n_estimators=30, max_depth=8, min_samples_leaf=3, random_state=SEED),
+    "hgb": HistGradientBoostingRegressor(max_iter=200, learning_rate=0.05, random_state=SEED),
+    "hgb_small": HistGradientBoostingRegressor(max_iter=80, max_depth=4, learning_rate=0.1, random_state=SEED),
+    "ridge": RidgeCV(alphas=ALPHAS),
+    "ridge_poly2": Pipeline([("poly", PolynomialFeatures(2, include_bias=False)), ("ridge", RidgeCV(alphas=ALPHAS))]),
+    "ridge_poly3": Pipeline([("poly", PolynomialFeatures(3, include_bias=False)), ("ridge", RidgeCV(alphas=ALPHAS))]),
+}
+
+
+def habit_pipeline(model) -> Pipeline:
+    return Pipeline([("scaler", MinMaxScaler()), ("model", clone(model))])
+
+
+def median_ms(fn, repeat: int) -> float:
+    fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times)) * 1000
+
+
+def measure(name: str, pipeline: Pipeline, X_train, y_train, X_test, y_test, batch: pd.DataFrame, repeat: int) -> dict:
+    t0 = time.perf_counter()
+    pipeline.fit(X_train, y_train)
+    fit_s = time.perf_counter() - t0
+    pred = pipeline.predict(X_test)
+    one = X_test.iloc[:1]
+    row = {
+        "name": name,
+        "mae": mean_absolute_error(y_test, pred),
+        "r2": r2_score(y_test, pred),
+        "fit_s": fit_s,
+        "single_ms": median_ms(lambda: pipeline.predict(one), repeat),
+        "engine_ms": None,
+    }
+    if is_forest(pipeline):
+        engine = compile_forest(pipeline)
+        raw = one.to_numpy(dtype=np.float64)
+        row["engine_ms"] = median_ms(lambda: engine.predict(raw), repeat)
+    t0 = time.perf_counter()
+    pipeline.predict(batch)
+    row["rows_per_s"] = len(batch) / (time.perf_counter() - t0)
+
+    explainer = make_explainer(pipeline)
+    scaled = pipeline.named_steps["scaler"].transform(X_test.iloc[:200])
+    explainer.shap_values(scaled[:1])  # shap sets up its masks on the first call
+    t0 = time.perf_counter()
+    explainer.shap_values(scaled)
+    row["shap_ms"] = (time.perf_counter() - t0) / len(scaled) * 1000
+    row["size_kb"] = len(pickle.dumps(pipeline, protocol=pickle.HIGHEST_PROTOCOL)) / 1024
+    return row
+
+
+def pareto(rows):
+    # A candidate is dominated when another is no worse on every cost and accuracy, and better on one
+    keys = ["mae", "single_ms", "shap_ms", "size_kb"]
+    for r in rows:
+        r["pareto"] = not any(
+            all(o[k] <= r[k] for k in keys) and any(o[k] < r[k] for k in keys) for o in rows if o is not r
+        )
+    return rows
+
+
+def print_table(rows):
+    print(f"{'':2}{'model':12} {'mae':>7} {'r2':>7} {'fit_s':>7} {'single_ms':>10} {'engine_ms':>10} "
+          f"{'rows_per_s':>11} {'shap_ms':>8} {'size_kb':>9}")
+    for r in sorted(rows, key=lambda r: r["mae"]):
+        engine = f"{r['engine_ms']:10.3f}" if r["engine_ms"] is not None else f"{'-':>10}"
+        print(f"{'*' if r['pareto'] else ' ':2}{r['name']:12} {r['mae']:7.4f} {r['r2']:7.4f} {r['fit_s']:7.2f} "
+              f"{r['single_ms']:10.3f} {engine} {r['rows_per_s']:11.0f} {r['shap_ms']:8.3f} {r['size_kb']:9.0f}")
+    print("* = Pareto-optimal on (mae, single_ms, shap_ms, size_kb)")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark candidate habit regressors behind the scaler interface.")
+    p.add_argument("--csv", required=True, help="habit dataset with the model's feature columns and the target")
+    p.add_argument("--target", default=HABIT_TARGET)
+    p.add_argument("--models", nargs="+", choices=list(CANDIDATES), default=list(CANDIDATES))
+    p.add_argument("--batch", type=int, default=10000)
+    p.add_argument("--repeat", type=int, default=200)
+    p.add_argument("--export", choices=list(CANDIDATES), help="refit this candidate on all rows and save it")
+    p.add_argument("--out", default="mood_score_model.candidate.pkl")
+    args = p.parse_args(argv)
+
+    df = pd.read_csv(args.csv)[HABIT_COLUMNS + [args.target]].dropna()
+    X, y = df[HABIT_COLUMNS], df[args.target].to_numpy(dtype=np.float64)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=SEED)
+    batch = X.sample(args.batch, replace=True, random_state=SEED)
+    print(f"{len(df)} rows ({len(X_train)} train / {len(X_test)} test)")
+
+    rows = [measure(name, habit_pipeline(CANDIDATES[name]), X_train, y_train, X_test, y_test, batch, args.repeat)
+            for name in args.models]
+    print_table(pareto(rows))
+
+    if args.export:
+        pipeline = habit_pipeline(CANDIDATES[args.export]).fit(X, y)
+        joblib.dump(pipeline, args.out)
+        print(f"Exported {args.export} to {args.out} "
+              f"(python model_registry.py register habit {args.out} <version>)")
+
+
+if __name__ == "__main__":
+    main()
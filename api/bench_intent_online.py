@@ -0,0 +1,130 @@
+"""Warm-started intent update vs a full retrain, on a held-out split of the intents data.
+
+    python bench_intent_online.py
+    python bench_intent_online.py --epochs 3 --lr 0.1 --anchor 0.2
+
+The intents patterns are split per class into train / "reviewed" / eval. A base
+model is fitted on train (same pipeline and hyperparameters as the shipped
+bundle), then brought up to date with the reviewed rows two ways: warm_update
+over the reviewed rows only, and a full refit on train + reviewed.
+
+The stream section replays the reviewed rows in --batch sized arrivals through
+the trainer's held-out split and accuracy guard, and reports how often updates
+are rejected. A rejection is counted as wrong when the candidate was not worse
+than the base on the eval patterns (beyond the tolerance), and an acceptance
+when it was.
+"""
+import argparse
+import copy
+import json
+import time
+from collections import defaultdict
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+
+from chatbot_engine import INTENTS_PATH, normalize_tag
+from intent_online import (ANCHOR, EPOCHS, LEARNING_RATE, MAX_ACCURACY_DROP, MIN_HELD_OUT, accepts, accuracy,
+                           split_held_out, warm_update)
+from linear_engine import INTENT_JOBLIB
+
+
+def split(bundle: dict, seed: int, reviewed_frac: float, eval_frac: float):
+    with open(INTENTS_PATH, "r", encoding="utf-8") as f:
+        intents = json.load(f)["intents"]
+    by_class = defaultdict(list)
+    for intent in intents:
+        for p in intent.get("patterns", []):
+            if p.strip():
+                by_class[normalize_tag(intent["tag"], bundle)].append(p)
+    rng = np.random.default_rng(seed)
+    parts = {"train": [], "reviewed": [], "eval": []}
+    for label, texts in sorted(by_class.items()):
+        texts = [texts[i] for i in rng.permutation(len(texts))]
+        n_eval = int(round(len(texts) * eval_frac)) if len(texts) >= 5 else 0
+        n_rev = int(round(len(texts) * reviewed_frac)) if len(texts) >= 5 else 0
+        parts["eval"] += [(t, label) for t in texts[:n_eval]]
+        parts["reviewed"] += [(t, label) for t in texts[n_eval: n_eval + n_rev]]
+        parts["train"] += [(t, label) for t in texts[n_eval + n_rev:]]
+    return parts
+
+
+def fit(bundle: dict, rows) -> dict:
+    out = copy.deepcopy({k: v for k, v in bundle.items() if k != "pipeline"})
+    out["pipeline"] = clone(bundle["pipeline"]).fit([t for t, _ in rows], [l for _, l in rows])
+    return out
+
+
+def stream(base: dict, reviewed, eval_rows, args, guard: bool = True) -> dict:
+    """Replay `reviewed` as OnlineIntentTrainer.update would see it, batch by batch (guard=False accepts everything)."""
+    order = np.random.default_rng(args.seed).permutation(len(reviewed))
+    rows = [reviewed[i] for i in order]
+    current, held, pending = base, [], []
+    stats = {"attempted": 0, "rejected": 0, "wrong_rejects": 0, "wrong_accepts": 0}
+    for i in range(0, len(rows), args.batch):
+        pending += rows[i: i + args.batch]
+        train, held_out = split_held_out(pending)
+        if len(held) + len(held_out) < MIN_HELD_OUT:
+            continue
+        candidate = warm_update(current, [t for t, _ in train], [l for _, l in train], args.epochs, args.lr, args.anchor)
+        ok = accepts(current, candidate, held + held_out, args.max_drop)[0] or not guard
+        worse = accuracy(candidate, eval_rows) < accuracy(current, eval_rows) - args.max_drop
+        stats["attempted"] += 1
+        if ok:
+            stats["wrong_accepts"] += int(worse)
+            current, held, pending = candidate, held + held_out, []
+        else:
+            stats["rejected"] += 1
+            stats["wrong_rejects"] += int(not worse)
+    stats["eval_accuracy"] = accuracy(current, eval_rows)
+    return stats
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark warm-started intent updates against a full retrain.")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--reviewed", type=float, default=0.15, help="share of each class used as reviewed messages")
+    p.add_argument("--eval", type=float, default=0.15)
+    p.add_argument("--epochs", type=int, default=EPOCHS)
+    p.add_argument("--lr", type=float, default=LEARNING_RATE)
+    p.add_argument("--anchor", type=float, default=ANCHOR)
+    p.add_argument("--batch", type=int, default=40, help="reviewed rows arriving between stream updates")
+    p.add_argument("--max-drop", type=float, default=MAX_ACCURACY_DROP, help="guard tolerance for the stream")
+    args = p.parse_args(argv)
+
+    shipped = joblib.load(INTENT_JOBLIB)
+    parts = split(shipped, args.seed, args.reviewed, args.eval)
+    print(f"train {len(parts['train'])}, reviewed {len(parts['reviewed'])}, eval {len(parts['eval'])} patterns")
+
+    t0 = time.perf_counter()
+    base = fit(shipped, parts["train"])
+    base_s = time.perf_counter() - t0
+
+    reviewed = parts["reviewed"]
+    t0 = time.perf_counter()
+    warm = warm_update(base, [t for t, _ in reviewed], [l for _, l in reviewed], args.epochs, args.lr, args.anchor)
+    warm_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    full = fit(shipped, parts["train"] + reviewed)
+    full_s = time.perf_counter() - t0
+
+    print(f"\n{'model':28}{'update':>10}{'eval acc':>10}{'reviewed':>10}{'train':>10}")
+    for name, bundle, secs in (("base (train only)", base, base_s), ("warm update (reviewed)", warm, warm_s),
+                               ("full retrain (all)", full, full_s)):
+        print(f"{name:28}{secs * 1000:>8.0f}ms{accuracy(bundle, parts['eval']):>10.1%}"
+              f"{accuracy(bundle, reviewed):>10.1%}{accuracy(bundle, parts['train']):>10.1%}")
+
+    print(f"\nstream of {len(reviewed)} reviewed rows in batches of {args.batch}, "
+          f"every held-out row kept (min {MIN_HELD_OUT}), tolerance {args.max_drop}")
+    print(f"{'guard':12}{'updates':>9}{'rejected':>10}{'rate':>8}{'wrong rej':>11}{'wrong acc':>11}{'eval acc':>10}")
+    for name, guard in (("on", True), ("off", False)):
+        st = stream(base, reviewed, parts["eval"], args, guard)
+        rate = st["rejected"] / max(st["attempted"], 1)
+        print(f"{name:12}{st['attempted']:>9}{st['rejected']:>10}{rate:>8.0%}{st['wrong_rejects']:>11}"
+              f"{st['wrong_accepts']:>11}{st['eval_accuracy']:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,21 @@
 import json
-import joblib
 import random
 import re
 from dataclasses import dataclass, asdict
-from typing import Optional, Tuple, List
-from difflib import SequenceMatcher
+from typing import Optional, Tuple, List, Dict
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
 import traceback
+import hashlib
+import threading
+import time
+from model_registry import REGISTRY, LoadedModel
+from fuzzy_index import FuzzyIndex
+from flow_router import FlowRouter, build_flow_router
+from pattern_index import PatternIndex, build_pattern_index
+from circuit_breaker import CircuitBreaker
+import metrics
 
 load_dotenv()
 
@@ -16,29 +23,138 @@ load_dotenv()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 INTENTS_PATH = os.path.join(DATA_DIR, "intents chatbot nd4.json")
-MODEL_PATH = os.path.join(DATA_DIR, "intent_model_best_final.joblib")
 FLOW_PATH = os.path.join(DATA_DIR, "chat_flow.json")
 SHOW_DEBUG = False
 TOPK = 3
 MIN_CONF = 0.30
+PATTERN_MATCH_THRESHOLD = float(os.getenv("PATTERN_MATCH_THRESHOLD", "0.85"))  # cosine for a near-duplicate pattern
+# Cosine a free-text message needs to be routed onto a flow node; > 1 disables routing. One generic
+# shared word ("good", "times") scores up to ~0.14, so the bar sits just above that
+ROUTE_THRESHOLD = float(os.getenv("FLOW_ROUTE_THRESHOLD", "0.15"))
 RE_WS = re.compile(r"\s+")
 RE_NON_WORD = re.compile(r'[^\w\s]')
+RE_WORD = re.compile(r"[a-z']+")
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "8"))
+GEMINI_MIN_S = 0.5  # don't start an LLM call with less time than this left on the deadline
 
 # ================= LOAD =================
-with open(INTENTS_PATH, "r", encoding="utf-8") as f:
-    intents_json = json.load(f)
-
-RESPONSES = {i["tag"]: i.get("responses", []) for i in intents_json.get("intents", [])}
-
-with open(FLOW_PATH, "r", encoding="utf-8") as f:
-    CHAT_FLOW = json.load(f)
-
-bundle = joblib.load(MODEL_PATH)
-model = bundle["pipeline"]
-MERGE_MAP = bundle.get("merge_map", {})
-CONF_THRESHOLD = float(bundle.get("confidence_threshold", MIN_CONF))
-FACT_TAG = bundle.get("fact_tag", "fact")
-CLASSES: List[str] = model.classes_.tolist()
+@dataclass(frozen=True)
+class FlowData:
+    """One immutable, validated snapshot of the chat flow + intents data.
+
+    `respond` reads the module-level FLOW once per call, so a reload that swaps
+    FLOW never hands an in-flight request a half-updated mix of old and new data.
+    """
+    version: str
+    chat_flow: Dict[str, dict]
+    responses: Dict[str, List[str]]
+    option_index: Dict[str, Dict[str, dict]]   # node id -> cleaned option label -> option
+    option_keys: Dict[str, Dict[str, dict]]    # node id -> label words joined without spaces -> option
+    label_index: FuzzyIndex                    # words used in any option label
+    lexicon_index: FuzzyIndex                  # lexicon words; words seen in the intents data are left alone
+    router: FlowRouter                         # free text -> nearest node
+    patterns: PatternIndex                     # free text -> nearest intent patterns
+    warnings: List[str]
+    loaded_at: float
+    load_ms: float
+
+def clean_label(text: str) -> str:
+    # Lowercase and strip emojis/punctuation so button text matches typed text
+    return RE_NON_WORD.sub('', RE_WS.sub(" ", text.strip()).lower()).strip()
+
+def validate_flow(chat_flow: dict, responses: dict) -> List[str]:
+    # Structural problems raise; soft issues the runtime already tolerates come back as warnings
+    if not isinstance(chat_flow, dict) or not chat_flow:
+        raise ValueError("chat_flow.json must be a non-empty object")
+    if "start" not in chat_flow:
+        raise ValueError("chat_flow.json has no 'start' node")
+    warnings = []
+    for node_id, node in chat_flow.items():
+        if not isinstance(node, dict) or not isinstance(node.get("message"), str):
+            raise ValueError(f"Node '{node_id}' needs a 'message' string")
+        options = node.get("options", [])
+        if not isinstance(options, list):
+            raise ValueError(f"Node '{node_id}' options must be a list")
+        for opt in options:
+            if not isinstance(opt, dict) or not isinstance(opt.get("label"), str) or not isinstance(opt.get("next"), str):
+                raise ValueError(f"Node '{node_id}' has an option without 'label'/'next'")
+            if opt["next"] not in chat_flow:
+                warnings.append(f"{node_id} -> {opt['next']}: unknown node, falls back to start")
+        tag = node.get("tag")
+        if tag and tag not in responses:
+            warnings.append(f"{node_id}: tag '{tag}' has no responses")
+    return warnings
+
+def load_flow_data() -> FlowData:
+    t0 = time.perf_counter()
+    with open(INTENTS_PATH, "rb") as f:
+        intents_raw = f.read()
+    with open(FLOW_PATH, "rb") as f:
+        flow_raw = f.read()
+
+    intents_json = json.loads(intents_raw.decode("utf-8"))
+    chat_flow = json.loads(flow_raw.decode("utf-8"))
+    responses = {i["tag"]: i.get("responses", []) for i in intents_json.get("intents", [])}
+    warnings = validate_flow(chat_flow, responses)
+
+    option_index, option_keys = {}, {}
+    for node_id, node in chat_flow.items():
+        labels = option_index[node_id] = {}
+        keys = option_keys[node_id] = {}
+        for opt in node.get("options", []):
+            label = clean_label(opt["label"])
+            labels.setdefault(label, opt)  # first option wins, as before
+            keys.setdefault("".join(label.split()), opt)
+    label_words = {w for labels in option_index.values() for label in labels for w in label.split()}
+    corpus_words = {
+        w for i in intents_json.get("intents", [])
+        for line in i.get("patterns", []) + i.get("responses", []) for w in RE_WORD.findall(line.lower())
+    }
+    version = hashlib.sha256(intents_raw + b"\0" + flow_raw).hexdigest()[:12]
+    return FlowData(
+        version=version,
+        chat_flow=chat_flow,
+        responses=responses,
+        option_index=option_index,
+        option_keys=option_keys,
+        label_index=FuzzyIndex(label_words),
+        lexicon_index=FuzzyIndex(LEXICON_WORDS, known=corpus_words),
+        router=build_flow_router(chat_flow, {i["tag"]: i.get("patterns", []) for i in intents_json.get("intents", [])}),
+        patterns=build_pattern_index(intents_json.get("intents", [])),
+        warnings=warnings,
+        loaded_at=time.time(),
+        load_ms=round((time.perf_counter() - t0) * 1000, 2),
+    )
+
+_reload_lock = threading.Lock()
+
+def reload_flow_data() -> FlowData:
+    # Parse + validate off to the side, then swap the single FLOW reference
+    global FLOW
+    with _reload_lock:
+        new_flow = load_flow_data()
+        if new_flow.version != FLOW.version:
+            FLOW = new_flow
+            print(f"Chat flow reloaded: version {new_flow.version} in {new_flow.load_ms} ms")
+        return FLOW
+
+def flow_file_mtimes() -> Tuple[float, float]:
+    return os.path.getmtime(INTENTS_PATH), os.path.getmtime(FLOW_PATH)
+
+def watch_flow_files(interval: float, stop: threading.Event):
+    # Poll the data files and reload when either changes; bad edits keep the old data
+    last = flow_file_mtimes()
+    while not stop.wait(interval):
+        try:
+            current = flow_file_mtimes()
+            if current != last:
+                last = current
+                reload_flow_data()
+        except Exception as e:
+            print(f"Chat flow reload failed, keeping version {FLOW.version}: {e}")
+
+# Intent bundle (pipeline, merge_map, confidence_threshold, fact_tag) is served from the model
+# registry; main.py loads it in the background at startup.
 
 # ================= GEMINI SETUP =================
 GEMINI_KEY = os.getenv("GEMINI_API_KEY")
@@ -48,6 +164,14 @@ if GEMINI_KEY and GEMINI_KEY != "your_api_key_here":
 else:
     gemini_model = None
 
+# Opens after consecutive errors or slow calls; /chat then answers from the intent model instead of waiting
+GEMINI_BREAKER = CircuitBreaker(
+    "gemini",
+    failures=int(os.getenv("GEMINI_BREAKER_FAILURES", "3")),
+    slow_s=float(os.getenv("GEMINI_BREAKER_SLOW_S", "5")),
+    open_s=float(os.getenv("GEMINI_BREAKER_OPEN_S", "30")),
+)
+
 # ================= STATE =================
 @dataclass
 class ChatState:
@@ -69,17 +193,16 @@ def norm(text: str) -> str:
 def low(text: str) -> str:
     return norm(text).lower()
 
-def tokens(text: str) -> List[str]:
-    return re.findall(r"[a-zA-Z']+", low(text))
-
-def similarity(a: str, b: str) -> float:
-    return SequenceMatcher(None, a, b).ratio()
+def correct_lexicon(text: str, flow: Optional[FlowData] = None) -> str:
+    # Snap misspelled lexicon words ("suicde" -> "suicide"); real words are never rewritten
+    flow = flow or FLOW
+    return " ".join(flow.lexicon_index.correct(low(text).split()))
 
-def fuzzy_word_in_text(text: str, target: str, thresh: float = 0.78) -> bool:
-    for tok in tokens(text):
-        if similarity(tok, target) >= thresh:
-            return True
-    return False
+def match_option(clean_s: str, node_id: str, flow: Optional[FlowData] = None) -> Optional[dict]:
+    # Typo-tolerant option match: fix each word against the label words, then compare without spaces
+    flow = flow or FLOW
+    key = "".join(flow.label_index.correct(clean_s.split()))
+    return flow.option_keys.get(node_id, {}).get(key)
 
 def contains_any_phrase(text: str, phrases) -> bool:
     t = low(text)
@@ -91,36 +214,79 @@ def safe_return(msg: Optional[str]) -> str:
     return msg
 
 # ================= MODEL HELPERS =================
-def normalize_tag(tag: str) -> str:
+def intent_model() -> LoadedModel:
+    m = REGISTRY.active("intent")
+    if m is None:
+        raise RuntimeError("Intent model is not loaded")
+    return m
+
+def confidence_threshold(m: Optional[LoadedModel] = None) -> float:
+    m = m or intent_model()
+    return float(m.artifact.get("confidence_threshold", MIN_CONF))
+
+def normalize_tag(tag: str, bundle: Optional[dict] = None) -> str:
+    bundle = intent_model().artifact if bundle is None else bundle
     if re.fullmatch(r"fact-\d+", tag or ""):
-        return FACT_TAG
-    return MERGE_MAP.get(tag, tag)
+        return bundle.get("fact_tag", "fact")
+    return bundle.get("merge_map", {}).get(tag, tag)
 
-def predict_topk(text: str, k: int = TOPK) -> List[Tuple[str, float]]:
+def predict_topk(text: str, k: int = TOPK, m: Optional[LoadedModel] = None) -> List[Tuple[str, float]]:
+    m = m or intent_model()
+    model = m.engine or m.artifact["pipeline"]
     probs = model.predict_proba([text])[0]
+    classes = model.classes_
     idxs = probs.argsort()[::-1][:k]
-    return [(normalize_tag(CLASSES[int(i)]), float(probs[int(i)])) for i in idxs]
+    return [(normalize_tag(str(classes[int(i)]), m.artifact), float(probs[int(i)])) for i in idxs]
 
-def predict_intent(text: str) -> Tuple[str, float, List[Tuple[str, float]]]:
-    topk = predict_topk(text, TOPK)
+def predict_intent(text: str, m: Optional[LoadedModel] = None) -> Tuple[str, float, List[Tuple[str, float]]]:
+    topk = predict_topk(text, TOPK, m)
     best_tag, best_conf = topk[0]
     return best_tag, best_conf, topk
 
-def pick_response(tag: str, default: str) -> str:
-    if tag in RESPONSES and RESPONSES[tag]:
-        return random.choice(RESPONSES[tag])
-    if "fallback" in RESPONSES and RESPONSES["fallback"]:
-        return random.choice(RESPONSES["fallback"])
+def predict_intent_batch(texts: List[str], m: Optional[LoadedModel] = None) -> List[Tuple[str, float]]:
+    # Best (tag, confidence) per text from one model call; used by offline scoring
+    m = m or intent_model()
+    model = m.engine or m.artifact["pipeline"]
+    if not texts:
+        return []
+    probs = model.predict_proba(texts)
+    best = probs.argmax(axis=1)
+    return [(normalize_tag(str(model.classes_[j]), m.artifact), float(p[j])) for p, j in zip(probs, best)]
+
+def retrieve_topk(text: str, k: int = TOPK, flow: Optional[FlowData] = None) -> List[Tuple[str, float]]:
+    # Nearest intent patterns by cosine; a second opinion next to predict_topk
+    flow = flow or FLOW
+    return [(tag, score) for tag, _, score in flow.patterns.search(text, k)]
+
+def response_list(tag: str, responses: Dict[str, List[str]], bundle: Optional[dict] = None) -> List[str]:
+    # A merged class with no responses of its own ("negative") draws from the intents tags merged into it
+    if responses.get(tag) or bundle is None:
+        return responses.get(tag, [])
+    return [r for raw, label in bundle.get("merge_map", {}).items() if label == tag for r in responses.get(raw, [])]
+
+def pick_response(tag: str, default: str, responses: Optional[Dict[str, List[str]]] = None,
+                  bundle: Optional[dict] = None) -> str:
+    responses = FLOW.responses if responses is None else responses
+    pool = response_list(tag, responses, bundle)
+    if pool:
+        return random.choice(pool)
+    if "fallback" in responses and responses["fallback"]:
+        return random.choice(responses["fallback"])
     return default
 
 def is_crisis(text: str) -> bool:
     t = low(text)
-    return any(word in t for word in SELF_HARM_PHRASES)
+    if RE_SELF_HARM.search(t):
+        return True
+    return bool(RE_SELF_HARM.search(correct_lexicon(t)))
 
-def gemini_fallback(user_text: str) -> str:
+def gemini_fallback(user_text: str, timeout: float = GEMINI_TIMEOUT_S) -> Optional[str]:
+    # None when the breaker is open or the call fails; the caller answers from the intent model instead
     if not gemini_model:
         return "I'm having a little trouble connecting to my creative side right now, but I'm here for you. 💙"
-    
+    if not GEMINI_BREAKER.allow():
+        return None
+
     prompt = f"""
 You are Pandora AI inside the Mental Scope app.
 You are supportive, calm, friendly, empathetic and safe.
@@ -130,17 +296,23 @@ Never encourage self-harm.
 
 User: {user_text}
 """
+    t0 = time.perf_counter()
     try:
-        response = gemini_model.generate_content(prompt)
-        return response.text
+        response = gemini_model.generate_content(prompt, request_options={"timeout": timeout})
+        reply = response.text
     except Exception as e:
+        GEMINI_BREAKER.record_failure()
         print(f"Gemini Error: {e}")
-        return "I'm here for you. Tell me more about what's on your mind."
+        return None
+    GEMINI_BREAKER.record_success(time.perf_counter() - t0)
+    return reply
 
 # ================= LEXICONS =================
 YES = {"yes", "yeah", "yup", "ok", "okay", "sure", "haan", "y"}
 NO = {"no", "nope", "nah"}
 SELF_HARM_PHRASES = {"kill myself", "suicide", "want to die", "end it all", "hurt myself", "cut myself"}
+# Whole words only: "want to diet" is not "want to die"
+RE_SELF_HARM = re.compile(r"\b(?:" + "|".join(sorted(map(re.escape, SELF_HARM_PHRASES))) + r")\b")
 GRIEF_PHRASES = {"died", "passed away", "death", "funeral", "lost my", "rip"}
 PET_WORDS = {"cat", "dog", "pet", "puppy", "kitten", "hamster", "parrot"}
 LONELY_PHRASES = {"no one talks to me", "nobody talks to me", "no one cares", "nobody cares", "i feel alone", "lonely", "i feel lonely"}
@@ -148,6 +320,12 @@ NEG_WORDS = {"sad", "depressed", "anxious", "overwhelmed", "stressed", "stress",
 COPING_WORDS = {"coping", "cope", "tips", "technique", "help"}
 INFO_WORDS = {"information", "info", "explain", "meaning"}
 LOVE_WORDS = {"in love", "love", "crush", "romantic", "relationship"}
+LEXICON_WORDS = {
+    w for group in (YES, NO, SELF_HARM_PHRASES, GRIEF_PHRASES, PET_WORDS, LONELY_PHRASES, NEG_WORDS, COPING_WORDS, INFO_WORDS, LOVE_WORDS)
+    for phrase in group for w in phrase.split()
+}
+
+FLOW = load_flow_data()
 
 def is_yes(s: str) -> bool:
     s = low(s)
@@ -159,7 +337,7 @@ def is_no(s: str) -> bool:
 
 def detect_topic_from_text(text: str) -> str:
     t = low(text)
-    if contains_any_phrase(t, SELF_HARM_PHRASES): return "crisis"
+    if RE_SELF_HARM.search(t): return "crisis"
     if contains_any_phrase(t, GRIEF_PHRASES) and any(w in t for w in PET_WORDS): return "grief"
     if ("alone" in t) or ("lonely" in t) or contains_any_phrase(t, LONELY_PHRASES): return "loneliness"
     if contains_any_phrase(t, LOVE_WORDS): return "love"
@@ -235,72 +413,180 @@ def handle_coping_followup(user_text: str, state: ChatState) -> str:
         return "Pick one:\n1) **Breathing**\n2) **Grounding**\n3) **Back**"
     return "That’s okay. I'm here if you need anything else."
 
-def respond(user_text: str, state_dict: dict) -> Tuple[str, dict, List[dict]]:
+def node_reply(node: dict, flow: FlowData) -> str:
+    # If the node has a tag, use a response from the dataset
+    tag = node.get("tag")
+    if tag and tag in flow.responses:
+        return pick_response(tag, node["message"], flow.responses)
+    return node["message"]
+
+def response_pool(node: dict, flow: FlowData) -> Optional[str]:
+    # Key of the flow.responses list node_reply picks from; None means the node's own message
+    tag = node.get("tag")
+    if not tag or tag not in flow.responses:
+        return None
+    if flow.responses[tag]:
+        return tag
+    return "fallback" if flow.responses.get("fallback") else None
+
+_flow_json: Tuple[str, bytes] = ("", b"")
+
+def flow_json(flow: FlowData) -> bytes:
+    """The button graph for GET /api/flow, serialized once per flow version.
+
+    Option targets are resolved the way `respond` resolves them (unknown nodes
+    go to start), and each node names the response pool a button press into it
+    picks from, so a client can walk button-only paths without a round trip.
+    The opening message of a session is the start node's `message`.
+    """
+    global _flow_json
+    version, body = _flow_json
+    if version != flow.version:
+        chat_flow = flow.chat_flow
+        nodes, pools = {}, {}
+        for node_id, node in chat_flow.items():
+            pool = response_pool(node, flow)
+            if pool:
+                pools[pool] = flow.responses[pool]
+            nodes[node_id] = {
+                "message": node["message"],
+                "pool": pool,
+                "options": [
+                    {"label": opt["label"], "next": opt["next"] if opt["next"] in chat_flow else "start"}
+                    for opt in node.get("options", [])
+                ],
+            }
+        doc = {"version": flow.version, "start": "start", "nodes": nodes, "responses": pools}
+        body = json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        _flow_json = (flow.version, body)
+    return body
+
+BUSY_REPLY ="I'm getting a lot of messages right now, so my replies are simpler for a moment. 💙 What would help most — pick one below, or tell me more."
+
+def remaining(deadline: Optional[float]) -> float:
+    # Seconds left before a time.monotonic() deadline (None = no deadline)
+    return float("inf") if deadline is None else deadline - time.monotonic()
+
+def intent_fallback_reply(text: str, topk: List[Tuple[str, float]], flow: FlowData, bundle: Optional[dict] = None) -> str:
+    # Best guess without the LLM: the model's top-k tags (or nearest patterns, normalized the same way) that have responses
+    candidates = topk or [(normalize_tag(t, bundle) if bundle else t, sc) for t, sc in retrieve_topk(text, TOPK, flow)]
+    for tag, _ in candidates:
+        pool = response_list(tag, flow.responses, bundle)
+        if tag != "fallback" and pool:
+            return random.choice(pool)
+    return "I'm here for you. Tell me more about what's on your mind."
+
+def respond(user_text: str, state_dict: dict, degraded: bool = False, deadline: Optional[float] = None,
+            crisis: Optional[bool] = None, intent: Optional[LoadedModel] = None) -> Tuple[str, dict, List[dict]]:
+    reply, state, options, _ = respond_turn(user_text, state_dict, degraded, deadline, crisis, intent)
+    return reply, state, options
+
+def respond_turn(user_text: str, state_dict: dict, degraded: bool = False, deadline: Optional[float] = None,
+                 crisis: Optional[bool] = None,
+                 intent: Optional[LoadedModel] = None) -> Tuple[str, dict, List[dict], Optional[LoadedModel]]:
+    # respond(), plus the intent model whose prediction chose the reply (None when another stage answered).
+    # degraded=True (server overloaded) keeps the cheap in-process stages and skips the intent model and Gemini.
+    # deadline (time.monotonic()) bounds the whole request: the intent model is skipped once it has
+    # passed, and Gemini only gets the time that is left.
+    # crisis: is_crisis() of the full message when user_text has been truncated for the models.
+    # intent: the caller's registry snapshot; read once here when not given.
     state = ChatState(**state_dict)
     text = norm(user_text)
     s = low(text)
+    flow = FLOW  # one snapshot for the whole request, even if a reload swaps FLOW meanwhile
+    chat_flow = flow.chat_flow
+    model = intent or REGISTRY.active("intent")  # likewise the intent model: its merge_map and its predictions
+    bundle = model.artifact if model else None
 
     # --- 0. Start Session ---
     if s == "__start__":
-        node = CHAT_FLOW.get("start", CHAT_FLOW[list(CHAT_FLOW.keys())[0]])
+        node = chat_flow.get("start", chat_flow[list(chat_flow.keys())[0]])
         state.expecting = "start"
-        return node["message"], asdict(state), node.get("options", [])
+        return node["message"], asdict(state), node.get("options", []), None
 
     # --- 1. Decision Tree Matching (Highest Priority if expecting) ---
     current_node_id = state.expecting or "start"
-    if current_node_id in CHAT_FLOW:
-        node = CHAT_FLOW[current_node_id]
-        options = node.get("options", [])
-        
+    if current_node_id in chat_flow:
         # Clean text for comparison (remove emojis/extra space)
         clean_s = RE_NON_WORD.sub('', s).strip()
-        
-        for opt in options:
-            clean_label = RE_NON_WORD.sub('', low(opt["label"])).strip()
-            
-            # Match if exact clean match (ignoring emojis)
-            if clean_label == clean_s:
-                # Transition to next node
-                next_node_id = opt["next"]
-                state.expecting = next_node_id
-                next_node = CHAT_FLOW.get(next_node_id)
-                state.expecting = next_node_id
-                next_node = CHAT_FLOW.get(next_node_id)
-                
-                if not next_node:
-                    next_node = CHAT_FLOW["start"]
-                    state.expecting = "start"
-
-                # If the next node has a tag, use a response from the dataset
-                tag = next_node.get("tag")
-                if tag and tag in RESPONSES:
-                    reply = pick_response(tag, next_node["message"])
-                else:
-                    reply = next_node["message"]
-
-                return reply, asdict(state), next_node.get("options", [])
+
+        # Match if exact clean match (ignoring emojis), else retry with typos corrected
+        opt = flow.option_index[current_node_id].get(clean_s) or match_option(clean_s, current_node_id, flow)
+        if opt:
+            # Transition to next node
+            next_node_id = opt["next"]
+            state.expecting = next_node_id
+            next_node = chat_flow.get(next_node_id)
+
+            if not next_node:
+                next_node = chat_flow["start"]
+                state.expecting = "start"
+
+            metrics.inc("chat.stage[flow]")
+            return node_reply(next_node, flow), asdict(state), next_node.get("options", []), None
 
     # --- 2. Crisis Override ---
-    if is_crisis(text):
+    if is_crisis(text) if crisis is None else crisis:
         state.expecting = "start"
         state.topic = "crisis"
+        metrics.inc("chat.stage[crisis]")
         return (
             "I'm really sorry you're feeling this way. 💛\n"
             "Please don’t hurt yourself. You matter.\n\n"
             "📞 If you are in India, call: 9152987821 (AASRA)\n"
             "Or dial 112 immediately.\n\n"
             "I'm here for you. Are you in a safe place right now?"
-        ), asdict(state), CHAT_FLOW["start"]["options"]
+        ), asdict(state), chat_flow["start"]["options"], None
 
-    # --- 3. Intent Model / Dataset ---
-    tag, conf, _ = predict_intent(text)
-    if conf >= CONF_THRESHOLD:
-        reply = pick_response(tag, "I'm here for you.")
+    # --- 3. Known pattern: exact or near-duplicate text from the dataset, no model needed ---
+    hit = flow.patterns.lookup(text, PATTERN_MATCH_THRESHOLD)
+    if hit:
+        state.expecting = "start"
+        metrics.inc("chat.stage[pattern]")
+        # Same tag normalization as the intent model's predictions, so both stages answer from the same pool
+        tag = normalize_tag(hit[0], bundle) if bundle else hit[0]
+        reply = pick_response(tag, "I'm here for you.", flow.responses, bundle)
+        return reply, asdict(state), chat_flow["start"]["options"], None
+
+    # --- 4. Intent Model / Dataset (skipped while the model is still loading) ---
+    intent = None if degraded else model
+    if intent and remaining(deadline) <= 0:
+        metrics.inc("chat.deadline_exceeded[intent]")
+        intent = None
+    tag, conf, topk = predict_intent(text, intent) if intent else (None, 0.0, [])
+    if intent and conf >= confidence_threshold(intent):
+        reply = pick_response(tag, "I'm here for you.", flow.responses, bundle)
         # If we successfully recognized a topic, maybe reset to start options or stay in flow
         state.expecting = "start"
-        return reply, asdict(state), CHAT_FLOW["start"]["options"]
-
-    # --- 4. Gemini Fallback ---
-    reply = gemini_fallback(text)
+        metrics.inc("chat.stage[intent]")
+        return reply, asdict(state), chat_flow["start"]["options"], intent
+
+    # --- 5. Route free text onto the nearest flow node ---
+    node_id, score = flow.router.route(text)
+    if node_id and score >= ROUTE_THRESHOLD:
+        node = chat_flow[node_id]
+        state.expecting = node_id
+        metrics.inc("chat.stage[route]")
+        return node_reply(node, flow), asdict(state), node.get("options", []), None
+
+    # --- 6. Gemini Fallback ---
+    if degraded:
+        metrics.inc("chat.stage[degraded]")
+        state.expecting = "start"
+        return BUSY_REPLY, asdict(state), chat_flow["start"]["options"], None
+    left = remaining(deadline)
+    reply = None
+    if left < GEMINI_MIN_S:
+        metrics.inc("chat.deadline_exceeded[fallback]")
+    else:
+        reply = gemini_fallback(text, min(GEMINI_TIMEOUT_S, left))
+    used = None
+    if reply is None:
+        # Breaker open, call failed or no time left: fail fast to the intent model's best guess
+        metrics.inc("chat.stage[fallback_intent]")
+        reply = intent_fallback_reply(text, topk, flow, bundle)
+        used = intent if topk else None
+    else:
+        metrics.inc("chat.stage[fallback]")
     state.expecting = "start"
-    return reply, asdict(state), CHAT_FLOW["start"]["options"]
+    return reply, asdict(state), chat_flow["start"]["options"], used
@@ -0,0 +1,47 @@
+import time
+
+import chatbot_engine as ce
+from chatbot_engine import ChatState, asdict, respond
+from circuit_breaker import CircuitBreaker
+
+# Breaker state machine: open after N failures, refuse while open, one half-open probe, close on success
+b = CircuitBreaker("test", failures=2, slow_s=0.05, open_s=0.2)
+assert b.allow(); b.record_failure()
+assert b.allow(); b.record_failure()
+assert b.state == "open" and not b.allow()
+time.sleep(0.25)
+assert b.allow() and b.state == "half_open"
+assert not b.allow(), "only one probe at a time"
+b.record_failure()
+assert b.state == "open", "a failed probe reopens"
+time.sleep(0.25)
+assert b.allow(); b.record_success(0.01)
+assert b.state == "closed" and b.consecutive == 0
+b.record_success(0.1); b.record_success(0.1)
+assert b.state == "open", "slow calls count as failures"
+print("breaker:", b.snapshot())
+
+# respond() never calls a failing backend once the breaker is open, and still answers
+calls = []
+
+class FailingModel:
+    def generate_content(self, prompt, request_options=None):
+        calls.append(request_options)
+        raise RuntimeError("backend unavailable")
+
+ce.gemini_model = FailingModel()
+ce.GEMINI_BREAKER = CircuitBreaker("gemini", failures=3, open_s=60)
+ce.ROUTE_THRESHOLD = 2.0  # force the Gemini stage
+state = asdict(ChatState())
+for _ in range(6):
+    reply, _, _ = respond("zxqv plorth wumble", state)
+    assert reply
+assert len(calls) == 3 and ce.GEMINI_BREAKER.state == "open"
+assert all(opts["timeout"] <= ce.GEMINI_TIMEOUT_S for opts in calls)
+
+# An expired deadline skips the LLM entirely
+t0 = time.perf_counter()
+reply, _, _ = respond("zxqv plorth wumble", state, deadline=time.monotonic() - 1)
+print(f"expired deadline -> {reply[:50]!r} in {(time.perf_counter() - t0) * 1000:.1f} ms")
+assert len(calls) == 3
+print("OK")
@@ -0,0 +1,38 @@
+import time
+
+import numpy as np
+
+from emotion_explain import explainer_for
+from model_registry import REGISTRY
+
+em = REGISTRY.activate("emotion", persist=False)
+ex = explainer_for(em)
+clf, vec = em.artifact["clf"], em.artifact["vectorizer"]
+
+# Contributions are exact: over all words they add up to the centred class logit minus the centred bias
+texts = [
+    "I have so many deadlines and my boss keeps piling on work",
+    "I miss my grandmother so much, the house feels empty",
+    "Got the job!! I can't believe it, so proud of myself",
+    "why does everyone ignore me",
+]
+for text in texts:
+    z = clf.decision_function(vec.transform([text]))[0]
+    zc = (z - z.mean()) - (clf.intercept_ - clf.intercept_.mean())
+    for label, c in ex.classes.items():
+        total = sum(v for _, v in ex.explain(text, label, top=1000))
+        assert abs(total - zc[c]) < 1e-4, (text, label, total, zc[c])
+    label = str(clf.classes_[int(np.argmax(z))])
+    print(f"{label:20} {ex.explain(text, label, top=3)}  <- {text!r}")
+
+assert ex.explain("", "Joy") == [] and ex.explain("hello", "no such label") == []
+
+# Cost per request
+t0 = time.perf_counter()
+for _ in range(200):
+    for text in texts:
+        ex.explain(text, "Stress / Overwhelm")
+ms = (time.perf_counter() - t0) / (200 * len(texts)) * 1000
+print(f"{ms:.3f} ms per explanation")
+assert ms < 1.0
+print("OK")
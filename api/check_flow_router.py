@@ -0,0 +1,57 @@
+import time
+
+import chatbot_engine
+import metrics
+from chatbot_engine import ChatState, FLOW, respond
+from dataclasses import asdict
+from model_registry import REGISTRY
+
+# Free-text messages written for this check, none of them copied from the intents patterns
+MESSAGES = [
+    "I can't fall asleep at night", "been lying awake since 3am again", "my sleep schedule is a mess",
+    "my exams are next week and I'm freaking out", "too much homework and deadlines", "I failed my test",
+    "I have no friends", "nobody ever texts me back", "I eat lunch by myself every day",
+    "I feel so down lately", "i feel empty inside", "everything feels grey and pointless",
+    "my chest is tight and my heart is racing", "I keep worrying about everything", "I'm having a panic attack",
+    "tell me something interesting", "share a fun fact about the brain", "teach me something about mental health",
+    "thanks that was helpful", "appreciate it a lot", "that made me feel better, thank you",
+    "can we do a breathing exercise", "help me calm my breathing", "I want to try grounding",
+    "my boss keeps yelling at me", "my parents expect too much from me", "work is crushing me",
+    "I broke up with my girlfriend", "my best friend ignores me", "I miss my grandma",
+]
+# General-knowledge questions have no place in the care flow and must keep going to the fallback
+OFF_TOPIC = [
+    "what's the capital of france", "write me a poem about the sea", "how do airplanes fly",
+    "recommend a good movie", "what is 17 times 23", "who won the world cup",
+]
+MESSAGES += OFF_TOPIC
+
+REGISTRY.activate("intent", persist=False)
+
+
+def stages(messages, threshold: float) -> dict:
+    chatbot_engine.ROUTE_THRESHOLD = threshold
+    before = metrics.snapshot()
+    for msg in messages:
+        respond(msg, asdict(ChatState()))
+    after = metrics.snapshot()
+    return {k[len("chat.stage["):-1]: after[k] - before.get(k, 0) for k in after if k.startswith("chat.stage[") and after[k] != before.get(k, 0)}
+
+
+threshold = chatbot_engine.ROUTE_THRESHOLD
+baseline = stages(MESSAGES, 2.0)
+routed = stages(MESSAGES, threshold)
+for name, counts in (("before", baseline), ("after", routed)):
+    print(f"{name:6} fallback rate {counts.get('fallback', 0) / len(MESSAGES):.0%}  {counts}")
+assert routed.get("fallback", 0) < baseline.get("fallback", 0)
+for msg in OFF_TOPIC:
+    assert "route" not in stages([msg], threshold), f"{msg!r} was routed into the flow"
+
+for msg in MESSAGES:
+    print(f"  {msg!r:48} -> {FLOW.router.route(msg)[0]} ({FLOW.router.route(msg)[1]:.2f})")
+
+n = 2000
+t0 = time.perf_counter()
+for i in range(n):
+    FLOW.router.route(MESSAGES[i % len(MESSAGES)])
+print(f"Routing latency: {(time.perf_counter() - t0) / n * 1e3:.3f} ms per message, matrix {FLOW.router.matrix.shape}")
@@ -0,0 +1,43 @@
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from forest_engine import compile_forest
+
+model_path = os.path.join(os.path.dirname(__file__), "mood_score_model.pkl")
+habit_model = joblib.load(model_path)
+columns = list(habit_model.named_steps["scaler"].feature_names_in_)
+
+t0 = time.perf_counter()
+forest = compile_forest(habit_model)
+print(f"Compiled {forest.n_trees} trees ({len(forest.right)} nodes, depth {forest.depth}) in {time.perf_counter() - t0:.3f}s")
+
+# Same ranges predict_habit clamps to, plus the clamp edges themselves
+rng = np.random.default_rng(42)
+n = 5000
+X = np.column_stack([
+    rng.uniform(4.7, 9.4, n).round(1),
+    rng.integers(0, 61, n),
+    rng.integers(0, 2, n),
+    rng.integers(0, 61, n),
+    rng.uniform(3, 8.1, n),
+]).astype(np.float64)
+X[:2] = [[4.7, 0, 0, 0, 3], [9.4, 60, 1, 60, 8.1]]
+
+expected = habit_model.predict(pd.DataFrame(X, columns=columns))
+got = forest.predict(X)
+print(f"{n} rows, identical predictions: {np.array_equal(expected, got)}")
+assert np.array_equal(expected, got), "compiled forest drifted from habit_model.predict"
+
+row = X[:1]
+t0 = time.perf_counter()
+for _ in range(50):
+    habit_model.predict(pd.DataFrame(row, columns=columns))
+t1 = time.perf_counter()
+for _ in range(50):
+    forest.predict(row)
+t2 = time.perf_counter()
+print(f"Single-row latency: sklearn {(t1 - t0) / 50 * 1e3:.2f} ms, compiled {(t2 - t1) / 50 * 1e3:.3f} ms")
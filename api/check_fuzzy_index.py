@@ -0,0 +1,47 @@
+import time
+from difflib import SequenceMatcher
+
+from chatbot_engine import FLOW, match_option, correct_lexicon, is_crisis, LEXICON_WORDS
+
+print(f"Label index: {len(FLOW.label_index)} words, lexicon index: {len(FLOW.lexicon_index)} words (flow load {FLOW.load_ms} ms)")
+
+# Typo'd button text should land on the same option as the clean label
+cases = [
+    ("start", "feelin sad", "😔 Feeling Sad"),
+    ("start", "anxeity panic", "😰 Anxiety / Panic"),
+    ("start", "sleap issues", "🌙 Sleep Issues"),
+    ("stress", "project work pressure", "Project/Work Pressure 💻"),
+    ("anxiety", "yes guid me", None),
+    ("start", "hello", None),
+]
+for node, text, label in cases:
+    opt = match_option(text, node)
+    got = opt["label"] if opt else None
+    print(f"{node:8} {text!r:28} -> {got!r}")
+    if label is not None:
+        assert got == label, f"{text!r} should match {label!r}"
+assert match_option("hello", "start") is None
+
+# Misspelled crisis words are caught, look-alike real words are not rewritten
+assert is_crisis("i keep thinking about suicde")
+assert is_crisis("I want to hurt myslef")
+assert not is_crisis("I want to dye my hair")
+# Three-letter lexicon words only match exactly, so nearby real words stay themselves
+for text in ["I want to diet", "let's dine out", "dive into this book", "dice onions"]:
+    assert not is_crisis(text), text
+    assert "die" not in correct_lexicon(text).split(), text
+assert correct_lexicon("what a lovely day") == "what a lovely day"
+
+queries = ["i am so stresed about my exmas tomorow", "feelin realy lonley and anxous"]
+n = 2000
+t0 = time.perf_counter()
+for _ in range(n):
+    for q in queries:
+        correct_lexicon(q)
+t1 = time.perf_counter()
+for _ in range(n // 20):
+    for q in queries:
+        [SequenceMatcher(None, tok, w).ratio() >= 0.78 for tok in q.split() for w in LEXICON_WORDS]
+t2 = time.perf_counter()
+print(f"Per message: index {(t1 - t0) / (n * len(queries)) * 1e3:.3f} ms, "
+      f"SequenceMatcher scan {(t2 - t1) / (n // 20 * len(queries)) * 1e3:.3f} ms")
@@ -0,0 +1,43 @@
+import json
+import os
+import pickle
+import time
+
+import joblib
+import numpy as np
+
+from linear_engine import EMOTION_PKL, INTENT_JOBLIB, DATA_DIR, export_emotion, export_intent
+
+ATOL = 1e-5
+
+with open(os.path.join(DATA_DIR, "intents chatbot nd4.json"), "r", encoding="utf-8") as f:
+    texts = [p for i in json.load(f)["intents"] for p in i.get("patterns", [])]
+texts += ["", "I'm soooo stressed about exams!!! 😵", "Ünïcode  tabs\tand\nnewlines"]
+
+with open(EMOTION_PKL, "rb") as f:
+    data = pickle.load(f)
+bundle = joblib.load(INTENT_JOBLIB)
+
+checks = [
+    ("emotion", lambda t: data["clf"].predict_proba(data["vectorizer"].transform(t)), export_emotion(data["clf"], data["vectorizer"])),
+    ("intent", bundle["pipeline"].predict_proba, export_intent(bundle["pipeline"])),
+]
+
+for name, reference, engine in checks:
+    expected = reference(texts)
+    got = engine.predict_proba(texts)
+    diff = float(np.abs(expected - got).max())
+    same_top = float((expected.argmax(1) == got.argmax(1)).mean())
+    print(f"{name}: {len(texts)} texts, max |diff| = {diff:.2e}, top-1 agreement = {same_top:.4f}")
+    assert diff < ATOL, f"{name} engine drifted from sklearn"
+
+    t0 = time.perf_counter()
+    for t in texts[:200]:
+        reference([t])
+    t1 = time.perf_counter()
+    for t in texts[:200]:
+        engine.predict_proba([t])
+    t2 = time.perf_counter()
+    print(f"  single-row latency: sklearn {(t1 - t0) / 200 * 1e3:.3f} ms, numpy {(t2 - t1) / 200 * 1e3:.3f} ms")
+
+print("NumPy engine matches sklearn.")
@@ -0,0 +1,46 @@
+import json
+import time
+import tracemalloc
+
+from chatbot_engine import INTENTS_PATH, FLOW, PATTERN_MATCH_THRESHOLD, normalize_tag, predict_intent
+from model_registry import REGISTRY
+from pattern_index import build_pattern_index
+
+with open(INTENTS_PATH, "r", encoding="utf-8") as f:
+    intents = json.load(f)["intents"]
+
+tracemalloc.start()
+t0 = time.perf_counter()
+index = build_pattern_index(intents)
+build_ms = (time.perf_counter() - t0) * 1e3
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(f"Built index over {index.matrix.shape[0]} patterns x {index.matrix.shape[1]} terms in {build_ms:.1f} ms")
+print(f"Memory: matrix + idf {index.nbytes() / 1024:.0f} KiB, peak during build {peak / 1024:.0f} KiB")
+
+# Every pattern must resolve exactly, whatever its case and trailing punctuation
+misses = [p for p in index.patterns if index.lookup(p.upper() + "!!", PATTERN_MATCH_THRESHOLD) is None]
+print(f"Exact hits: {len(index.patterns) - len(misses)}/{len(index.patterns)} patterns")
+assert not misses
+
+m = REGISTRY.activate("intent", persist=False)
+agree = sum(normalize_tag(tag, m.artifact) == predict_intent(p, m)[0] for tag, p in zip(index.tags, index.patterns))
+print(f"Intent model agrees with the pattern's own tag on {agree / len(index.patterns):.1%} of patterns")
+
+queries = ["I feel so sad today", "i am feeling really stressed out", "tell me a joke", "hello there!!",
+           "i cant sleep at night", "what's the capital of france", "Who are you?", "I'm scared of the dark"]
+n = 500
+t0 = time.perf_counter()
+for i in range(n):
+    index.lookup(queries[i % len(queries)], PATTERN_MATCH_THRESHOLD)
+t1 = time.perf_counter()
+for i in range(n):
+    index.search(queries[i % len(queries)], 3)
+t2 = time.perf_counter()
+for i in range(n // 10):
+    predict_intent(queries[i % len(queries)], m)
+t3 = time.perf_counter()
+print(f"Latency per message: lookup {(t1 - t0) / n * 1e3:.3f} ms, top-3 search {(t2 - t1) / n * 1e3:.3f} ms, "
+      f"intent pipeline ({m.info()['backend']}) {(t3 - t2) / (n // 10) * 1e3:.3f} ms")
+for q in queries:
+    print(f"  {q!r:36} {FLOW.patterns.search(q, 2)}")
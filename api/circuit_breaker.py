@@ -0,0 +1,80 @@
+import threading
+import time
+
+import metrics
+
+
+class CircuitBreaker:
+    """Fails fast while a remote backend is unhealthy.
+
+    closed:    calls go through; `failures` errors or slow calls (over `slow_s`)
+               in a row open the breaker.
+    open:      calls are refused for `open_s`.
+    half_open: one probe call at a time is let through; a success closes the
+               breaker, a failure opens it again for another `open_s`.
+
+    Callers check `allow()` before the call and report the outcome with
+    `record_success(elapsed)` or `record_failure()`. Thread-safe: `respond`
+    runs on the threadpool.
+    """
+
+    def __init__(self, name: str, failures: int = 3, slow_s: float = 5.0, open_s: float = 30.0):
+        self.name = name
+        self.failures = max(1, failures)
+        self.slow_s = slow_s
+        self.open_s = open_s
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.open_s:
+                    metrics.inc(f"breaker.rejected[{self.name}]")
+                    return False
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probing:
+                    metrics.inc(f"breaker.rejected[{self.name}]")
+                    return False
+                self._probing = True
+                metrics.inc(f"breaker.probe[{self.name}]")
+            return True
+
+    def record_success(self, elapsed: float):
+        if elapsed > self.slow_s:
+            metrics.inc(f"breaker.slow[{self.name}]")
+            self.record_failure()
+            return
+        with self._lock:
+            self._probing = False
+            self.consecutive = 0
+            if self.state != "closed":
+                print(f"Circuit breaker {self.name} closed")
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._probing = False
+            self.consecutive += 1
+            metrics.inc(f"breaker.failure[{self.name}]")
+            if self.state == "half_open" or self.consecutive >= self.failures:
+                if self.state != "open":
+                    self.opens += 1
+                    print(f"Circuit breaker {self.name} open after {self.consecutive} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = max(0.0, self.open_s - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.0
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive,
+                "opens": self.opens,
+                "retry_in_s": round(retry_in, 2),
+            }
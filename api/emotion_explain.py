@@ -0,0 +1,64 @@
+import threading
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from linear_engine import load_emotion_engine
+from model_registry import LoadedModel
+
+
+class TokenExplainer:
+    """Exact per-word contributions for the linear emotion model.
+
+    A class score is bias + sum_j x_j * W[j, c] over the non-zero tf-idf
+    features, so each feature's share is read straight off the sparse vector:
+    O(nnz), no sampling. Weights are centred across classes (W[j, c] minus the
+    mean over classes), which is what moves the softmax: a positive value
+    pushes the text towards that label rather than towards the others.
+    Bigram contributions are split evenly between their two words. Features
+    come from the NumPy tokenizer (same output as the fitted vectorizer, much
+    cheaper for a single text), whichever backend serves predictions.
+    """
+
+    def __init__(self, em: LoadedModel):
+        vectorizer, clf = em.artifact["vectorizer"], em.artifact["clf"]
+        self.engine = em.engine or load_emotion_engine(clf, vectorizer)
+        coef = np.asarray(clf.coef_, dtype=np.float64)
+        if coef.shape[0] == 1:  # binary: one row for the positive class
+            coef = np.vstack([-coef, coef])
+        self.W = np.ascontiguousarray((coef - coef.mean(axis=0)).T, dtype=np.float32)  # features x classes
+        self.classes = {str(c): i for i, c in enumerate(clf.classes_)}
+        self.words = [None] * len(vectorizer.vocabulary_)
+        for term, j in vectorizer.vocabulary_.items():
+            self.words[j] = term.split()
+
+    def explain(self, text: str, label: str, top: int = 5) -> List[Tuple[str, float]]:
+        c = self.classes.get(label)
+        if c is None:
+            return []
+        idx, vals = self.engine.features(text)
+        if len(idx) == 0:
+            return []
+        contrib = vals * self.W[idx, c]
+        per_word: Dict[str, float] = defaultdict(float)
+        for j, v in zip(idx.tolist(), contrib.tolist()):
+            words = self.words[j]
+            for w in words:
+                per_word[w] += v / len(words)
+        ranked = sorted(per_word.items(), key=lambda kv: abs(kv[1]), reverse=True)
+        return [(w, round(v, 6)) for w, v in ranked[:top]]
+
+
+_explainers: Dict[Tuple[str, str], TokenExplainer] = {}
+_lock = threading.Lock()
+
+
+def explainer_for(em: LoadedModel) -> TokenExplainer:
+    # One per emotion model version; building it centres the coefficient matrix once
+    key = (em.version, em.sha256 or "")
+    with _lock:
+        explainer = _explainers.get(key)
+        if explainer is None:
+            explainer = _explainers[key] = TokenExplainer(em)
+        return explainer
@@ -0,0 +1,51 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# ================= FLOW ROUTER =================
+class FlowRouter:
+    """Maps free text onto the closest chat-flow node.
+
+    Each node becomes one L2-normalised TF-IDF row built from its message, its own
+    option labels, the labels of options leading to it and the patterns of its
+    intent tag. Routing a message is one sparse matrix-vector product.
+    """
+
+    def __init__(self, vectorizer: TfidfVectorizer, matrix, node_ids: List[str]):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.node_ids = node_ids
+
+    def scores(self, text: str) -> np.ndarray:
+        q = self.vectorizer.transform([text])
+        if q.nnz == 0:
+            return np.zeros(len(self.node_ids))
+        return (self.matrix @ q.T).toarray().ravel()
+
+    def route(self, text: str) -> Tuple[Optional[str], float]:
+        scores = self.scores(text)
+        best = int(scores.argmax())
+        if scores[best] <= 0:
+            return None, 0.0
+        return self.node_ids[best], float(scores[best])
+
+
+def node_documents(chat_flow: Dict[str, dict], patterns: Dict[str, List[str]]) -> Dict[str, str]:
+    docs = {node_id: [node["message"]] for node_id, node in chat_flow.items()}
+    for node_id, node in chat_flow.items():
+        for opt in node.get("options", []):
+            docs[node_id].append(opt["label"])
+            if opt["next"] in docs:
+                docs[opt["next"]].append(opt["label"])
+        docs[node_id].extend(patterns.get(node.get("tag"), []))
+    return {node_id: "\n".join(parts) for node_id, parts in docs.items()}
+
+
+def build_flow_router(chat_flow: Dict[str, dict], patterns: Dict[str, List[str]]) -> FlowRouter:
+    docs = node_documents(chat_flow, patterns)
+    # "start" is where every fallback already lands, routing there would only swap Gemini for the greeting
+    node_ids = [n for n in docs if n != "start"]
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, stop_words="english")
+    matrix = vectorizer.fit_transform([docs[n] for n in node_ids]).tocsr()
+    return FlowRouter(vectorizer, matrix, node_ids)
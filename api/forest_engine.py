@@ -0,0 +1,131 @@
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+
+# ================= COMPILED FOREST =================
+class CompiledForest:
+    """A RandomForestRegressor (+ its MinMaxScaler/StandardScaler) flattened into flat arrays.
+
+    All trees live in one node table in sklearn's depth-first order, so a split's
+    left child is always `node + 1`. Leaves get a -inf threshold and point right at
+    themselves, which lets every row walk every tree in lock-step.
+    """
+
+    CHUNK_ROWS = 64  # keeps the (rows x trees) working set cache-sized
+
+    def __init__(self, feature, threshold, right, value, roots, depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.n_trees = len(roots)
+        self.is_split = right != np.arange(len(right))
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_base = (np.arange(n_rows, dtype=np.int32) * n_features)[:, None]
+        node = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        for _ in range(self.depth):
+            go_left = flat.take(row_base + self.feature.take(node)) <= self.threshold.take(node)
+            node = np.where(go_left, node + 1, self.right.take(node))
+            if not self.is_split.take(node).any():
+                break
+        # Accumulate tree outputs in estimator order, as sklearn does, so results are bit-identical
+        return np.cumsum(self.value.take(node), axis=1)[:, -1] / self.n_trees
+
+    def predict(self, X) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if len(X) <= self.CHUNK_ROWS:
+            return self._predict_chunk(X)
+        return np.concatenate([
+            self._predict_chunk(X[i: i + self.CHUNK_ROWS]) for i in range(0, len(X), self.CHUNK_ROWS)
+        ])
+
+
+def _scaler_affine(scaler, n_features: int):
+    if scaler is None:
+        return None
+    if hasattr(scaler, "min_"):  # MinMaxScaler: X * scale_ + min_
+        return lambda x, f: x * scaler.scale_[f] + scaler.min_[f]
+    if hasattr(scaler, "mean_"):  # StandardScaler: (X - mean_) / scale_
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+        return lambda x, f: (x - mean[f]) / scale[f]
+    raise ValueError(f"Unsupported scaler: {type(scaler).__name__}")
+
+
+def _fold_thresholds(scaler, feature: np.ndarray, threshold: np.ndarray) -> np.ndarray:
+    """Map split thresholds from scaled space back to raw feature space.
+
+    The forest compares float32(scaled x) <= t. For each split we bisect for the
+    largest raw float64 value that still goes left, so `raw_x <= folded_t` takes
+    exactly the same branch as the scaler + tree path for every input.
+    """
+    affine = _scaler_affine(scaler, int(feature.max()) + 1)
+    if affine is None:
+        return threshold
+
+    def goes_left(x):
+        return affine(x, feature).astype(np.float32).astype(np.float64) <= threshold
+
+    guess = affine(np.zeros_like(threshold), feature)
+    unit = affine(np.ones_like(threshold), feature) - guess
+    guess = (threshold - guess) / unit
+    pad = np.abs(guess) * 1e-5 + 1e-5
+    lo, hi = guess - pad, guess + pad
+    if not (goes_left(lo).all() and not goes_left(hi).any()):
+        raise ValueError("Scaler could not be folded into the split thresholds")
+    while True:
+        active = np.nextafter(lo, np.inf) < hi
+        if not active.any():
+            return lo
+        mid = np.where(active, lo + (hi - lo) / 2, lo)
+        left = goes_left(mid)
+        lo = np.where(active & left, mid, lo)
+        hi = np.where(active & ~left, mid, hi)
+
+
+def is_forest(pipeline) -> bool:
+    """Whether the model step is a bagged forest of single-output trees that compile_forest handles."""
+    model = pipeline.named_steps["model"] if hasattr(pipeline, "named_steps") else pipeline
+    return isinstance(model, (RandomForestRegressor, ExtraTreesRegressor))
+
+
+def compile_forest(pipeline) -> CompiledForest:
+    steps = dict(pipeline.named_steps) if hasattr(pipeline, "named_steps") else {"model": pipeline}
+    forest = steps["model"]
+    scaler = steps.get("scaler")
+    if getattr(forest, "n_outputs_", 1) != 1:
+        raise ValueError("Only single-output forests are supported")
+
+    features, thresholds, rights, values, roots = [], [], [], [], []
+    depth, offset = 0, 0
+    for est in forest.estimators_:
+        t = est.tree_
+        n = t.node_count
+        leaf = t.children_left == -1
+        idx = np.arange(n)
+        if not np.array_equal(t.children_left[~leaf], idx[~leaf] + 1):
+            raise ValueError("Expected depth-first node order (left child == node + 1)")
+        features.append(np.where(leaf, 0, t.feature))
+        thresholds.append(np.where(leaf, -np.inf, t.threshold))
+        rights.append(np.where(leaf, idx, t.children_right) + offset)
+        values.append(t.value.reshape(n, -1)[:, 0])
+        roots.append(offset)
+        depth = max(depth, t.max_depth)
+        offset += n
+
+    feature = np.concatenate(features).astype(np.int32)
+    threshold = np.concatenate(thresholds).astype(np.float64)
+    right = np.concatenate(rights).astype(np.int32)
+    split = right != np.arange(offset)
+    threshold[split] = _fold_thresholds(scaler, feature[split], threshold[split])
+    return CompiledForest(
+        feature, threshold, right,
+        np.concatenate(values).astype(np.float64),
+        np.array(roots, dtype=np.int32), depth,
+    )
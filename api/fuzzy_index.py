@@ -0,0 +1,90 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+# ================= FUZZY WORD INDEX =================
+def max_edits(length: int) -> int:
+    # Short words stay exact: "die" / "dye", "sad" / "mad" are different words, not typos
+    if length <= 3:
+        return 0
+    return 1 if length <= 7 else 2
+
+
+def _deletes(word: str, depth: int) -> Set[str]:
+    found = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent swaps count as one edit), capped at limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class FuzzyIndex:
+    """Deletion-neighbourhood (SymSpell-style) index for typo correction.
+
+    Every vocabulary word is stored under each string reachable by deleting up to
+    `max_edits(len(word))` characters. A query generates its own deletes and only
+    candidates sharing one are verified, so a lookup is a handful of dict probes
+    instead of a similarity pass over the whole vocabulary.
+
+    Words in `known` are real words that merely look like a vocabulary entry
+    ("lovely" vs "lonely") and are never corrected.
+    """
+
+    def __init__(self, vocab: Iterable[str], known: Iterable[str] = ()):
+        self.vocab = frozenset(w for w in vocab if w)
+        self.known = frozenset(known) - self.vocab
+        self._deletes: Dict[str, List[str]] = defaultdict(list)
+        for word in sorted(self.vocab):
+            for d in _deletes(word, max_edits(len(word))):
+                self._deletes[d].append(word)
+        self._deletes = dict(self._deletes)
+
+    def lookup(self, token: str) -> Optional[str]:
+        """Closest vocabulary word within the allowed edits, or None."""
+        if token in self.vocab:
+            return token
+        limit = max_edits(len(token))
+        if limit == 0 or token in self.known:
+            return None
+        best, best_dist = None, limit + 1
+        seen = set()
+        for d in _deletes(token, limit):
+            for cand in self._deletes.get(d, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                # The shorter word sets the budget: "diet" is one edit from "die", but "die" allows none
+                cand_limit = min(limit, max_edits(len(cand)))
+                if cand_limit == 0:
+                    continue
+                dist = edit_distance(token, cand, cand_limit)
+                if dist > cand_limit:
+                    continue
+                if dist < best_dist or (dist == best_dist and best is not None and cand < best):
+                    best, best_dist = cand, dist
+        return best if best_dist <= limit else None
+
+    def correct(self, words: List[str]) -> List[str]:
+        return [self.lookup(w) or w for w in words]
+
+    def __len__(self) -> int:
+        return len(self.vocab)
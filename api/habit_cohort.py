@@ -0,0 +1,174 @@
+"""Offline mood scores + SHAP explanations for a cohort of habit rows.
+
+    python habit_cohort.py cohort.csv scored.parquet --id-column participant_id
+    python habit_cohort.py cohort.csv scored.csv --workers 8 --no-shap
+
+Input columns match the API fields: sleep_hours, workout_min, journaling,
+reading_min, screen_time. Rows get the same clamping, model call and
+apply_domain_penalty as /api/habit-prediction; rows with an empty or non-numeric
+value are kept unscored (NaN) with the reason in the error column. The shap_*
+columns are raw SHAP values for the clamped features; /api/shap shows their
+scaled magnitudes. The CSV is read in chunks, scored across a process pool and written back in
+input order, so memory stays flat whatever the cohort size. Parquet output
+needs pyarrow.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 2000
+INPUT_COLUMNS = ["sleep_hours", "workout_min", "journaling", "reading_min", "screen_time"]
+NUMERIC_COLUMNS = ["sleep_hours", "workout_min", "reading_min", "screen_time"]
+
+# ================= WORKER =================
+_worker = {}
+
+
+def _init_worker(with_shap: bool):
+    from model_registry import REGISTRY
+    hm = REGISTRY.activate("habit", persist=False)
+    _worker["habit"] = hm
+    if with_shap:
+        from shap_summary import make_explainer
+        _worker["explainer"] = make_explainer(hm.artifact)
+
+
+def score_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    import inference
+
+    hm = _worker["habit"]
+    out = pd.DataFrame({"row": chunk.index, "id": chunk["id"].to_numpy()})
+    out["raw_prediction"] = np.nan
+    out["mood_score"] = np.nan
+    out["mood_range"] = None
+    out["error"] = None
+    explainer = _worker.get("explainer")
+    if explainer is not None:
+        for name in INPUT_COLUMNS:
+            out[f"shap_{name}"] = np.nan
+        out["shap_base"] = float(np.ravel(explainer.expected_value)[0])
+
+    # Rows with a missing or non-numeric value ("n/a" in sleep_hours) stay in the output, unscored, with an error
+    numeric = chunk[NUMERIC_COLUMNS].apply(pd.to_numeric, errors="coerce")
+    missing = chunk[INPUT_COLUMNS].isna()
+    not_numeric = numeric.isna() & ~missing[NUMERIC_COLUMNS]
+    valid = ~(missing.any(axis=1) | not_numeric.any(axis=1)).to_numpy()
+    for i in np.flatnonzero(~valid):
+        problems = [f"missing {c}" for c in INPUT_COLUMNS if missing.iat[i, INPUT_COLUMNS.index(c)]]
+        problems += [f"non-numeric {c}" for c in NUMERIC_COLUMNS if not_numeric.iat[i, NUMERIC_COLUMNS.index(c)]]
+        out.iat[i, out.columns.get_loc("error")] = "; ".join(problems)
+    if not valid.any():
+        return out
+    ok = numeric[valid].assign(journaling=chunk["journaling"][valid])
+    rows = [
+        inference.habit_row(inference.HabitRequest(sleep_hours=s, workout_min=w, journaling=_truthy(j, inference.TRUTHY), reading_min=r, screen_time=t))
+        for s, w, j, r, t in zip(ok["sleep_hours"], ok["workout_min"], ok["journaling"], ok["reading_min"], ok["screen_time"])
+    ]
+    preds = inference.predict_habit_scores(hm, rows)
+    scores = [inference.habit_score(row, pred) for row, pred in zip(rows, preds)]
+    out.loc[valid, "raw_prediction"] = np.round(preds, 6)
+    out.loc[valid, "mood_score"] = scores
+    out.loc[valid, "mood_range"] = [inference.get_mood_feedback(s)[0] for s in scores]
+
+    if explainer is not None:
+        X = pd.DataFrame(rows, columns=inference.HABIT_FEATURES)
+        values = explainer.shap_values(hm.artifact.named_steps["scaler"].transform(X))
+        for i, name in enumerate(INPUT_COLUMNS):
+            out.loc[valid, f"shap_{name}"] = values[:, i]
+    return out
+
+
+def _truthy(value, truthy) -> bool:
+    if isinstance(value, (bool, int, float, np.number)):
+        return bool(value)
+    return str(value).strip().lower() in truthy
+
+
+# ================= OUTPUT =================
+class ChunkWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._wrote_header = False
+        if self.parquet:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise SystemExit("Parquet output needs pyarrow (pip install pyarrow), or write to .csv")
+
+    def write(self, frame: pd.DataFrame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="a" if self._wrote_header else "w", header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# ================= RUN =================
+def read_chunks(path: str, id_column: Optional[str], chunk_rows: int):
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        missing = [c for c in INPUT_COLUMNS if c not in chunk.columns]
+        if missing:
+            raise SystemExit(f"{path} is missing columns: {', '.join(missing)}")
+        ids = chunk[id_column].astype(str) if id_column else chunk.index.astype(str)
+        yield chunk[INPUT_COLUMNS].assign(id=ids)
+
+
+def run(args) -> int:
+    writer = ChunkWriter(args.output)
+    t0 = time.perf_counter()
+    scored = 0
+    try:
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(not args.no_shap,)) as pool:
+            pending = deque()
+            for chunk in read_chunks(args.input, args.id_column, args.chunk_rows):
+                pending.append(pool.submit(score_chunk, chunk))
+                while len(pending) >= args.workers * 2 or (pending and pending[0].done()):
+                    scored += _drain(pending.popleft(), writer, scored, t0)
+            while pending:
+                scored += _drain(pending.popleft(), writer, scored, t0)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - t0
+    print(f"Scored {scored} rows in {elapsed:.1f}s ({scored / max(elapsed, 1e-9):.0f} rows/s, {args.workers} workers)", file=sys.stderr)
+    return scored
+
+
+def _drain(future, writer: ChunkWriter, scored: int, t0: float) -> int:
+    frame = future.result()
+    writer.write(frame)
+    done = scored + len(frame)
+    print(f"  {done} rows written, {done / (time.perf_counter() - t0):.0f} rows/s", file=sys.stderr)
+    return len(frame)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Score a habit CSV with the mood model and SHAP.")
+    p.add_argument("input", help="CSV with sleep_hours, workout_min, journaling, reading_min, screen_time")
+    p.add_argument("output", help=".parquet or .csv output")
+    p.add_argument("--id-column", default=None, help="column copied to the output 'id' (default: row number)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    p.add_argument("--no-shap", action="store_true", help="scores only")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
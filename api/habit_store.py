@@ -0,0 +1,115 @@
+import threading
+from datetime import date
+from typing import Dict, Optional
+
+import numpy as np
+
+# ================= ROLLING HABIT AGGREGATES =================
+WINDOW = 30        # longest rolling window in calendar days; the ring buffer holds this many days
+SHORT_WINDOW = 7
+
+
+class HabitAggregateStore:
+    """Per-user rolling mood aggregates kept in flat NumPy arrays.
+
+    Each user owns one row: a ring buffer of the last 30 calendar days keyed by
+    date ordinal, with a presence flag per slot. Adding a day clears the slots
+    of the days skipped since the previous entry (at most 30), so the 7 and 30
+    day windows are real day windows ending at the user's latest logged date,
+    and aggregates read at most 30 slots whatever the history length. One entry
+    per date; days must arrive in order.
+
+    The store lives in process memory: it is empty after a restart, and each
+    uvicorn worker holds its own copy.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        old = getattr(self, "_scores", None)
+        n = 0 if old is None else len(old)
+        self._capacity = capacity
+
+        def grow(name, shape, dtype, fill=0):
+            arr = np.full((capacity,) + shape, fill, dtype=dtype)
+            if old is not None:
+                arr[:n] = getattr(self, name)
+            setattr(self, name, arr)
+
+        grow("_scores", (WINDOW,), np.float32)   # slot = date ordinal % WINDOW
+        grow("_logged", (WINDOW,), np.bool_)     # False for days without an entry
+        grow("_low_flags", (WINDOW,), np.bool_)
+        grow("_count", (), np.int64)             # days ever logged
+        grow("_low_total", (), np.int64)
+        grow("_last_day", (), np.int64, -1)      # date ordinal of the latest entry
+
+    def _row(self, user_id: str) -> int:
+        row = self._rows.get(user_id)
+        if row is None:
+            row = len(self._rows)
+            if row >= self._capacity:
+                self._alloc(self._capacity * 2)
+            self._rows[user_id] = row
+        return row
+
+    def add(self, user_id: str, day: date, score: float, is_low: bool) -> bool:
+        """Fold one scored day into the user's aggregates. Returns False for out-of-order days."""
+        with self._lock:
+            row = self._row(user_id)
+            ordinal = day.toordinal()
+            last = int(self._last_day[row])
+            if ordinal <= last:
+                return False
+
+            # Clear the slots of the skipped days (and of the new one), which may hold days older than the window
+            first = ordinal - WINDOW + 1 if last < 0 else max(last + 1, ordinal - WINDOW + 1)
+            slots = np.arange(first, ordinal + 1) % WINDOW
+            self._logged[row, slots] = False
+            self._low_flags[row, slots] = False
+
+            slot = ordinal % WINDOW
+            self._scores[row, slot] = score
+            self._logged[row, slot] = True
+            self._low_flags[row, slot] = is_low
+            self._low_total[row] += int(is_low)
+            self._count[row] += 1
+            self._last_day[row] = ordinal
+            return True
+
+    def aggregates(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                return None
+            last = int(self._last_day[row])
+            offsets = np.arange(WINDOW)                   # days before the latest entry
+            slots = (last - offsets) % WINDOW
+            logged = self._logged[row, slots]
+            scores = self._scores[row, slots].astype(np.float64)[logged]
+            lows = self._low_flags[row, slots][logged]
+            days = -offsets[logged].astype(np.float64)   # day offsets, latest = 0
+            in7 = days > -SHORT_WINDOW
+
+            # Least-squares slope of score over day offsets; flat until two days are logged
+            slope = 0.0
+            if len(days) >= 2:
+                dx = days - days.mean()
+                slope = float(dx @ (scores - scores.mean()) / (dx @ dx))
+
+            return {
+                "days_logged": int(self._count[row]),
+                "days_logged_30d": int(len(days)),
+                "last_date": date.fromordinal(last).isoformat(),
+                "last_score": round(float(self._scores[row, last % WINDOW]), 2),
+                "mean_7d": round(float(scores[in7].mean()), 2),
+                "mean_30d": round(float(scores.mean()), 2),
+                "trend_30d": round(slope, 4),
+                "low_days_30d": int(lows.sum()),
+                "low_days_total": int(self._low_total[row]),
+            }
+
+    def __len__(self) -> int:
+        return len(self._rows)
@@ -0,0 +1,247 @@
+"""Model inference shared by the API, the background job workers and the batch CLIs.
+
+Nothing here imports main, so a process-pool worker only loads the models and
+these helpers, not the FastAPI app.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+import shap_summary
+from limits import limit_text
+from model_registry import LoadedModel
+
+# ================= EMOTION =================
+_ws = re.compile(r"\s+")
+def clean_text(s: str) -> str:
+    return _ws.sub(" ", s.strip())
+
+class TokenContribution(BaseModel):
+    token: str
+    weight: float   # > 0 pushes towards the predicted emotion, < 0 away from it
+
+class PredictResponse(BaseModel):
+    emotion: str
+    confidence: float = 1.0
+    secondary_emotion: Optional[str] = None
+    explanation: Optional[List[TokenContribution]] = None   # only with ?explain=true, for labels the model picked
+
+# --- Keyword Heuristics ---
+KEYWORD_OVERRIDE = {
+    "love": "Love / Affection",
+    "loved": "Love / Affection",
+    "affection": "Love / Affection",
+    "happy": "Joy",
+    "joy": "Joy",
+    "joyful": "Joy",
+    "sad": "Sadness",
+    "unhappy": "Sadness",
+    "miserable": "Sadness",
+    "angry": "Anger",
+    "furious": "Anger",
+    "annoyed": "Anger",
+    "anxious": "Fear / Anxiety",
+    "anxiety": "Fear / Anxiety",
+    "scared": "Fear / Anxiety",
+    "fear": "Fear / Anxiety",
+    "stressed": "Stress / Overwhelm",
+    "stress": "Stress / Overwhelm",
+    "overwhelmed": "Stress / Overwhelm",
+    "shock": "Surprise / Shock",
+    "shocked": "Surprise / Shock",
+    "shocking": "Surprise / Shock",
+    "surprised": "Surprise / Shock",
+    "proud": "Pride / Confidence",
+    "confident": "Pride / Confidence",
+    "hopeful": "Hope / Optimism",
+    "optimistic": "Hope / Optimism",
+    "disgusted": "Disgust",
+    "ashamed": "Shame / Guilt",
+    "guilt": "Shame / Guilt",
+    "guilty": "Shame / Guilt"
+}
+
+def get_keyword_emotion(text: str) -> Optional[str]:
+    t = text.lower().strip().replace("!", "").replace(".", "").replace("?", "")
+    return KEYWORD_OVERRIDE.get(t)
+
+def emotion_probs(em: LoadedModel, texts: List[str]) -> np.ndarray:
+    # Class probabilities for a batch of cleaned texts, in one model call
+    if em.engine is not None:
+        return em.engine.predict_proba(texts)
+    emb = em.artifact["vectorizer"].transform(texts)
+    return em.artifact["clf"].predict_proba(emb)
+
+def decide_emotion(em: LoadedModel, probs: np.ndarray) -> PredictResponse:
+    classes = em.artifact["clf"].classes_
+    
+    # Sort by probability descending
+    top_indices = probs.argsort()[::-1]
+    
+    best_idx = top_indices[0]
+    best_emotion = classes[best_idx]
+    best_conf = float(probs[best_idx])
+    
+    secondary_emotion = None
+    if len(top_indices) > 1:
+        secondary_emotion = str(classes[top_indices[1]])
+
+    # Optimization: If best is "Neutral" but confidence is low (< 0.4) 
+    # and secondary is significantly present, maybe prefer secondary?
+    # Or just don't default to Neutral if it's a weak prediction.
+    if best_emotion == "Neutral" and best_conf < 0.35 and secondary_emotion:
+        # If Neutral is barely winning over a specific emotion, use the specific one
+        return PredictResponse(
+            emotion=secondary_emotion, 
+            confidence=float(probs[top_indices[1]]),
+            secondary_emotion=best_emotion
+        )
+
+    # Fallback to Neutral only if confidence is EXTREMELY low (< 0.15)
+    if best_conf < 0.15:
+        return PredictResponse(emotion="Neutral", confidence=best_conf, secondary_emotion=best_emotion)
+
+    return PredictResponse(
+        emotion=best_emotion, 
+        confidence=best_conf, 
+        secondary_emotion=secondary_emotion
+    )
+
+def model_decided(em: LoadedModel, probs: np.ndarray, result: PredictResponse) -> bool:
+    # False when decide_emotion fell back to Neutral over a low-confidence pick of another class
+    top = str(em.artifact["clf"].classes_[int(np.argmax(probs))])
+    return result.emotion != "Neutral" or top == "Neutral"
+
+def predict_batch(em: LoadedModel, texts: List[str]) -> List[Dict[str, Any]]:
+    # /api/predict for many texts with one model call; bad items get an "error" instead of failing the batch
+    results: List[Dict[str, Any]] = [{} for _ in texts]
+    todo = []
+    for i, text in enumerate(texts):
+        cleaned = clean_text(text or "")
+        if not cleaned:
+            results[i] = {"error": "Empty text"}
+            continue
+        try:
+            cleaned = limit_text(cleaned, "predict")
+        except HTTPException as e:
+            results[i] = {"error": e.detail}
+            continue
+        override = get_keyword_emotion(cleaned)
+        if override:
+            results[i] = PredictResponse(emotion=override, confidence=1.0).model_dump()
+        else:
+            todo.append((i, cleaned))
+    if todo:
+        probs = emotion_probs(em, [cleaned for _, cleaned in todo])
+        for (i, _), p in zip(todo, probs):
+            results[i] = decide_emotion(em, p).model_dump()
+    return results
+
+# ================= HABITS =================
+TRUTHY = {"1", "true", "yes", "y"}
+
+class HabitRequest(BaseModel):
+    sleep_hours: float
+    workout_min: float
+    journaling: bool
+    reading_min: float
+    screen_time: float
+
+class HabitResponse(BaseModel):
+    mood_score: float
+    mood_range: str
+    message: str
+    tips: List[str]
+
+class ShapFeature(BaseModel):
+    name: str
+    impact: float
+    fill: str
+
+class ShapResponse(BaseModel):
+    features: List[ShapFeature]
+
+def clamp(value: float, min_v: float, max_v: float) -> float:
+    return max(min_v, min(value, max_v))
+
+def apply_domain_penalty(score, sleep_hours, workout_min, journaling, reading_min, screen_time):
+    penalty = 0.0
+    if sleep_hours <= 5.0: penalty += 1.5
+    if workout_min == 0: penalty += 0.8
+    if reading_min == 0: penalty += 0.4
+    if not journaling: penalty += 0.3
+    if screen_time >= 8.0: penalty += 1.5
+    return clamp(score - penalty, 0.0, 10.0)
+
+def get_mood_feedback(score: float):
+    if score < 4.0:
+        return ("0.00–3.99 (Low)", "Your mood seems low today. Focus on rest and basic self-care.", 
+                ["Try 5–10 minutes of light movement", "Reduce screen time before sleeping", "Aim for consistent sleep", "Write 2-3 lines about feelings"])
+    elif score < 8.0:
+        return ("4.00–7.99 (Moderate)", "You’re doing okay — small habit tweaks can make you feel better.",
+                ["Add 10–20 min of activity", "Read or journal for 5–10 min", "Avoid screens 30 min before bed", "Keep sleep schedule consistent"])
+    else:
+        return ("8.00–10.00 (High)", "You’re in a great mental space today. Keep maintaining these habits!",
+                ["Maintain routine and sleep schedule", "Keep workouts consistent", "Balance work and rest", "Keep screen time in check"])
+
+HABIT_FEATURES = ["Sleep_Hours", "Workout_Duration_Min", "Journaling (Y/N)", "Reading_Min", "Screen_Time_Hours"]
+
+def habit_row(request: HabitRequest) -> List[float]:
+    # Internal clamping rules (from habit message.py)
+    sleep = clamp(request.sleep_hours, 4.7, 9.4)
+    workout = clamp(request.workout_min, 0, 60)
+    reading = clamp(request.reading_min, 0, 60)
+    screen = clamp(request.screen_time, 3, 8.1)
+    journaling = 1 if request.journaling else 0
+    return [sleep, workout, journaling, reading, screen]
+
+def predict_habit_scores(hm: LoadedModel, rows) -> np.ndarray:
+    # Raw model output for clamped rows, in one vectorized call
+    if hm.engine is not None:
+        return hm.engine.predict(np.asarray(rows, dtype=np.float64))
+    X = pd.DataFrame(rows, columns=HABIT_FEATURES)
+    return hm.artifact.predict(X)
+
+def habit_score(row: List[float], pred: float) -> float:
+    sleep, workout, journaling, reading, screen = row
+    mood_score = clamp(float(pred), 0.0, 10.0)
+    mood_score = apply_domain_penalty(mood_score, sleep, workout, bool(journaling), reading, screen)
+    return round(mood_score, 2)
+
+def habit_response(row: List[float], pred: float) -> HabitResponse:
+    mood_score = habit_score(row, pred)
+    mood_range, message, tips = get_mood_feedback(mood_score)
+
+    return HabitResponse(mood_score=mood_score, mood_range=mood_range, message=message, tips=tips)
+
+def habit_shap_values(hm: LoadedModel, X: pd.DataFrame) -> np.ndarray:
+    # The TreeExplainer is built once per model version and cached (shap is imported lazily; it is slow to import)
+    return shap_summary.shap_values(hm, X)
+
+def shap_response(shap_vals: np.ndarray) -> ShapResponse:
+    # Map to UI names and colors
+    ui_mapping = {
+        "Sleep_Hours": {"name": "Sleep Deprivation", "fill": "#ef4444"},        # Rose
+        "Workout_Duration_Min": {"name": "Low Physical Act.", "fill": "#06b6d4"}, # Cyan
+        "Journaling (Y/N)": {"name": "Social Isolation", "fill": "#8b5cf6"},      # Purple
+        "Reading_Min": {"name": "Academic/Workload", "fill": "#f59e0b"},          # Amber
+        "Screen_Time_Hours": {"name": "High Screen Time", "fill": "#64748b"}      # Slate
+    }
+
+    shap_features = []
+    # We take absolute value to show magnitude of impact, and multiply to scale linearly for the UI
+    for i, feature in enumerate(HABIT_FEATURES):
+        impact = float(abs(shap_vals[i])) * 15.0 
+        shap_features.append(ShapFeature(
+            name=ui_mapping[feature]["name"],
+            impact=impact,
+            fill=ui_mapping[feature]["fill"]
+        ))
+
+    # Sort by impact descending
+    shap_features.sort(key=lambda x: x.impact, reverse=True)
+    return ShapResponse(features=shap_features)
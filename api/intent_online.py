@@ -0,0 +1,254 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+
+import metrics
+from model_registry import REGISTRY, sha256_file
+
+# ================= CONFIG =================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REVIEWED_PATH = os.getenv("INTENT_REVIEWED_PATH", os.path.join(BASE_DIR, "data", "reviewed_messages.jsonl"))
+UPDATE_INTERVAL_S = float(os.getenv("INTENT_ONLINE_INTERVAL", "0"))  # seconds between background checks; 0 disables
+MIN_ROWS = int(os.getenv("INTENT_ONLINE_MIN_ROWS", "20"))           # new reviewed rows needed for an update
+EPOCHS = 5
+LEARNING_RATE = 0.02
+ANCHOR = 0.3  # pull towards the published weights after each epoch, so old intents aren't forgotten
+HOLDOUT_EVERY = int(os.getenv("INTENT_ONLINE_HOLDOUT_EVERY", "5"))      # every Nth reviewed row is held out, never trained on
+MIN_HELD_OUT = int(os.getenv("INTENT_ONLINE_MIN_HELD_OUT", "20"))       # held-out rows needed before the guard can judge
+MAX_ACCURACY_DROP = float(os.getenv("INTENT_ONLINE_MAX_DROP", "0.02"))  # tolerated held-out accuracy loss vs the base
+
+
+# ================= REVIEWED STORE =================
+class ReviewedStore:
+    """Append-only JSONL of reviewed (text, tag) pairs plus a cursor of what has been trained on.
+
+    The cursor (`<path>.state`) records the byte offset consumed by the last
+    published update, so each update reads only rows appended since. Rows an
+    update held out for evaluation go to `<path>.held_out` once it is published;
+    no version is ever trained on them.
+    """
+
+    def __init__(self, path: str = REVIEWED_PATH):
+        self.path = path
+        self.state_path = path + ".state"
+        self.held_out_path = path + ".held_out"
+        self._lock = threading.Lock()
+
+    def append(self, rows: List[dict], path: Optional[str] = None):
+        path = path or self.path
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def state(self) -> dict:
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"offset": 0, "rows": 0, "version": None}
+
+    def save_state(self, state: dict):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def held_out(self) -> List[dict]:
+        if not os.path.exists(self.held_out_path):
+            return []
+        with self._lock, open(self.held_out_path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def pending(self, offset: Optional[int] = None) -> Tuple[List[dict], int]:
+        # Rows after `offset` (default: the cursor), and the offset just past them
+        offset = self.state()["offset"] if offset is None else offset
+        if not os.path.exists(self.path):
+            return [], offset
+        with self._lock, open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # ignore a line still being written
+        rows = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return rows, offset + end
+
+
+# ================= WARM-STARTED UPDATE =================
+def class_for_tag(tag: str, bundle: dict) -> str:
+    """Classifier class for a reviewed tag: raw intents tags go through merge_map like at training time."""
+    from chatbot_engine import normalize_tag
+    classes = set(str(c) for c in bundle["pipeline"].classes_)
+    label = normalize_tag(tag, bundle)
+    if label not in classes:
+        raise ValueError(f"Unknown intent '{tag}' (new intents need a full retrain)")
+    return label
+
+
+def warm_update(bundle: dict, texts: List[str], labels: List[str],
+                epochs: int = EPOCHS, lr: float = LEARNING_RATE, anchor: float = ANCHOR, seed: int = 0) -> dict:
+    """Copy of the bundle with every calibrated LinearSVC nudged towards the new examples.
+
+    Vocabularies, idf and the Platt calibrators stay frozen; only coef_/intercept_
+    move. Each epoch runs one-vs-rest hinge-loss SGD over the new rows only (a
+    step touches just the row's non-zero columns), then pulls the weights back
+    towards the published ones by `anchor`.
+    """
+    bundle = copy.deepcopy(bundle)
+    pipeline = bundle["pipeline"]
+    X = pipeline.steps[0][1].transform(texts).tocsr()
+    rng = np.random.default_rng(seed)
+    for cc in pipeline.steps[-1][1].calibrated_classifiers_:
+        est = cc.estimator
+        class_index = {str(c): i for i, c in enumerate(est.classes_)}
+        W0 = np.asarray(est.coef_, dtype=np.float64)
+        W, b = W0.copy(), np.asarray(est.intercept_, dtype=np.float64).copy()
+        for _ in range(epochs):
+            for i in rng.permutation(X.shape[0]):
+                c = class_index.get(labels[i])
+                if c is None:  # class missing from this calibration fold
+                    continue
+                idx, vals = X.indices[X.indptr[i]: X.indptr[i + 1]], X.data[X.indptr[i]: X.indptr[i + 1]]
+                y = np.full(len(b), -1.0)
+                y[c] = 1.0
+                margin = y * (W[:, idx] @ vals + b)
+                viol = np.flatnonzero(margin < 1.0)
+                if len(viol):
+                    W[np.ix_(viol, idx)] += lr * y[viol, None] * vals[None, :]
+                    b[viol] += lr * y[viol]
+            W -= anchor * (W - W0)
+        est.coef_, est.intercept_ = W, b
+    return bundle
+
+
+# ================= HELD-OUT GUARD =================
+def split_held_out(rows: list, every: int = HOLDOUT_EVERY) -> Tuple[list, list]:
+    """(train, held out): every `every`-th row is held out."""
+    train, held_out = [], []
+    for i, row in enumerate(rows, 1):
+        (held_out if every > 1 and i % every == 0 else train).append(row)
+    return train, held_out
+
+
+def accuracy(bundle: dict, rows: List[Tuple[str, str]]) -> float:
+    pred = bundle["pipeline"].predict([t for t, _ in rows])
+    return float(np.mean(pred == np.array([l for _, l in rows])))
+
+
+def accepts(base: dict, candidate: dict, held_out: List[Tuple[str, str]],
+            max_drop: float = MAX_ACCURACY_DROP) -> Tuple[bool, float, float]:
+    """Whether `candidate` may replace `base`: its accuracy on reviewed rows neither has trained on
+    is at most `max_drop` lower. Returns (accepted, base accuracy, candidate accuracy)."""
+    base_acc, new_acc = accuracy(base, held_out), accuracy(candidate, held_out)
+    return new_acc >= base_acc - max_drop, base_acc, new_acc
+
+
+# ================= BACKGROUND TRAINER =================
+class OnlineIntentTrainer:
+    """Turns newly reviewed messages into a new intent model version in the registry.
+
+    An update starts from the active version, applies `warm_update` over the
+    rows appended since the last one (minus every HOLDOUT_EVERY-th, kept for
+    evaluation), registers the result as `online-<time>-<sha>` and activates
+    it; rolling back is the usual /admin/models/intent/rollback. The guard
+    scores base and candidate on every held-out reviewed row so far, earlier
+    ones included, and waits until there are MIN_HELD_OUT of them. An update
+    whose accuracy there falls more than MAX_ACCURACY_DROP below the base is
+    rejected: nothing is registered and its rows stay pending.
+    """
+
+    def __init__(self, store: Optional[ReviewedStore] = None):
+        self.store = store or ReviewedStore()
+        self.last: Dict[str, object] = {}
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self, interval: float = UPDATE_INTERVAL_S):
+        if interval > 0:
+            threading.Thread(target=self._run, args=(interval,), name="intent-online", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.update(min_rows=MIN_ROWS)
+            except Exception as e:
+                print(f"Online intent update failed: {e}")
+
+    def status(self) -> dict:
+        state = self.store.state()
+        rows, _ = self.store.pending(state["offset"])
+        return {"pending_rows": len(rows), "trained_rows": state["rows"], "held_out_rows": len(self.store.held_out()),
+                "version": state["version"],
+                "running": self._running.locked(), "last_update": self.last}
+
+    def update(self, min_rows: int = 1) -> Optional[dict]:
+        """Publish a new version from pending rows; None when there is too little to learn from or to judge by.
+
+        Returns the update summary, with "status" "published" or "rejected".
+        """
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            im = REGISTRY.active("intent")
+            if im is None:
+                return None
+            state = self.store.state()
+            rows, end = self.store.pending(state["offset"])
+            valid = []
+            for row in rows:
+                try:
+                    valid.append({"text": row["text"], "tag": class_for_tag(row["tag"], im.artifact)})
+                except (KeyError, ValueError):
+                    metrics.inc("intent_online.skipped_rows")
+            train, held_out = split_held_out(valid)
+            eval_rows = []
+            for row in self.store.held_out() + held_out:
+                try:
+                    eval_rows.append((row["text"], class_for_tag(row["tag"], im.artifact)))
+                except ValueError:  # class dropped by a full retrain since it was held out
+                    continue
+            if len(train) < min_rows or len(eval_rows) < MIN_HELD_OUT:
+                return None
+
+            t0 = time.perf_counter()
+            bundle = warm_update(im.artifact, [r["text"] for r in train], [r["tag"] for r in train])
+            train_ms = (time.perf_counter() - t0) * 1000
+            ok, base_acc, new_acc = accepts(im.artifact, bundle, eval_rows, MAX_ACCURACY_DROP)
+            summary = {"base": im.version, "rows": len(train), "held_out_rows": len(eval_rows),
+                       "base_accuracy": round(base_acc, 4), "accuracy": round(new_acc, 4),
+                       "train_ms": round(train_ms, 1), "finished_at": time.time()}
+            if not ok:
+                self.last = {"status": "rejected", "version": None, **summary}
+                metrics.inc("intent_online.rejected")
+                print(f"Intent update from {im.version} + {len(train)} reviewed messages rejected: "
+                      f"held-out accuracy {new_acc:.4f} < {base_acc:.4f} - {MAX_ACCURACY_DROP}")
+                return self.last
+
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, os.path.basename(im.path))
+                joblib.dump(bundle, path)
+                # The content hash keeps names unique when two updates land in the same second
+                version = f"online-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{sha256_file(path)[:8]}"
+                REGISTRY.register("intent", path, version, f"warm update of {im.version} with {len(train)} reviewed messages")
+            REGISTRY.activate("intent", version)
+            # Held-out rows are recorded before the cursor moves past them, so none is lost or trained on
+            self.store.append(held_out, self.store.held_out_path)
+            self.store.save_state({"offset": end, "rows": state["rows"] + len(train), "version": version})
+            self.last = {"status": "published", "version": version, **summary}
+            metrics.inc("intent_online.updates")
+            print(f"Intent model {version} published from {im.version} + {len(train)} reviewed messages in {train_ms:.0f} ms "
+                  f"(held-out accuracy {base_acc:.4f} -> {new_acc:.4f})")
+            return self.last
+        finally:
+            self._running.release()
@@ -0,0 +1,225 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+import metrics
+
+# ================= CONFIG =================
+def _parse_caps(raw: str) -> Dict[str, int]:
+    # "predict=2,explain_habit=1" -> running jobs allowed per type
+    caps = {}
+    for item in raw.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            caps[name.strip()] = int(value)
+    return caps
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", "3600"))          # finished jobs (and their results) are dropped after this
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "16"))     # per type, running + waiting
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", "100000"))
+JOB_CAPS = {
+    "predict": 2,
+    "predict_habit": 2,
+    "explain_habit": 1,
+    **_parse_caps(os.getenv("JOB_CAPS", "")),
+}
+CHUNK_ITEMS = {"predict": 500, "predict_habit": 2000, "explain_habit": 500}
+MODEL_KINDS = {"predict": "emotion", "predict_habit": "habit", "explain_habit": "habit"}
+
+
+# ================= WORKER =================
+def _ensure_model(kind: str, version: str):
+    # Worker processes serve the exact version the job was submitted against
+    from model_registry import REGISTRY
+    active = REGISTRY.active(kind)
+    if active is not None and active.version == version:
+        return active
+    return REGISTRY.activate(kind, version, persist=False)
+
+
+def run_chunk(job_type: str, version: str, items: List[Any]) -> List[dict]:
+    import inference
+
+    m = _ensure_model(MODEL_KINDS[job_type], version)
+    if job_type == "predict":
+        return inference.predict_batch(m, items)
+    if job_type == "predict_habit":
+        rows = [inference.habit_row(inference.HabitRequest(**item)) for item in items]
+        preds = inference.predict_habit_scores(m, rows)
+        return [inference.habit_response(row, pred).model_dump() for row, pred in zip(rows, preds)]
+    if job_type == "explain_habit":
+        rows = [inference.habit_row(inference.HabitRequest(**item)) for item in items]
+        X = pd.DataFrame(rows, columns=inference.HABIT_FEATURES)
+        return [inference.shap_response(v).model_dump() for v in inference.habit_shap_values(m, X)]
+    raise ValueError(f"Unknown job type '{job_type}'")
+
+
+# ================= JOBS =================
+class JobQueueFull(RuntimeError):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    type: str
+    model_version: str
+    items: List[Any]
+    total: int
+    status: str = "queued"           # queued / running / done / failed / cancelled
+    done: int = 0
+    error: Optional[str] = None
+    result: Optional[List[dict]] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancelled: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "model_version": self.model_version,
+            "total": self.total,
+            "done": self.done,
+            "progress": round(self.done / self.total, 4) if self.total else 1.0,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.finished_at + JOB_TTL_S if self.finished_at else None,
+        }
+
+
+class JobManager:
+    """Runs batch jobs on a shared process pool, outside the request/response cycle.
+
+    Each job gets a driver thread that waits for a slot of its type (JOB_CAPS),
+    then feeds chunks to the pool, two at a time, and collects them in order.
+    Cancellation is checked between chunks. Finished jobs stay in memory with
+    their results for JOB_TTL_S and are swept on the next access.
+    """
+
+    def __init__(self, run: Callable = run_chunk, workers: int = JOB_WORKERS, caps: Optional[Dict[str, int]] = None):
+        self.run = run
+        self.workers = workers
+        self.caps = JOB_CAPS if caps is None else caps
+        self._jobs: Dict[str, Job] = {}
+        self._slots = {t: threading.Semaphore(max(1, n)) for t, n in self.caps.items()}
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the server process has model-loader and watcher threads running
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def submit(self, job_type: str, model_version: str, items: List[Any]) -> Job:
+        if job_type not in self.caps:
+            raise ValueError(f"Unknown job type '{job_type}'")
+        self.sweep()
+        with self._lock:
+            live = sum(1 for j in self._jobs.values() if j.type == job_type and not j.finished)
+            if live >= JOB_MAX_QUEUED:
+                metrics.inc(f"jobs.rejected[{job_type}]")
+                raise JobQueueFull(f"Too many {job_type} jobs queued, please retry later")
+            job = Job(id=uuid.uuid4().hex, type=job_type, model_version=model_version, items=items, total=len(items))
+            self._jobs[job.id] = job
+        metrics.inc(f"jobs.submitted[{job_type}]")
+        threading.Thread(target=self._drive, args=(job,), name=f"job-{job.id[:8]}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.sweep()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancelled.set()
+        return job
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and now - j.finished_at > JOB_TTL_S]:
+                del self._jobs[job_id]
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        counts: Dict[str, Dict[str, int]] = {t: {} for t in self.caps}
+        for job in list(self._jobs.values()):
+            counts[job.type][job.status] = counts[job.type].get(job.status, 0) + 1
+        return counts
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            job.cancelled.set()
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        job.status, job.error, job.finished_at = status, error, time.time()
+        job.items = []  # inputs are not needed once the job is over
+        metrics.inc(f"jobs.{status}[{job.type}]")
+
+    def _drive(self, job: Job):
+        slot = self._slots[job.type]
+        while not slot.acquire(timeout=0.5):
+            if job.cancelled.is_set():
+                self._finish(job, "cancelled")
+                return
+        try:
+            if job.cancelled.is_set():
+                self._finish(job, "cancelled")
+                return
+            job.status, job.started_at = "running", time.time()
+            size = CHUNK_ITEMS.get(job.type, 500)
+            chunks = [job.items[i: i + size] for i in range(0, len(job.items), size)]
+            pool = self._executor()
+            results: List[dict] = []
+            pending = []
+            for chunk in chunks:
+                pending.append(pool.submit(self.run, job.type, job.model_version, chunk))
+                if len(pending) >= 2:
+                    results.extend(self._collect(job, pending.pop(0)))
+                if job.cancelled.is_set():
+                    break
+            while pending and not job.cancelled.is_set():
+                results.extend(self._collect(job, pending.pop(0)))
+            if job.cancelled.is_set():
+                for future in pending:
+                    future.cancel()
+                self._finish(job, "cancelled")
+                return
+            job.result = results
+            self._finish(job, "done")
+        except CancelledError:
+            self._finish(job, "cancelled")
+        except Exception as e:
+            print(f"Job {job.id} ({job.type}) failed: {e}")
+            self._finish(job, "failed", str(e))
+        finally:
+            slot.release()
+
+    def _collect(self, job: Job, future) -> List[dict]:
+        out = future.result()
+        job.done += len(out)
+        return out
@@ -0,0 +1,130 @@
+import json
+import os
+import re
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+import metrics
+
+# ================= CONFIG =================
+def _parse_limits(raw: str) -> Dict[str, int]:
+    # "/api/chat=8192,/api/predict=16384"
+    limits = {}
+    for item in raw.split(","):
+        if "=" in item:
+            path, value = item.split("=", 1)
+            limits[path.strip()] = int(value)
+    return limits
+
+
+DEFAULT_BODY_LIMIT = int(os.getenv("MAX_BODY_BYTES", str(64 * 1024)))
+BODY_LIMITS = {
+    "/api/chat": 16 * 1024,
+    "/api/predict": 32 * 1024,
+    "/api/analyze": 32 * 1024,
+    "/api/predict/timeline": 512 * 1024,
+    "/api/habit-prediction/batch": 1024 * 1024,
+    "/api/habits/ingest": 64 * 1024 * 1024,
+    "/api/jobs": 16 * 1024 * 1024,
+    **_parse_limits(os.getenv("BODY_LIMITS", "")),
+}
+
+# Longest text each endpoint feeds to the models; longer input is degraded or rejected
+TEXT_LIMITS = {
+    "predict": 2000,
+    "chat": 1000,
+    **_parse_limits(os.getenv("TEXT_LIMITS", "")),
+}
+TEXT_DEGRADE_MODE = os.getenv("TEXT_DEGRADE_MODE", "truncate").strip().lower()  # truncate / sample / reject
+SAMPLE_PIECES = 4
+RE_LAST_SPACE = re.compile(r"\s+\S*$")
+RE_FIRST_WORD = re.compile(r"^\S*\s+")
+
+
+# ================= BODY LIMITS =================
+class BodyLimitMiddleware:
+    """Rejects oversized request bodies with 413 while they are being received.
+
+    A declared Content-Length over the limit is refused before any body is read;
+    otherwise the byte count is checked chunk by chunk as the endpoint reads.
+    """
+
+    def __init__(self, app, limits: Optional[Dict[str, int]] = None, default: int = DEFAULT_BODY_LIMIT):
+        self.app = app
+        self.limits = BODY_LIMITS if limits is None else limits
+        self.default = default
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        limit = self.limits.get(path, self.default)
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            metrics.inc(f"limits.body_rejected[{path}]")
+            return await _send_413(send, limit)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    metrics.inc(f"limits.body_rejected[{path}]")
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def _send_413(send, limit: int):
+    body = json.dumps({"detail": f"Request body exceeds {limit} bytes"}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# ================= TEXT LIMITS =================
+def limit_text(text: str, endpoint: str, reject: bool = True) -> str:
+    """Bound the text an endpoint classifies: truncate, sample evenly across it, or reject.
+
+    reject=False truncates instead of rejecting (crisis messages are always answered).
+    """
+    limit = TEXT_LIMITS.get(endpoint)
+    if limit is None or len(text) <= limit:
+        return text
+    if TEXT_DEGRADE_MODE == "reject" and reject:
+        metrics.inc(f"limits.text_rejected[{endpoint}]")
+        raise HTTPException(status_code=413, detail=f"Text exceeds {limit} characters")
+    if TEXT_DEGRADE_MODE == "sample":
+        metrics.inc(f"limits.text_sampled[{endpoint}]")
+        return sample_text(text, limit)
+    metrics.inc(f"limits.text_truncated[{endpoint}]")
+    return _cut(text[:limit])
+
+
+def sample_text(text: str, limit: int, pieces: int = SAMPLE_PIECES) -> str:
+    # Evenly spaced slices keep signal from the whole entry, not just its opening
+    size = limit // pieces
+    stride = (len(text) - size) / max(pieces - 1, 1)
+    slices = []
+    for i in range(pieces):
+        start = int(i * stride)
+        piece = _cut(text[start: start + size])
+        if start > 0 and not text[start - 1].isspace():
+            piece = RE_FIRST_WORD.sub("", piece, count=1) or piece
+        slices.append(piece.strip())
+    return " ".join(p for p in slices if p)
+
+
+def _cut(piece: str) -> str:
+    # Drop a trailing partial word
+    cut = RE_LAST_SPACE.sub("", piece)
+    return cut or piece
@@ -0,0 +1,293 @@
+import json
+import math
+import os
+import pickle
+import re
+from collections import Counter
+from typing import List, Tuple
+
+import joblib
+import numpy as np
+
+# ================= CONFIG =================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+EMOTION_PKL = os.path.join(BASE_DIR, "emotion_model.pkl")
+INTENT_JOBLIB = os.path.join(DATA_DIR, "intent_model_best_final.joblib")
+EMOTION_NPZ = os.path.join(DATA_DIR, "emotion_linear.npz")
+INTENT_NPZ = os.path.join(DATA_DIR, "intent_linear.npz")
+
+# "sklearn" keeps the original estimators, "numpy" serves from the exported arrays
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "sklearn").strip().lower()
+RE_WS = re.compile(r"\s\s+")
+
+
+def use_numpy_backend() -> bool:
+    return INFERENCE_BACKEND == "numpy"
+
+
+# ================= FEATURES =================
+class TfidfBlock:
+    """Plain re-implementation of a fitted TfidfVectorizer (word / char_wb analyzers)."""
+
+    def __init__(self, meta: dict, terms: np.ndarray, idf: np.ndarray, offset: int = 0):
+        self.analyzer = meta["analyzer"]
+        self.ngram_range = tuple(meta["ngram_range"])
+        self.lowercase = bool(meta["lowercase"])
+        self.sublinear_tf = bool(meta["sublinear_tf"])
+        self.norm = meta["norm"]
+        self.token_re = re.compile(meta["token_pattern"]) if meta.get("token_pattern") else None
+        self.stop_words = frozenset(meta.get("stop_words") or ())
+        self.vocab = {str(t): i + offset for i, t in enumerate(terms.tolist())}
+        self.idf = idf.astype(np.float32)
+        self.offset = offset
+        self.size = len(terms)
+
+    def analyze(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        if self.analyzer == "char_wb":
+            return self._char_wb_ngrams(text)
+        return self._word_ngrams(self.token_re.findall(text))
+
+    def _word_ngrams(self, toks: List[str]) -> List[str]:
+        if self.stop_words:
+            toks = [w for w in toks if w not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return toks
+        grams = list(toks) if min_n == 1 else []
+        n_toks = len(toks)
+        for n in range(max(min_n, 2), min(max_n, n_toks) + 1):
+            for i in range(n_toks - n + 1):
+                grams.append(" ".join(toks[i: i + n]))
+        return grams
+
+    def _char_wb_ngrams(self, text: str) -> List[str]:
+        min_n, max_n = self.ngram_range
+        grams = []
+        for w in RE_WS.sub(" ", text).split():
+            w = " " + w + " "
+            w_len = len(w)
+            for n in range(min_n, max_n + 1):
+                offset = 0
+                grams.append(w[offset: offset + n])
+                while offset + n < w_len:
+                    offset += 1
+                    grams.append(w[offset: offset + n])
+                if offset == 0:
+                    break
+        return grams
+
+    def features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        counts = Counter()
+        vocab = self.vocab
+        for g in self.analyze(text):
+            j = vocab.get(g)
+            if j is not None:
+                counts[j] += 1
+        if not counts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        idx = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        if self.sublinear_tf:
+            tf = np.log(tf) + 1.0
+        vals = tf * self.idf[idx - self.offset]
+        if self.norm == "l2":
+            n = math.sqrt(float(np.dot(vals, vals)))
+            if n > 0:
+                vals /= n
+        elif self.norm == "l1":
+            n = float(np.abs(vals).sum())
+            if n > 0:
+                vals /= n
+        return idx, vals
+
+
+# ================= ENGINE =================
+class LinearTextModel:
+    """Tokenize -> sparse dot -> softmax / calibrated sigmoid, using only NumPy.
+
+    Mirrors the `predict_proba(list_of_texts)` / `classes_` surface of the sklearn
+    objects it was exported from, so it can stand in for them directly.
+    """
+
+    def __init__(self, blocks: List[TfidfBlock], head: str, classes: np.ndarray, heads: List[dict]):
+        self.blocks = blocks
+        self.head = head
+        self.classes_ = np.asarray(classes)
+        self.heads = heads
+        self.n_features = sum(b.size for b in blocks)
+
+    def features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        parts = [b.features(text) for b in self.blocks]
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def _scores(self, W: np.ndarray, b: np.ndarray, idx: np.ndarray, vals: np.ndarray) -> np.ndarray:
+        if len(idx) == 0:
+            return b.astype(np.float64)
+        return (vals @ W[idx]).astype(np.float64) + b
+
+    def _proba_one(self, idx: np.ndarray, vals: np.ndarray) -> np.ndarray:
+        if self.head == "softmax":
+            h = self.heads[0]
+            z = self._scores(h["W"], h["b"], idx, vals)
+            if len(self.classes_) == 2:
+                p1 = 1.0 / (1.0 + np.exp(-z[0]))
+                return np.array([1.0 - p1, p1])
+            z -= z.max()
+            e = np.exp(z)
+            return e / e.sum()
+
+        # calibrated sigmoid: average of per-fold, per-class Platt-scaled scores
+        n_classes = len(self.classes_)
+        out = np.zeros(n_classes)
+        for h in self.heads:
+            z = self._scores(h["W"], h["b"], idx, vals)
+            p = np.zeros(n_classes)
+            p[h["cls"]] = 1.0 / (1.0 + np.exp(h["a"] * z + h["c"]))
+            s = p.sum()
+            out += p / s if s > 0 else np.full(n_classes, 1.0 / n_classes)
+        return out / len(self.heads)
+
+    def predict_proba(self, texts) -> np.ndarray:
+        rows = [self._proba_one(*self.features(t)) for t in texts]
+        return np.vstack(rows) if rows else np.zeros((0, len(self.classes_)))
+
+    # ---------- persistence ----------
+    def save(self, path: str, source_sha256: str = ""):
+        # source_sha256 ties the arrays to the artifact they were exported from
+        arrays = {
+            "source_sha256": np.array(source_sha256),
+            "head": np.array(self.head),
+            "classes": self.classes_.astype(str),
+            "n_blocks": np.array(len(self.blocks)),
+            "n_heads": np.array(len(self.heads)),
+        }
+        for i, b in enumerate(self.blocks):
+            meta = {
+                "analyzer": b.analyzer,
+                "ngram_range": list(b.ngram_range),
+                "lowercase": b.lowercase,
+                "sublinear_tf": b.sublinear_tf,
+                "norm": b.norm,
+                "token_pattern": b.token_re.pattern if b.token_re else None,
+                "stop_words": sorted(b.stop_words),
+            }
+            terms = sorted(b.vocab, key=b.vocab.get)
+            arrays[f"block{i}_meta"] = np.array(json.dumps(meta))
+            arrays[f"block{i}_terms"] = np.array(terms, dtype=str)
+            arrays[f"block{i}_idf"] = b.idf
+        for i, h in enumerate(self.heads):
+            for k, v in h.items():
+                arrays[f"head{i}_{k}"] = np.asarray(v)
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearTextModel":
+        with np.load(path, allow_pickle=False) as z:
+            blocks, offset = [], 0
+            for i in range(int(z["n_blocks"])):
+                block = TfidfBlock(json.loads(str(z[f"block{i}_meta"])), z[f"block{i}_terms"], z[f"block{i}_idf"], offset)
+                offset += block.size
+                blocks.append(block)
+            heads = []
+            for i in range(int(z["n_heads"])):
+                prefix = f"head{i}_"
+                heads.append({k[len(prefix):]: z[k] for k in z.files if k.startswith(prefix)})
+            return cls(blocks, str(z["head"]), z["classes"], heads)
+
+    @staticmethod
+    def source_sha256(path: str) -> str:
+        # Only this one entry is read, so checking a stale export is cheap
+        with np.load(path, allow_pickle=False) as z:
+            return str(z["source_sha256"]) if "source_sha256" in z.files else ""
+
+
+# ================= EXPORT =================
+def _export_vectorizer(vec, offset: int) -> TfidfBlock:
+    if vec.analyzer not in ("word", "char_wb"):
+        raise ValueError(f"Unsupported analyzer: {vec.analyzer}")
+    if vec.preprocessor is not None or vec.tokenizer is not None or vec.strip_accents is not None:
+        raise ValueError("Custom preprocessor/tokenizer/strip_accents are not supported")
+    stop = vec.get_stop_words() if vec.analyzer == "word" else None
+    meta = {
+        "analyzer": vec.analyzer,
+        "ngram_range": list(vec.ngram_range),
+        "lowercase": vec.lowercase,
+        "sublinear_tf": vec.sublinear_tf,
+        "norm": vec.norm,
+        "token_pattern": vec.token_pattern if vec.analyzer == "word" else None,
+        "stop_words": sorted(stop) if stop else [],
+    }
+    terms = np.empty(len(vec.vocabulary_), dtype=object)
+    for term, j in vec.vocabulary_.items():
+        terms[j] = term
+    idf = vec.idf_ if vec.use_idf else np.ones(len(terms))
+    return TfidfBlock(meta, terms.astype(str), np.asarray(idf, dtype=np.float32), offset)
+
+
+def _export_blocks(features) -> List[TfidfBlock]:
+    vecs = [t for _, t in features.transformer_list] if hasattr(features, "transformer_list") else [features]
+    blocks, offset = [], 0
+    for v in vecs:
+        block = _export_vectorizer(v, offset)
+        offset += block.size
+        blocks.append(block)
+    return blocks
+
+
+def export_emotion(clf, vectorizer) -> LinearTextModel:
+    blocks = _export_blocks(vectorizer)
+    head = {
+        "W": np.ascontiguousarray(clf.coef_.T, dtype=np.float32),
+        "b": np.asarray(clf.intercept_, dtype=np.float64),
+    }
+    return LinearTextModel(blocks, "softmax", clf.classes_, [head])
+
+
+def export_intent(pipeline) -> LinearTextModel:
+    blocks = _export_blocks(pipeline.steps[0][1])
+    calibrated = pipeline.steps[-1][1]
+    if getattr(calibrated, "method", "sigmoid") != "sigmoid" or len(calibrated.classes_) < 3:
+        raise ValueError("Only multi-class sigmoid-calibrated linear models are supported")
+    classes = list(calibrated.classes_)
+    heads = []
+    for cc in calibrated.calibrated_classifiers_:
+        est = cc.estimator
+        heads.append({
+            "W": np.ascontiguousarray(est.coef_.T, dtype=np.float32),
+            "b": np.asarray(est.intercept_, dtype=np.float64),
+            "a": np.array([c.a_ for c in cc.calibrators], dtype=np.float64),
+            "c": np.array([c.b_ for c in cc.calibrators], dtype=np.float64),
+            "cls": np.array([classes.index(c) for c in est.classes_], dtype=np.int32),
+        })
+    return LinearTextModel(blocks, "calibrated", calibrated.classes_, heads)
+
+
+def load_emotion_engine(clf=None, vectorizer=None, npz_path: str = None) -> LinearTextModel:
+    # Exported arrays when given, otherwise export straight from the fitted estimators
+    if npz_path and os.path.exists(npz_path):
+        return LinearTextModel.load(npz_path)
+    return export_emotion(clf, vectorizer)
+
+
+def load_intent_engine(pipeline=None, npz_path: str = None) -> LinearTextModel:
+    if npz_path and os.path.exists(npz_path):
+        return LinearTextModel.load(npz_path)
+    return export_intent(pipeline)
+
+
+if __name__ == "__main__":
+    from model_registry import sha256_file
+
+    with open(EMOTION_PKL, "rb") as f:
+        data = pickle.load(f)
+    export_emotion(data["clf"], data["vectorizer"]).save(EMOTION_NPZ, sha256_file(EMOTION_PKL))
+    print(f"Emotion arrays written to {EMOTION_NPZ}")
+
+    bundle = joblib.load(INTENT_JOBLIB)
+    export_intent(bundle["pipeline"]).save(INTENT_NPZ, sha256_file(INTENT_JOBLIB))
+    print(f"Intent arrays written to {INTENT_NPZ}")
@@ -1,21 +1,45 @@
-from fastapi import FastAPI, HTTPException, APIRouter
+from fastapi import FastAPI, HTTPException, APIRouter, Request, Response, Header, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 import pandas as pd
-import joblib
-import pickle
+import numpy as np
 import re
 import os
-from typing import Optional, Dict, Any, List
-from chatbot_engine import respond, ChatState, asdict
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import date
+import chatbot_engine
+from chatbot_engine import respond_turn, ChatState, asdict
+from model_registry import REGISTRY, KINDS, LoadedModel
+from limits import BodyLimitMiddleware, limit_text
+from inference import (
+    clean_text, TokenContribution, PredictResponse, get_keyword_emotion, emotion_probs, decide_emotion, model_decided,
+    TRUTHY, HabitRequest, HabitResponse, ShapResponse, get_mood_feedback,
+    HABIT_FEATURES, habit_row, predict_habit_scores, habit_score, habit_response, habit_shap_values, shap_response,
+)
+from admission import ADMISSION, Overloaded
+import admission
+import metrics
+from habit_store import HabitAggregateStore
+from shap_summary import ShapSummaryService
+import jobs
+from emotion_explain import explainer_for
+import intent_online
+from intent_online import OnlineIntentTrainer
+from jobs import JobManager, JobQueueFull
 import json
 import random
-import shap
+import itertools
+import csv
+import threading
+import time
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "emotion_model.pkl")
-HABIT_MODEL_PATH = os.path.join(BASE_DIR, "mood_score_model.pkl")
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+FLOW_WATCH_INTERVAL = float(os.getenv("FLOW_WATCH_INTERVAL", "0"))  # seconds; 0 disables the file watcher
 
 app = FastAPI(title="MentalScope AI API")
 api_router = APIRouter(prefix="/api")
@@ -24,38 +48,56 @@ api_router = APIRouter(prefix="/api")
 async def root():
     return {"message": "MentalScope AI API is Running", "docs": "/docs", "health": "/api/health"}
 
-# ... (Global models and load_models remain the same)
+# Models are served from the versioned registry (model_registry.py). Handlers take one
+# LoadedModel snapshot per request, so an activation mid-request never mixes versions.
+MODEL_LOAD_ORDER = ("emotion", "habit", "intent")
+MODEL_LOAD_MODE = os.getenv("MODEL_LOAD_MODE", "background").strip().lower()  # background / blocking
 
-# Global models
-clf = None
-vectorizer = None
-habit_model = None
+def load_models_now():
+    # Each activation includes warmup inference, so a model is only marked ready once it is warm
+    for kind in MODEL_LOAD_ORDER:
+        try:
+            REGISTRY.activate(kind, persist=False)
+        except Exception as e:
+            print(f"Error loading {kind} model: {e}")
 
 @app.on_event("startup")
 def load_models():
-    global clf, vectorizer, habit_model
-    # Emotion Model
-    if os.path.exists(MODEL_PATH):
-        try:
-            with open(MODEL_PATH, "rb") as f:
-                data = pickle.load(f)
-                clf = data["clf"]
-                vectorizer = data["vectorizer"]
-            print(f"Emotion model loaded successfully from {MODEL_PATH}")
-        except Exception as e:
-            print(f"Error loading emotion model: {e}")
-    else:
-        print(f"Warning: Model file {MODEL_PATH} not found.")
+    if MODEL_LOAD_MODE == "blocking":
+        load_models_now()
+        return
+    # Let the server bind right away; /api/ready reports progress
+    threading.Thread(target=load_models_now, name="model-loader", daemon=True).start()
+
+def require_model(kind: str) -> LoadedModel:
+    m = REGISTRY.active(kind)
+    if m is None:
+        state = REGISTRY.status(kind)["state"]
+        detail = f"{kind} model failed to load" if state == "failed" else f"{kind} model is still loading"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+    return m
+
+def tag_versions(response: Response, *models: LoadedModel):
+    response.headers["X-Model-Version"] = ", ".join(f"{m.kind}={m.version}" for m in models if m is not None)
 
-    # Habit Model
-    if os.path.exists(HABIT_MODEL_PATH):
-        try:
-            habit_model = joblib.load(HABIT_MODEL_PATH)
-            print(f"Habit model loaded successfully from {HABIT_MODEL_PATH}")
-        except Exception as e:
-            print(f"Error loading habit model: {e}")
-    else:
-        print(f"Warning: Habit model file {HABIT_MODEL_PATH} not found.")
+@app.on_event("startup")
+def start_flow_watcher():
+    if FLOW_WATCH_INTERVAL > 0:
+        stop = threading.Event()
+        app.state.flow_watch_stop = stop
+        threading.Thread(
+            target=chatbot_engine.watch_flow_files, args=(FLOW_WATCH_INTERVAL, stop), daemon=True
+        ).start()
+        print(f"Watching chat flow data every {FLOW_WATCH_INTERVAL}s")
+
+@app.on_event("shutdown")
+def stop_flow_watcher():
+    stop = getattr(app.state, "flow_watch_stop", None)
+    if stop:
+        stop.set()
+
+# Bound request bodies while they are read (added first so CORS still wraps its 413s)
+app.add_middleware(BodyLimitMiddleware)
 
 # Enable CORS for React frontend
 app.add_middleware(
@@ -66,19 +108,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-_ws = re.compile(r"\s+")
-def clean_text(s: str) -> str:
-    return _ws.sub(" ", s.strip())
-
 # --- Emotion Detection Schemas ---
 class PredictRequest(BaseModel):
     text: str
 
-class PredictResponse(BaseModel):
-    emotion: str
-    confidence: float = 1.0
-    secondary_emotion: Optional[str] = None
-
 class DatasetSample(BaseModel):
     sentence: str
     emotion: str
@@ -88,218 +121,484 @@ class DatasetSamplesResponse(BaseModel):
     val: List[DatasetSample]
     test: List[DatasetSample]
 
-# --- Keyword Heuristics ---
-KEYWORD_OVERRIDE = {
-    "love": "Love / Affection",
-    "loved": "Love / Affection",
-    "affection": "Love / Affection",
-    "happy": "Joy",
-    "joy": "Joy",
-    "joyful": "Joy",
-    "sad": "Sadness",
-    "unhappy": "Sadness",
-    "miserable": "Sadness",
-    "angry": "Anger",
-    "furious": "Anger",
-    "annoyed": "Anger",
-    "anxious": "Fear / Anxiety",
-    "anxiety": "Fear / Anxiety",
-    "scared": "Fear / Anxiety",
-    "fear": "Fear / Anxiety",
-    "stressed": "Stress / Overwhelm",
-    "stress": "Stress / Overwhelm",
-    "overwhelmed": "Stress / Overwhelm",
-    "shock": "Surprise / Shock",
-    "shocked": "Surprise / Shock",
-    "shocking": "Surprise / Shock",
-    "surprised": "Surprise / Shock",
-    "proud": "Pride / Confidence",
-    "confident": "Pride / Confidence",
-    "hopeful": "Hope / Optimism",
-    "optimistic": "Hope / Optimism",
-    "disgusted": "Disgust",
-    "ashamed": "Shame / Guilt",
-    "guilt": "Shame / Guilt",
-    "guilty": "Shame / Guilt"
-}
-
-def get_keyword_emotion(text: str) -> Optional[str]:
-    t = text.lower().strip().replace("!", "").replace(".", "").replace("?", "")
-    return KEYWORD_OVERRIDE.get(t)
-
 # --- Habit Prediction Schemas ---
-class HabitRequest(BaseModel):
-    sleep_hours: float
-    workout_min: float
-    journaling: bool
-    reading_min: float
-    screen_time: float
-
-class HabitResponse(BaseModel):
-    mood_score: float
-    mood_range: str
-    message: str
-    tips: List[str]
-
-class ShapFeature(BaseModel):
-    name: str
-    impact: float
-    fill: str
-
-class ShapResponse(BaseModel):
-    features: List[ShapFeature]
-
-# --- Helpers ---
-def clamp(value: float, min_v: float, max_v: float) -> float:
-    return max(min_v, min(value, max_v))
-
-def apply_domain_penalty(score, sleep_hours, workout_min, journaling, reading_min, screen_time):
-    penalty = 0.0
-    if sleep_hours <= 5.0: penalty += 1.5
-    if workout_min == 0: penalty += 0.8
-    if reading_min == 0: penalty += 0.4
-    if not journaling: penalty += 0.3
-    if screen_time >= 8.0: penalty += 1.5
-    return clamp(score - penalty, 0.0, 10.0)
-
-def get_mood_feedback(score: float):
-    if score < 4.0:
-        return ("0.00–3.99 (Low)", "Your mood seems low today. Focus on rest and basic self-care.", 
-                ["Try 5–10 minutes of light movement", "Reduce screen time before sleeping", "Aim for consistent sleep", "Write 2-3 lines about feelings"])
-    elif score < 8.0:
-        return ("4.00–7.99 (Moderate)", "You’re doing okay — small habit tweaks can make you feel better.",
-                ["Add 10–20 min of activity", "Read or journal for 5–10 min", "Avoid screens 30 min before bed", "Keep sleep schedule consistent"])
-    else:
-        return ("8.00–10.00 (High)", "You’re in a great mental space today. Keep maintaining these habits!",
-                ["Maintain routine and sleep schedule", "Keep workouts consistent", "Balance work and rest", "Keep screen time in check"])
+class HabitBatchRequest(BaseModel):
+    items: List[HabitRequest]
+
+class HabitBatchResponse(BaseModel):
+    results: List[HabitResponse]
+
+# Fields of HabitRequest the what-if sliders can move
+SWEEP_FEATURES = ("sleep_hours", "workout_min", "journaling", "reading_min", "screen_time")
+MAX_SWEEP_POINTS = 2500
+
+class HabitSweepAxis(BaseModel):
+    feature: str
+    start: float
+    stop: float
+    step: float
+
+class HabitSweepRequest(BaseModel):
+    base: HabitRequest
+    axes: List[HabitSweepAxis]
+
+class HabitSweepResponse(BaseModel):
+    features: List[str]
+    values: List[List[float]]
+    curve: Optional[List[float]] = None        # one swept feature
+    grid: Optional[List[List[float]]] = None   # two: grid[i][j] for values[0][i], values[1][j]
 
 @api_router.post("/habit-prediction", response_model=HabitResponse)
-async def predict_habit(request: HabitRequest):
-    if habit_model is None:
-        return HabitResponse(mood_score=5.0, mood_range="Moderate", message="Model loading...", tips=[])
-
-    # Internal clamping rules (from habit message.py)
-    sleep = clamp(request.sleep_hours, 4.7, 9.4)
-    workout = clamp(request.workout_min, 0, 60)
-    reading = clamp(request.reading_min, 0, 60)
-    screen = clamp(request.screen_time, 3, 8.1)
-    journaling = 1 if request.journaling else 0
-
-    # Predict
-    features = ["Sleep_Hours", "Workout_Duration_Min", "Journaling (Y/N)", "Reading_Min", "Screen_Time_Hours"]
-    X = pd.DataFrame([[sleep, workout, journaling, reading, screen]], columns=features)
-    pred = float(habit_model.predict(X)[0])
-    
-    mood_score = clamp(pred, 0.0, 10.0)
-    mood_score = apply_domain_penalty(mood_score, sleep, workout, request.journaling, reading, screen)
-    mood_score = round(mood_score, 2)
-    
-    mood_range, message, tips = get_mood_feedback(mood_score)
-    
-    return HabitResponse(mood_score=mood_score, mood_range=mood_range, message=message, tips=tips)
+async def predict_habit(request: HabitRequest, response: Response):
+    hm = require_model("habit")
+    tag_versions(response, hm)
+
+    row = habit_row(request)
+    async with ADMISSION["habit"].admit():
+        pred = (await run_in_threadpool(predict_habit_scores, hm, [row]))[0]
+    return habit_response(row, pred)
+
+@api_router.post("/habit-prediction/batch", response_model=HabitBatchResponse)
+async def predict_habit_batch(request: HabitBatchRequest, response: Response):
+    hm = require_model("habit")
+    tag_versions(response, hm)
+    if not request.items:
+        return HabitBatchResponse(results=[])
+
+    rows = [habit_row(item) for item in request.items]
+    async with ADMISSION["habit"].admit():
+        preds = await run_in_threadpool(predict_habit_scores, hm, rows)
+    return HabitBatchResponse(results=[habit_response(row, pred) for row, pred in zip(rows, preds)])
+
+def sweep_values(axis: HabitSweepAxis) -> List[float]:
+    if axis.feature not in SWEEP_FEATURES:
+        raise HTTPException(status_code=400, detail=f"Unknown feature '{axis.feature}'")
+    if not all(np.isfinite([axis.start, axis.stop, axis.step])):
+        raise HTTPException(status_code=422, detail="Sweep start, stop and step must be finite")
+    if axis.step <= 0 or axis.stop < axis.start:
+        raise HTTPException(status_code=400, detail="Sweep needs step > 0 and stop >= start")
+    # Count in float first: a tiny step or a huge range would overflow int()
+    span = (axis.stop - axis.start) / axis.step
+    if not np.isfinite(span) or span + 1 > MAX_SWEEP_POINTS:
+        raise HTTPException(status_code=422, detail=f"Sweep too large (max {MAX_SWEEP_POINTS} points)")
+    n = int(np.floor(span + 1e-9)) + 1
+    values = [round(axis.start + i * axis.step, 6) for i in range(n)]
+    if axis.feature == "journaling" and any(v not in (0, 1) for v in values):
+        raise HTTPException(status_code=422, detail="journaling can only be swept over 0 and 1")
+    return values
+
+@api_router.post("/habit-sweep", response_model=HabitSweepResponse)
+async def habit_sweep(request: HabitSweepRequest, response: Response):
+    hm = require_model("habit")
+    tag_versions(response, hm)
+    if not 1 <= len(request.axes) <= 2:
+        raise HTTPException(status_code=400, detail="Sweep one or two features")
+    if len(request.axes) == 2 and request.axes[0].feature == request.axes[1].feature:
+        raise HTTPException(status_code=400, detail="Sweep two different features")
+
+    axes = [sweep_values(axis) for axis in request.axes]
+    if len(axes) == 2 and len(axes[0]) * len(axes[1]) > MAX_SWEEP_POINTS:
+        raise HTTPException(status_code=422, detail=f"Sweep too large (max {MAX_SWEEP_POINTS} points)")
+
+    # Every point on the curve/grid is the base request with the swept fields replaced
+    base = request.base.model_dump()
+    names = [axis.feature for axis in request.axes]
+    rows = []
+    for point in itertools.product(*axes):
+        values = dict(base, **dict(zip(names, point)))
+        values["journaling"] = bool(values["journaling"])
+        rows.append(habit_row(HabitRequest(**values)))
+
+    async with ADMISSION["habit"].admit():
+        preds = await run_in_threadpool(predict_habit_scores, hm, rows)
+    scores = [habit_score(row, pred) for row, pred in zip(rows, preds)]
+
+    if len(axes) == 1:
+        return HabitSweepResponse(features=names, values=axes, curve=scores)
+    width = len(axes[1])
+    grid = [scores[i: i + width] for i in range(0, len(scores), width)]
+    return HabitSweepResponse(features=names, values=axes, grid=grid)
 
 @api_router.post("/shap", response_model=ShapResponse)
-async def explain_habit(request: HabitRequest):
-    if habit_model is None:
-        return ShapResponse(features=[])
-
-    # Internal clamping rules (from habit message.py)
-    sleep = clamp(request.sleep_hours, 4.7, 9.4)
-    workout = clamp(request.workout_min, 0, 60)
-    reading = clamp(request.reading_min, 0, 60)
-    screen = clamp(request.screen_time, 3, 8.1)
-    journaling = 1 if request.journaling else 0
-
-    features = ["Sleep_Hours", "Workout_Duration_Min", "Journaling (Y/N)", "Reading_Min", "Screen_Time_Hours"]
-    X = pd.DataFrame([[sleep, workout, journaling, reading, screen]], columns=features)
-
-    # Extract pipeline steps
-    scaler = habit_model.named_steps["scaler"]
-    rf_model = habit_model.named_steps["model"]
-
-    # Scale input
-    X_scaled = scaler.transform(X)
-
-    # Calculate SHAP local explanation
-    explainer = shap.TreeExplainer(rf_model)
-    shap_vals = explainer.shap_values(X_scaled)[0]
-
-    # Map to UI names and colors
-    ui_mapping = {
-        "Sleep_Hours": {"name": "Sleep Deprivation", "fill": "#ef4444"},        # Rose
-        "Workout_Duration_Min": {"name": "Low Physical Act.", "fill": "#06b6d4"}, # Cyan
-        "Journaling (Y/N)": {"name": "Social Isolation", "fill": "#8b5cf6"},      # Purple
-        "Reading_Min": {"name": "Academic/Workload", "fill": "#f59e0b"},          # Amber
-        "Screen_Time_Hours": {"name": "High Screen Time", "fill": "#64748b"}      # Slate
-    }
-
-    shap_features = []
-    # We take absolute value to show magnitude of impact, and multiply to scale linearly for the UI
-    for i, feature in enumerate(features):
-        impact = float(abs(shap_vals[i])) * 15.0 
-        shap_features.append(ShapFeature(
-            name=ui_mapping[feature]["name"],
-            impact=impact,
-            fill=ui_mapping[feature]["fill"]
-        ))
-
-    # Sort by impact descending
-    shap_features.sort(key=lambda x: x.impact, reverse=True)
-    return ShapResponse(features=shap_features)
+async def explain_habit(request: HabitRequest, response: Response):
+    hm = require_model("habit")
+    tag_versions(response, hm)
+
+    X = pd.DataFrame([habit_row(request)], columns=HABIT_FEATURES)
+    async with ADMISSION["shap"].admit():
+        shap_vals = (await run_in_threadpool(habit_shap_values, hm, X))[0]
+    return shap_response(shap_vals)
+
+# --- Habit History Ingestion ---
+INGEST_CHUNK_ROWS = 1000
+# In process memory: empty after a restart, and separate in each uvicorn worker
+habit_store = HabitAggregateStore()
+
+class HabitIngestResponse(BaseModel):
+    accepted: int
+    rejected: int
+    out_of_order: int
+    users: int
+    errors: List[str] = []
+
+class HabitAggregatesResponse(BaseModel):
+    # Windows are calendar days ending at last_date; means are over the days logged inside them
+    user_id: str
+    days_logged: int
+    days_logged_30d: int
+    last_date: str
+    last_score: float
+    mean_7d: float
+    mean_30d: float
+    trend_30d: float      # mood points per day
+    low_days_30d: int
+    low_days_total: int
+
+async def iter_body_lines(request: Request):
+    # Raw lines; callers decode each one so a bad line is rejected on its own
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.strip()
+    if pending:
+        yield pending.strip()
+
+def parse_habit_log(record: Dict[str, Any]) -> Tuple[str, date, HabitRequest]:
+    journaling = record.get("journaling", False)
+    if isinstance(journaling, str):
+        journaling = journaling.strip().lower() in TRUTHY
+    habit = HabitRequest(
+        sleep_hours=record["sleep_hours"],
+        workout_min=record["workout_min"],
+        journaling=bool(journaling),
+        reading_min=record["reading_min"],
+        screen_time=record["screen_time"],
+    )
+    return str(record["user_id"]), date.fromisoformat(str(record["date"]).strip()), habit
+
+def ingest_habit_chunk(hm: LoadedModel, chunk: List[Tuple[str, date, HabitRequest]], result: HabitIngestResponse):
+    rows = [habit_row(habit) for _, _, habit in chunk]
+    preds = predict_habit_scores(hm, rows)
+    for (user_id, day, _), row, pred in zip(chunk, rows, preds):
+        score = habit_score(row, pred)
+        is_low = get_mood_feedback(score)[0].endswith("(Low)")
+        if habit_store.add(user_id, day, score, is_low):
+            result.accepted += 1
+        else:
+            result.out_of_order += 1
+    if SHAP_SUMMARY_ENABLED:
+        shap_summaries.submit(rows)
+
+async def ingest_chunk_admitted(hm: LoadedModel, chunk: List[Tuple[str, date, HabitRequest]], result: HabitIngestResponse):
+    # Model inference per chunk, off the event loop and under the habit lane. A 503 mid-body keeps the
+    # chunks already stored; a retry of the whole body reports those rows as out_of_order
+    async with ADMISSION["habit"].admit():
+        await run_in_threadpool(ingest_habit_chunk, hm, chunk, result)
+
+@api_router.post("/habits/ingest", response_model=HabitIngestResponse)
+async def ingest_habits(request: Request, response: Response):
+    # Body is NDJSON (one log per line) or CSV with a header row; rows per user must be in date order
+    hm = require_model("habit")
+    tag_versions(response, hm)
+
+    is_csv = "csv" in request.headers.get("content-type", "")
+    result = HabitIngestResponse(accepted=0, rejected=0, out_of_order=0, users=0)
+    header = None
+    chunk = []
+    users = set()
+    line_no = 0
+    async for raw in iter_body_lines(request):
+        line_no += 1
+        if not raw:
+            continue
+        try:
+            line = raw.decode("utf-8")
+            if is_csv:
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = [h.strip() for h in values]
+                    continue
+                record = dict(zip(header, values))
+            else:
+                record = json.loads(line)
+            parsed = parse_habit_log(record)
+        except Exception as e:
+            result.rejected += 1
+            if len(result.errors) < 20:
+                result.errors.append(f"line {line_no}: {e}")
+            continue
+        users.add(parsed[0])
+        chunk.append(parsed)
+        if len(chunk) >= INGEST_CHUNK_ROWS:
+            await ingest_chunk_admitted(hm, chunk, result)
+            chunk = []
+    if chunk:
+        await ingest_chunk_admitted(hm, chunk, result)
+
+    result.users = len(users)
+    return result
+
+@api_router.get("/habits/{user_id}/aggregates", response_model=HabitAggregatesResponse)
+async def habit_aggregates(user_id: str):
+    aggregates = habit_store.aggregates(user_id)
+    if aggregates is None:
+        raise HTTPException(status_code=404, detail="No habit history for this user")
+    return HabitAggregatesResponse(user_id=user_id, **aggregates)
+
+# --- Cohort SHAP Summaries ---
+# Mean |SHAP| per feature, dependence curves and per-mood-range breakdowns for the active
+# habit model, kept up to date by a background thread (reference rows + ingested rows)
+SHAP_SUMMARY_ENABLED = os.getenv("SHAP_SUMMARY_ENABLED", "1").strip().lower() not in {"0", "false", "no"}
+
+class ShapSummaryResponse(BaseModel):
+    model: str
+    state: str
+    rows: int
+    reference_rows: int
+    reference_source: str
+    updated_at: float
+    mean_abs_shap: Dict[str, float]
+    mean_shap: Dict[str, float]
+    by_mood_range: Dict[str, Dict[str, Any]]
+    dependence: Dict[str, Dict[str, Any]]
+
+def habit_mood_ranges(hm: LoadedModel, rows: List[List[float]]) -> List[str]:
+    preds = predict_habit_scores(hm, rows)
+    return [get_mood_feedback(habit_score(row, pred))[0] for row, pred in zip(rows, preds)]
+
+shap_summaries = ShapSummaryService(HABIT_FEATURES, habit_mood_ranges)
+
+@app.on_event("startup")
+def start_shap_summaries():
+    if SHAP_SUMMARY_ENABLED:
+        shap_summaries.start()
+
+@app.on_event("shutdown")
+def stop_shap_summaries():
+    shap_summaries.stop()
+
+@api_router.get("/shap/summary", response_model=ShapSummaryResponse)
+async def shap_cohort_summary(response: Response):
+    hm = require_model("habit")
+    tag_versions(response, hm)
+    summary = shap_summaries.summary(hm)
+    if summary is None or summary["rows"] == 0:
+        raise HTTPException(status_code=503, detail="SHAP summary is still being computed", headers={"Retry-After": "5"})
+    response.headers["Cache-Control"] = "no-cache" if summary["state"] == "computing" else "max-age=30"
+    return summary
 
 @api_router.post("/predict", response_model=PredictResponse)
-async def predict(request: PredictRequest):
-    if clf is None or vectorizer is None:
-        return PredictResponse(emotion="Neutral", confidence=0.0)
+async def predict(request: PredictRequest, response: Response, explain: bool = False, top: int = 5):
+    em = require_model("emotion")
+    tag_versions(response, em)
     
     raw_text = request.text.strip()
     cleaned = clean_text(raw_text)
     if not cleaned:
         raise HTTPException(status_code=400, detail="Empty text")
+    cleaned = limit_text(cleaned, "predict")
 
     # Layer 1: Keyword Override
     override = get_keyword_emotion(cleaned)
+    probs = None
     if override:
-        return PredictResponse(emotion=override, confidence=1.0)
-    
-    # Layer 2: ML Model with Confidence Handling
-    emb = vectorizer.transform([cleaned])
-    
-    # Get probabilities for all classes
-    probs = clf.predict_proba(emb)[0]
-    classes = clf.classes_
-    
-    # Sort by probability descending
-    top_indices = probs.argsort()[::-1]
-    
-    best_idx = top_indices[0]
-    best_emotion = classes[best_idx]
-    best_conf = float(probs[best_idx])
-    
-    secondary_emotion = None
-    if len(top_indices) > 1:
-        secondary_emotion = str(classes[top_indices[1]])
-
-    # Optimization: If best is "Neutral" but confidence is low (< 0.4) 
-    # and secondary is significantly present, maybe prefer secondary?
-    # Or just don't default to Neutral if it's a weak prediction.
-    if best_emotion == "Neutral" and best_conf < 0.35 and secondary_emotion:
-        # If Neutral is barely winning over a specific emotion, use the specific one
-        return PredictResponse(
-            emotion=secondary_emotion, 
-            confidence=float(probs[top_indices[1]]),
-            secondary_emotion=best_emotion
+        result = PredictResponse(emotion=override, confidence=1.0)
+    else:
+        # Layer 2: ML Model with Confidence Handling
+        # Get probabilities for all classes
+        async with ADMISSION["predict"].admit():
+            probs = (await run_in_threadpool(emotion_probs, em, [cleaned]))[0]
+        result = decide_emotion(em, probs)
+
+    # Token weights only explain a label the classifier picked, not a keyword override or the Neutral fallback
+    if explain and probs is not None and model_decided(em, probs, result):
+        # Exact linear contributions from the sparse features: well under a millisecond, no sampling
+        words = explainer_for(em).explain(cleaned, result.emotion, max(1, min(top, 50)))
+        result.explanation = [TokenContribution(token=w, weight=v) for w, v in words]
+    return result
+
+# --- Unified Analysis ---
+class IntentPrediction(BaseModel):
+    tag: str
+    confidence: float
+    confident: bool
+    top: List[Dict[str, Any]] = []
+
+class AnalyzeResponse(BaseModel):
+    emotion: PredictResponse
+    keyword_override: bool
+    intent: Optional[IntentPrediction] = None   # None while the intent model is still loading
+    crisis: bool
+    topic: str
+
+def analyze_text(em: LoadedModel, im: Optional[LoadedModel], cleaned: str, full: Optional[str] = None) -> AnalyzeResponse:
+    # Everything /api/predict and /api/chat work out about a message, from one cleaned copy;
+    # `full` is the untruncated text, used for the crisis and topic checks
+    full = cleaned if full is None else full
+    override = get_keyword_emotion(cleaned)
+    emotion = PredictResponse(emotion=override, confidence=1.0) if override else decide_emotion(em, emotion_probs(em, [cleaned])[0])
+    intent = None
+    if im is not None:
+        tag, conf, topk = chatbot_engine.predict_intent(cleaned, im)
+        intent = IntentPrediction(
+            tag=tag, confidence=conf, confident=conf >= chatbot_engine.confidence_threshold(im),
+            top=[{"tag": t, "confidence": c} for t, c in topk],
         )
+    return AnalyzeResponse(
+        emotion=emotion,
+        keyword_override=override is not None,
+        intent=intent,
+        crisis=chatbot_engine.is_crisis(full),
+        topic=chatbot_engine.detect_topic_from_text(full),
+    )
 
-    # Fallback to Neutral only if confidence is EXTREMELY low (< 0.15)
-    if best_conf < 0.15:
-        return PredictResponse(emotion="Neutral", confidence=best_conf, secondary_emotion=best_emotion)
+@api_router.post("/analyze", response_model=AnalyzeResponse)
+async def analyze(request: PredictRequest, response: Response):
+    em = require_model("emotion")
+    im = REGISTRY.active("intent")
+    tag_versions(response, em, im)
 
-    return PredictResponse(
-        emotion=best_emotion, 
-        confidence=best_conf, 
-        secondary_emotion=secondary_emotion
-    )
+    cleaned = clean_text(request.text)
+    if not cleaned:
+        raise HTTPException(status_code=400, detail="Empty text")
+    crisis = chatbot_engine.is_crisis(cleaned)
+    limited = limit_text(cleaned, "predict", reject=not crisis)
+
+    # Both models run in one threadpool hop; crisis text takes the priority lane
+    async with ADMISSION["predict"].admit(priority=crisis):
+        return await run_in_threadpool(analyze_text, em, im, limited, cleaned)
+
+# --- Emotion Timeline ---
+MAX_TIMELINE_SEGMENTS = int(os.getenv("MAX_TIMELINE_SEGMENTS", "200"))
+TIMELINE_STREAM_SEGMENTS = 40   # auto-stream above this many segments
+TIMELINE_BATCH = 32             # segments per model call when streaming
+RE_SENTENCE = re.compile(r"[^.!?\n]+[.!?]*")
+RE_WORD = re.compile(r"\S+")
+
+class TimelineRequest(BaseModel):
+    text: str
+    mode: str = "sentence"          # "sentence" or "window"
+    window_words: int = 40
+    stream: Optional[bool] = None   # None = stream only when the entry is long
+
+class TimelineSegment(BaseModel):
+    index: int
+    start: int
+    text: str
+    emotion: str
+    confidence: float
+    secondary_emotion: Optional[str] = None
+
+class TimelineResponse(BaseModel):
+    segments: List[TimelineSegment]
+    distribution: Dict[str, float]
+    dominant_emotion: Optional[str] = None
+    total_segments: int
+    truncated: bool = False
+
+def split_segments(text: str, mode: str, window_words: int) -> List[Tuple[int, str]]:
+    if mode == "window":
+        words = list(RE_WORD.finditer(text))
+        size = max(1, window_words)
+        return [
+            (words[i].start(), text[words[i].start(): words[min(i + size, len(words)) - 1].end()])
+            for i in range(0, len(words), size)
+        ]
+    segments = []
+    for m in RE_SENTENCE.finditer(text):
+        seg = m.group().strip()
+        if any(ch.isalnum() for ch in seg):
+            segments.append((m.start() + m.group().index(seg[0]), seg))
+    return segments
+
+def classify_segments(em: LoadedModel, segments: List[Tuple[int, str]], cleaned: List[str], offset: int,
+                      totals: np.ndarray) -> List[TimelineSegment]:
+    # cleaned: clean_text of each segment, already bounded by limit_text like /predict
+    probs = emotion_probs(em, cleaned)
+    class_index = {str(c): j for j, c in enumerate(em.artifact["clf"].classes_)}
+    results = []
+    for i, ((start, seg), text, p) in enumerate(zip(segments, cleaned, probs)):
+        override = get_keyword_emotion(text)
+        decided = PredictResponse(emotion=override, confidence=1.0) if override else decide_emotion(em, p)
+        # Length-weighted so a one-word aside doesn't count as much as a paragraph; an overridden
+        # segment counts for its override label, so the distribution agrees with the segments
+        if override in class_index:
+            p = np.zeros(len(p))
+            p[class_index[override]] = 1.0
+        totals += p * len(text)
+        results.append(TimelineSegment(index=offset + i, start=start, text=seg, **decided.model_dump()))
+    return results
+
+def timeline_distribution(em: LoadedModel, totals: np.ndarray) -> Tuple[Dict[str, float], Optional[str]]:
+    total = float(totals.sum())
+    if total <= 0:
+        return {}, None
+    dist = {str(c): round(float(v) / total, 4) for c, v in zip(em.artifact["clf"].classes_, totals)}
+    return dist, max(dist, key=dist.get)
+
+@api_router.post("/predict/timeline", response_model=TimelineResponse)
+async def predict_timeline(request: TimelineRequest, response: Response):
+    em = require_model("emotion")
+    if request.mode not in ("sentence", "window"):
+        raise HTTPException(status_code=400, detail="mode must be 'sentence' or 'window'")
+
+    segments = split_segments(request.text, request.mode, request.window_words)
+    if not segments:
+        raise HTTPException(status_code=400, detail="Empty text")
+    total_segments = len(segments)
+    segments = segments[:MAX_TIMELINE_SEGMENTS]
+    truncated = total_segments > len(segments)
+    # /predict's text limit per segment; in reject mode an oversized segment fails the request before any output
+    cleaned = [limit_text(clean_text(seg), "predict") for _, seg in segments]
+    totals = np.zeros(len(em.artifact["clf"].classes_))
+
+    stream = request.stream if request.stream is not None else len(segments) > TIMELINE_STREAM_SEGMENTS
+    if not stream:
+        tag_versions(response, em)
+        async with ADMISSION["timeline"].admit():
+            timeline = await run_in_threadpool(classify_segments, em, segments, cleaned, 0, totals)
+        distribution, dominant = timeline_distribution(em, totals)
+        return TimelineResponse(
+            segments=timeline, distribution=distribution, dominant_emotion=dominant,
+            total_segments=total_segments, truncated=truncated,
+        )
+
+    # NDJSON: one {"type": "segment"} line per segment, then a closing {"type": "summary"}.
+    # Each batch is classified in the threadpool under the timeline lane, holding a slot only
+    # while the model runs, not while the client reads
+    lane = ADMISSION["timeline"]
+
+    async def classify_batch(i: int) -> List[TimelineSegment]:
+        async with lane.admit():
+            return await run_in_threadpool(
+                classify_segments, em, segments[i: i + TIMELINE_BATCH], cleaned[i: i + TIMELINE_BATCH], i, totals
+            )
+
+    # The first batch is admitted before the response starts, so an overloaded server still answers 503
+    first = await classify_batch(0)
+
+    async def stream_timeline():
+        batch = first
+        for i in range(0, len(segments), TIMELINE_BATCH):
+            if i:
+                try:
+                    batch = await classify_batch(i)
+                except Overloaded as e:  # headers are gone; end the stream with an error line instead
+                    yield json.dumps({"type": "error", "detail": e.detail}) + "\n"
+                    return
+            for seg in batch:
+                yield json.dumps({"type": "segment", **seg.model_dump()}) + "\n"
+        distribution, dominant = timeline_distribution(em, totals)
+        yield json.dumps({
+            "type": "summary", "distribution": distribution, "dominant_emotion": dominant,
+            "total_segments": total_segments, "truncated": truncated,
+        }) + "\n"
+
+    streamed = StreamingResponse(stream_timeline(), media_type="application/x-ndjson")
+    tag_versions(streamed, em)
+    return streamed
 
 @api_router.get("/datasets/samples", response_model=DatasetSamplesResponse)
 async def get_dataset_samples():
@@ -327,6 +626,8 @@ async def get_dataset_samples():
     )
 
 # --- Chatbot Schemas ---
+CHAT_DEADLINE_S = float(os.getenv("CHAT_DEADLINE_S", "10"))  # end-to-end budget for one /chat request
+
 class ChatRequest(BaseModel):
     message: str
     state: Optional[Dict[str, Any]] = None
@@ -337,18 +638,281 @@ class ChatResponse(BaseModel):
     options: Optional[List[Dict[str, Any]]] = []
 
 @api_router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, response: Response):
+    # The deadline starts on arrival, so time spent queued for admission counts against it
+    deadline = time.monotonic() + CHAT_DEADLINE_S
     # Initialize state if none provided
     current_state = request.state or asdict(ChatState())
     
-    reply, new_state, options = respond(request.message, current_state)
+    # Crisis is checked on the whole message; only the text the models and the LLM see is shortened
+    crisis = chatbot_engine.is_crisis(request.message)
+    message = limit_text(request.message, "chat", reject=not crisis)
+    intent = REGISTRY.active("intent")
+    # Crisis messages take the priority lane: admitted immediately and never shed
+    try:
+        async with ADMISSION["chat"].admit(priority=crisis):
+            reply, new_state, options, used = await run_in_threadpool(
+                respond_turn, message, current_state, False, deadline, crisis, intent
+            )
+    except Overloaded:
+        metrics.inc("admission.degraded[chat]")
+        # Shed by the lane: the cheap in-process stages still run off the event loop
+        reply, new_state, options, used = await run_in_threadpool(
+            respond_turn, message, current_state, degraded=True, deadline=deadline, crisis=crisis
+        )
+    # Only when the intent model's prediction chose the reply, not for flow, crisis, pattern or Gemini replies
+    if used is not None:
+        tag_versions(response, used)
+    response.headers["X-Flow-Version"] = chatbot_engine.FLOW.version  # differs from a cached /flow ETag after a reload
     
     return ChatResponse(reply=reply, state=new_state, options=options)
 
+# --- Flow Graph ---
+# The static button graph, so clients walk button-only paths locally and only send free
+# text to /chat (with state.expecting set to the node they are on)
+FLOW_CACHE_MAX_AGE = int(os.getenv("FLOW_CACHE_MAX_AGE", "86400"))
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match may list several tags, weak (W/) or not, or be "*"
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+@api_router.get("/flow")
+async def get_flow(if_none_match: Optional[str] = Header(None)):
+    flow = chatbot_engine.FLOW
+    # The flow version is a content hash of chat_flow.json + the intents file
+    headers = {"ETag": f'"{flow.version}"', "Cache-Control": f"public, max-age={FLOW_CACHE_MAX_AGE}"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        metrics.inc("flow.not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(content=chatbot_engine.flow_json(flow), media_type="application/json", headers=headers)
+
+# --- Background Jobs ---
+# Batch predict / predict_habit / explain_habit run on a process pool (jobs.py); the
+# request only validates input and returns a job id to poll
+class JobRequest(BaseModel):
+    type: str
+    items: List[Any]
+
+class JobStatusResponse(BaseModel):
+    id: str
+    type: str
+    status: str
+    model_version: str
+    total: int
+    done: int
+    progress: float
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+
+class JobResultResponse(BaseModel):
+    id: str
+    type: str
+    model_version: str
+    results: List[Dict[str, Any]]
+
+job_manager = JobManager()
+
+@app.on_event("shutdown")
+def stop_jobs():
+    job_manager.shutdown()
+
+def job_items(job_type: str, items: List[Any]) -> List[Any]:
+    # Validate up front so a bad item is a 422 now rather than a failed job later
+    try:
+        if job_type == "predict":
+            return [item if isinstance(item, str) else PredictRequest(**item).text for item in items]
+        return [HabitRequest(**item).model_dump() for item in items]
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Invalid {job_type} item: {e}")
+
+def find_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@api_router.post("/jobs", response_model=JobStatusResponse, status_code=202)
+async def submit_job(request: JobRequest, response: Response):
+    if request.type not in jobs.MODEL_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job type '{request.type}' (expected {', '.join(jobs.MODEL_KINDS)})")
+    if not 0 < len(request.items) <= jobs.JOB_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A job needs 1 to {jobs.JOB_MAX_ITEMS} items")
+    m = require_model(jobs.MODEL_KINDS[request.type])
+    tag_versions(response, m)
+    items = job_items(request.type, request.items)
+    try:
+        job = job_manager.submit(request.type, m.version, items)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return job.info()
+
+@api_router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def job_status(job_id: str):
+    return find_job(job_id).info()
+
+@api_router.get("/jobs/{job_id}/result", response_model=JobResultResponse)
+async def job_result(job_id: str):
+    job = find_job(job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}" + (f": {job.error}" if job.error else ""))
+    return JobResultResponse(id=job.id, type=job.type, model_version=job.model_version, results=job.result)
+
+@api_router.delete("/jobs/{job_id}", response_model=JobStatusResponse)
+async def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.info()
+
+# --- Admin ---
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+class FlowStatusResponse(BaseModel):
+    version: str
+    loaded_at: float
+    load_ms: float
+    nodes: int
+    tags: int
+    warnings: List[str]
+    changed: Optional[bool] = None
+
+def flow_status(flow, changed: Optional[bool] = None) -> FlowStatusResponse:
+    return FlowStatusResponse(
+        version=flow.version, loaded_at=flow.loaded_at, load_ms=flow.load_ms,
+        nodes=len(flow.chat_flow), tags=len(flow.responses), warnings=flow.warnings, changed=changed,
+    )
+
+@api_router.get("/admin/flow", response_model=FlowStatusResponse, dependencies=[Depends(require_admin)])
+async def get_flow_status():
+    return flow_status(chatbot_engine.FLOW)
+
+@api_router.post("/admin/flow/reload", response_model=FlowStatusResponse, dependencies=[Depends(require_admin)])
+async def reload_flow():
+    previous = chatbot_engine.FLOW.version
+    try:
+        # Parsing and validation run on a worker thread; requests keep using the old snapshot until the swap
+        flow = await run_in_threadpool(chatbot_engine.reload_flow_data)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Reload rejected, keeping version {previous}: {e}")
+    return flow_status(flow, changed=flow.version != previous)
+
+class ModelActivateRequest(BaseModel):
+    version: str
+
+def model_kind(kind: str) -> str:
+    if kind not in KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown model kind '{kind}'")
+    return kind
+
+@api_router.get("/admin/models", dependencies=[Depends(require_admin)])
+async def list_models():
+    result = {}
+    for kind in KINDS:
+        active, previous = REGISTRY.active(kind), REGISTRY.previous(kind)
+        result[kind] = {
+            "active": active.info() if active else None,
+            "previous": previous.info() if previous else None,
+            "available": REGISTRY.manifests(kind),
+        }
+    return result
+
+@api_router.post("/admin/models/{kind}/activate", dependencies=[Depends(require_admin)])
+async def activate_model(kind: str, request: ModelActivateRequest):
+    kind = model_kind(kind)
+    try:
+        # Load, checksum and warm up on a worker thread; the old version keeps serving until the swap
+        loaded = await run_in_threadpool(REGISTRY.activate, kind, request.version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Activation failed: {e}")
+    return loaded.info()
+
+@api_router.post("/admin/models/{kind}/rollback", dependencies=[Depends(require_admin)])
+async def rollback_model(kind: str):
+    kind = model_kind(kind)
+    try:
+        return REGISTRY.rollback(kind).info()
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# Reviewed chat messages feed warm-started intent updates (intent_online.py), each published as a new version
+class ReviewedMessage(BaseModel):
+    text: str
+    tag: str
+
+class ReviewedMessagesRequest(BaseModel):
+    items: List[ReviewedMessage]
+
+intent_trainer = OnlineIntentTrainer()
+
+@app.on_event("startup")
+def start_intent_trainer():
+    intent_trainer.start()
+
+@app.on_event("shutdown")
+def stop_intent_trainer():
+    intent_trainer.stop()
+
+@api_router.post("/admin/intent/reviewed", dependencies=[Depends(require_admin)])
+async def add_reviewed_messages(request: ReviewedMessagesRequest):
+    im = require_model("intent")
+    rows, errors = [], []
+    for i, item in enumerate(request.items):
+        text = clean_text(item.text)
+        try:
+            if not text:
+                raise ValueError("empty text")
+            intent_online.class_for_tag(item.tag, im.artifact)
+        except ValueError as e:
+            errors.append(f"item {i}: {e}")
+            continue
+        rows.append({"text": text, "tag": item.tag, "reviewed_at": time.time()})
+    if rows:
+        intent_trainer.store.append(rows)
+    return {"accepted": len(rows), "rejected": len(errors), "errors": errors[:20], **intent_trainer.status()}
+
+@api_router.get("/admin/intent/online", dependencies=[Depends(require_admin)])
+async def intent_online_status():
+    return intent_trainer.status()
+
+@api_router.post("/admin/intent/update", dependencies=[Depends(require_admin)])
+async def intent_online_update():
+    # Runs on a worker thread; the current version keeps serving until the new one is warmed up and swapped in
+    result = await run_in_threadpool(intent_trainer.update)
+    if result is None:
+        raise HTTPException(status_code=409, detail="Nothing to update (too few pending or held-out reviewed messages, or an update is already running)")
+    if result["status"] == "rejected":
+        raise HTTPException(status_code=409, detail={"message": "Update rejected: held-out accuracy dropped", **result})
+    return result
+
 @api_router.get("/health")
 async def health():
     return {"status": "ok"}
 
+@api_router.get("/ready")
+async def ready():
+    # Liveness stays on /health; this reports whether every model is loaded and warmed up
+    models = {kind: REGISTRY.status(kind) for kind in MODEL_LOAD_ORDER}
+    is_ready = all(m["state"] == "ready" for m in models.values())
+    return JSONResponse(status_code=200 if is_ready else 503, content={"ready": is_ready, "models": models})
+
+@api_router.get("/metrics")
+async def get_metrics():
+    return {"counters": metrics.snapshot(), "admission": admission.snapshot(), "jobs": job_manager.snapshot(),
+            "breakers": {"gemini": chatbot_engine.GEMINI_BREAKER.snapshot()}}
+
 app.include_router(api_router)
 
 if __name__ == "__main__":
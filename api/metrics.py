@@ -0,0 +1,18 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+# ================= COUNTERS =================
+# Process-local counters, read by GET /api/metrics
+_lock = threading.Lock()
+_counters: Dict[str, int] = defaultdict(int)
+
+
+def inc(name: str, n: int = 1):
+    with _lock:
+        _counters[name] += n
+
+
+def snapshot() -> Dict[str, int]:
+    with _lock:
+        return dict(sorted(_counters.items()))
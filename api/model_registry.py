@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from linear_engine import DATA_DIR, LinearTextModel, use_numpy_backend, load_emotion_engine, load_intent_engine
+from forest_engine import compile_forest, is_forest
+
+# ================= CONFIG =================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", os.path.join(BASE_DIR, "models"))
+LEGACY_VERSION = "legacy"
+
+# Layout:
+#   models/<kind>/<version>/manifest.json  {"version", "file", "sha256", "created_at", "notes"}
+#   models/<kind>/<version>/<file>
+#   models/<kind>/ACTIVE                   version to activate on startup
+# The fixed paths the API always used are served as version "legacy" when nothing is registered.
+
+
+# ================= MODEL KINDS =================
+@dataclass(frozen=True)
+class ModelKind:
+    name: str
+    legacy_path: str
+    load: Callable[[str], Any]               # artifact path -> loaded artifact
+    build_engine: Callable[[Any, str, str], Any]  # (artifact, version dir, artifact sha256) -> array-backed engine or None
+    warmup: Callable[["LoadedModel"], None]
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    kind: str
+    version: str
+    path: str
+    sha256: Optional[str]
+    artifact: Any
+    engine: Any = None
+    load_ms: float = 0.0
+    warmup_ms: float = 0.0
+    activated_at: float = field(default_factory=time.time)
+
+    def info(self) -> dict:
+        return {
+            "kind": self.kind,
+            "version": self.version,
+            "sha256": self.sha256,
+            "backend": "numpy" if self.engine is not None else "sklearn",
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+            "activated_at": self.activated_at,
+        }
+
+
+WARMUP_TEXTS = ["hello", "I feel really stressed about my exams and can't sleep", "I'm happy today!"]
+WARMUP_HABITS = [[7.0, 30.0, 1.0, 20.0, 5.0], [5.0, 0.0, 0.0, 0.0, 8.0]]
+
+
+def _load_emotion(path: str):
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    return {"clf": data["clf"], "vectorizer": data["vectorizer"]}
+
+
+def _emotion_engine(artifact, version_dir: str, digest: str):
+    if not use_numpy_backend():
+        return None
+    return load_emotion_engine(artifact["clf"], artifact["vectorizer"], _npz(version_dir, "emotion_linear.npz", digest))
+
+
+def _warm_emotion(m: LoadedModel):
+    from emotion_explain import explainer_for  # imports this module
+    if m.engine is not None:
+        m.engine.predict_proba(WARMUP_TEXTS)
+    m.artifact["clf"].predict_proba(m.artifact["vectorizer"].transform(WARMUP_TEXTS))
+    # Build the per-version token explainer now, so the first ?explain=true request doesn't pay for it
+    explainer_for(m).explain(WARMUP_TEXTS[1], str(m.artifact["clf"].classes_[0]))
+
+
+def _intent_engine(artifact, version_dir: str, digest: str):
+    if not use_numpy_backend():
+        return None
+    return load_intent_engine(artifact["pipeline"], _npz(version_dir, "intent_linear.npz", digest))
+
+
+def _warm_intent(m: LoadedModel):
+    (m.engine or m.artifact["pipeline"]).predict_proba(WARMUP_TEXTS)
+
+
+def _habit_engine(artifact, version_dir: str, digest: str):
+    # Other habit regressors (boosting, linear) are served by sklearn directly
+    return compile_forest(artifact) if use_numpy_backend() and is_forest(artifact) else None
+
+
+def _warm_habit(m: LoadedModel):
+    if m.engine is not None:
+        m.engine.predict(np.asarray(WARMUP_HABITS))
+    else:
+        m.artifact.predict(pd.DataFrame(WARMUP_HABITS, columns=m.artifact.feature_names_in_))
+
+
+def _npz(version_dir: str, name: str, digest: str) -> Optional[str]:
+    # Exported arrays are only used when they were exported from this exact artifact; a stale
+    # export (the pkl/joblib replaced since) is ignored and the engine is rebuilt from the estimators
+    path = os.path.join(version_dir, name)
+    if not os.path.exists(path):
+        return None
+    if LinearTextModel.source_sha256(path) != digest:
+        print(f"Ignoring {path}: exported from a different artifact (re-run `python linear_engine.py`)")
+        return None
+    return path
+
+
+KINDS: Dict[str, ModelKind] = {
+    "emotion": ModelKind("emotion", os.path.join(BASE_DIR, "emotion_model.pkl"), _load_emotion, _emotion_engine, _warm_emotion),
+    "habit": ModelKind("habit", os.path.join(BASE_DIR, "mood_score_model.pkl"), joblib.load, _habit_engine, _warm_habit),
+    "intent": ModelKind("intent", os.path.join(BASE_DIR, "data", "intent_model_best_final.joblib"), joblib.load, _intent_engine, _warm_intent),
+}
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ================= REGISTRY =================
+class ModelRegistry:
+    """Versioned model store with atomic activation and one-step rollback.
+
+    `active(kind)` is a single dict read, so request handlers grab one LoadedModel
+    and use it throughout; activation loads + warms the new version on the caller's
+    (background) thread and only then swaps the reference.
+    """
+
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+        self._active: Dict[str, LoadedModel] = {}
+        self._previous: Dict[str, LoadedModel] = {}
+        self._locks = {kind: threading.Lock() for kind in KINDS}
+        self._state: Dict[str, dict] = {kind: {"state": "pending"} for kind in KINDS}
+
+    # ---------- lookup ----------
+    def active(self, kind: str) -> Optional[LoadedModel]:
+        return self._active.get(kind)
+
+    def previous(self, kind: str) -> Optional[LoadedModel]:
+        return self._previous.get(kind)
+
+    def status(self, kind: str) -> dict:
+        # "ready" whenever some version is serving; otherwise pending / loading / failed
+        state = dict(self._state[kind])
+        active = self._active.get(kind)
+        if active is None:
+            return state
+        status = {**active.info(), "state": "ready"}
+        if state["state"] in ("loading", "failed"):
+            status["activation"] = state
+        return status
+
+    def kind_dir(self, kind: str) -> str:
+        if kind not in KINDS:
+            raise KeyError(f"Unknown model kind '{kind}'")
+        return os.path.join(self.root, kind)
+
+    def manifests(self, kind: str) -> List[dict]:
+        found = []
+        kind_dir = self.kind_dir(kind)
+        if os.path.isdir(kind_dir):
+            for version in sorted(os.listdir(kind_dir)):
+                path = os.path.join(kind_dir, version, "manifest.json")
+                if os.path.isfile(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        found.append(json.load(f))
+        if os.path.exists(KINDS[kind].legacy_path):
+            found.insert(0, {"version": LEGACY_VERSION, "file": KINDS[kind].legacy_path, "sha256": None})
+        return found
+
+    def manifest(self, kind: str, version: str) -> dict:
+        for m in self.manifests(kind):
+            if m["version"] == version:
+                return m
+        raise KeyError(f"No {kind} model version '{version}'")
+
+    def default_version(self, kind: str) -> Optional[str]:
+        pointer = os.path.join(self.kind_dir(kind), "ACTIVE")
+        if os.path.isfile(pointer):
+            with open(pointer, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        versions = [m["version"] for m in self.manifests(kind)]
+        if LEGACY_VERSION in versions:
+            return LEGACY_VERSION
+        return versions[-1] if versions else None
+
+    # ---------- activation ----------
+    def load(self, kind: str, version: str) -> LoadedModel:
+        spec = KINDS[kind]
+        manifest = self.manifest(kind, version)
+        if version == LEGACY_VERSION:
+            # Legacy artifacts pick up arrays exported by `python linear_engine.py` into data/ (if still current)
+            path, version_dir = manifest["file"], DATA_DIR
+        else:
+            version_dir = os.path.join(self.kind_dir(kind), version)
+            path = os.path.join(version_dir, manifest["file"])
+
+        t0 = time.perf_counter()
+        digest = sha256_file(path)
+        if manifest.get("sha256") and digest != manifest["sha256"]:
+            raise ValueError(f"Checksum mismatch for {kind} {version}: {path}")
+        artifact = spec.load(path)
+        engine = spec.build_engine(artifact, version_dir, digest)
+        load_ms = round((time.perf_counter() - t0) * 1000, 2)
+
+        loaded = LoadedModel(kind=kind, version=version, path=path, sha256=digest, artifact=artifact, engine=engine, load_ms=load_ms)
+        t0 = time.perf_counter()
+        spec.warmup(loaded)
+        warmup_ms = round((time.perf_counter() - t0) * 1000, 2)
+        return LoadedModel(**{**loaded.__dict__, "warmup_ms": warmup_ms, "activated_at": time.time()})
+
+    def activate(self, kind: str, version: Optional[str] = None, persist: bool = True) -> LoadedModel:
+        version = version or self.default_version(kind)
+        if version is None:
+            raise FileNotFoundError(f"No {kind} model available")
+        with self._locks[kind]:
+            current = self._active.get(kind)
+            if current is not None and current.version == version:
+                return current
+            self._state[kind] = {"state": "loading", "version": version, "started_at": time.time()}
+            try:
+                loaded = self.load(kind, version)
+            except Exception as e:
+                self._state[kind] = {"state": "failed", "version": version, "error": str(e)}
+                raise
+            self._state[kind] = {"state": "ready", "version": version}
+            if current is not None:
+                self._previous[kind] = current
+            self._active[kind] = loaded
+            if persist and os.path.isdir(self.kind_dir(kind)):
+                self._write_pointer(kind, version)
+        print(f"{kind} model {version} active (load {loaded.load_ms} ms, warmup {loaded.warmup_ms} ms)")
+        return loaded
+
+    def rollback(self, kind: str) -> LoadedModel:
+        with self._locks[kind]:
+            previous = self._previous.get(kind)
+            if previous is None:
+                raise LookupError(f"No previous {kind} model to roll back to")
+            self._previous[kind], self._active[kind] = self._active[kind], previous
+            if os.path.isdir(self.kind_dir(kind)):
+                self._write_pointer(kind, previous.version)
+        print(f"{kind} model rolled back to {previous.version}")
+        return previous
+
+    def _write_pointer(self, kind: str, version: str):
+        pointer = os.path.join(self.kind_dir(kind), "ACTIVE")
+        tmp = pointer + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp, pointer)
+
+    # ---------- registration ----------
+    def register(self, kind: str, src: str, version: str, notes: str = "", extra_files: List[str] = ()) -> dict:
+        version_dir = os.path.join(self.kind_dir(kind), version)
+        if version == LEGACY_VERSION or os.path.exists(version_dir):
+            raise FileExistsError(f"{kind} version '{version}' already exists")
+        os.makedirs(version_dir)
+        name = os.path.basename(src)
+        shutil.copy2(src, os.path.join(version_dir, name))
+        for extra in extra_files:
+            shutil.copy2(extra, os.path.join(version_dir, os.path.basename(extra)))
+        manifest = {
+            "kind": kind,
+            "version": version,
+            "file": name,
+            "sha256": sha256_file(os.path.join(version_dir, name)),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "notes": notes,
+        }
+        with open(os.path.join(version_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+REGISTRY = ModelRegistry()
+
+
+if __name__ == "__main__":
+    # python model_registry.py list
+    # python model_registry.py register <emotion|habit|intent> <artifact> <version> [notes]
+    if len(sys.argv) >= 5 and sys.argv[1] == "register":
+        print(json.dumps(REGISTRY.register(sys.argv[2], sys.argv[3], sys.argv[4], " ".join(sys.argv[5:])), indent=2))
+    elif len(sys.argv) == 2 and sys.argv[1] == "list":
+        for kind in KINDS:
+            print(f"{kind} (startup: {REGISTRY.default_version(kind)})")
+            for m in REGISTRY.manifests(kind):
+                print(f"  {m['version']}  {m.get('sha256') or '-'}  {m.get('notes', '')}")
+    else:
+        print("usage: model_registry.py list | register <kind> <artifact> <version> [notes]")
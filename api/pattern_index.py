@@ -0,0 +1,68 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+RE_NON_WORD = re.compile(r"[^\w\s]")
+RE_WS = re.compile(r"\s+")
+
+
+def pattern_key(text: str) -> str:
+    return RE_WS.sub(" ", RE_NON_WORD.sub("", text.lower())).strip()
+
+
+# ================= PATTERN INDEX =================
+class PatternIndex:
+    """Nearest-neighbour lookup over every intent pattern.
+
+    Rows of `matrix` are L2-normalised TF-IDF vectors, one per pattern, so a
+    query's cosine similarity to all patterns is one sparse matrix-vector product.
+    Exact patterns (ignoring case and punctuation) resolve through a dict first.
+    """
+
+    def __init__(self, vectorizer: TfidfVectorizer, matrix, tags: List[str], patterns: List[str]):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.tags = tags
+        self.patterns = patterns
+        self.exact: Dict[str, int] = {}
+        for i, p in enumerate(patterns):
+            self.exact.setdefault(pattern_key(p), i)  # a pattern listed under two tags keeps the first
+
+    def search(self, text: str, k: int = 3) -> List[Tuple[str, str, float]]:
+        """Top-k (tag, pattern, cosine) matches."""
+        q = self.vectorizer.transform([text])
+        if q.nnz == 0:
+            return []
+        scores = (self.matrix @ q.T).toarray().ravel()
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.tags[i], self.patterns[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def lookup(self, text: str, min_score: float) -> Optional[Tuple[str, str, float]]:
+        """Exact pattern hit, else the best match if it is a near-duplicate (cosine >= min_score)."""
+        i = self.exact.get(pattern_key(text))
+        if i is not None:
+            return self.tags[i], self.patterns[i], 1.0
+        hits = self.search(text, 1)
+        if hits and hits[0][2] >= min_score:
+            return hits[0]
+        return None
+
+    def nbytes(self) -> int:
+        m = self.matrix
+        return m.data.nbytes + m.indices.nbytes + m.indptr.nbytes + self.vectorizer.idf_.nbytes
+
+
+def build_pattern_index(intents: List[dict]) -> PatternIndex:
+    tags, patterns = [], []
+    for intent in intents:
+        for p in intent.get("patterns", []):
+            if p.strip():
+                tags.append(intent["tag"])
+                patterns.append(p)
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, dtype=np.float32)
+    matrix = vectorizer.fit_transform(patterns).tocsr()
+    return PatternIndex(vectorizer, matrix, tags, patterns)
@@ -0,0 +1,388 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from model_registry import REGISTRY, LoadedModel
+
+# ================= CONFIG =================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SUMMARY_DIR = os.getenv("SHAP_SUMMARY_DIR", os.path.join(BASE_DIR, "data", "shap_summaries"))
+REFERENCE_CSV = os.getenv("SHAP_REFERENCE_CSV")      # sleep_hours, workout_min, journaling, reading_min, screen_time
+HABIT_DATASET = os.getenv("HABIT_DATASET")           # training CSV, as train_models.py reads it
+REFERENCE_ROWS = int(os.getenv("SHAP_REFERENCE_ROWS", "1000"))
+MIN_INGESTED_REFERENCE = 100  # ingested rows needed before they replace the synthetic sample
+BATCH_ROWS = 256
+PERSIST_EVERY_S = 30.0
+QUEUE_BATCHES = 64
+
+# Dependence-curve bins per feature, over the ranges habit_row clamps to
+FEATURE_RANGES = [(4.7, 9.4), (0, 60), (0, 1), (0, 60), (3, 8.1)]
+N_BINS = 10
+
+
+# ================= EXPLAINERS =================
+_explainers: Dict[str, object] = {}
+_explainer_lock = threading.Lock()
+
+
+def model_key(hm: LoadedModel) -> str:
+    return f"{hm.version}-{(hm.sha256 or '')[:12]}"
+
+
+BACKGROUND_ROWS = 100
+
+
+class BackgroundExplainer:
+    """Exact interventional SHAP for habit models TreeExplainer can't read (e.g. linear
+    models with interaction terms), against a sample of the reference rows.
+
+    Same surface as TreeExplainer: shap_values(X_scaled) and expected_value. With
+    five features the exact explainer evaluates all 32 coalitions per row.
+    """
+
+    def __init__(self, model, background: np.ndarray):
+        import shap
+        self.expected_value = float(np.mean(model.predict(background)))
+        self._explainer = shap.explainers.Exact(model.predict, shap.maskers.Independent(background, max_samples=len(background)))
+
+    def shap_values(self, X) -> np.ndarray:
+        return self._explainer(np.asarray(X, dtype=np.float64)).values
+
+
+def make_explainer(pipeline):
+    """TreeExplainer for tree models, BackgroundExplainer for anything else behind the scaler."""
+    import shap  # slow to import, so only on first use
+    model, scaler = pipeline.named_steps["model"], pipeline.named_steps["scaler"]
+    try:
+        return shap.TreeExplainer(model)
+    except Exception:  # shap raises InvalidModelError for models it has no tree parser for
+        rows, _ = reference_rows()
+        idx = np.random.default_rng(0).choice(len(rows), size=min(BACKGROUND_ROWS, len(rows)), replace=False)
+        background = scaler.transform(pd.DataFrame([rows[i] for i in idx], columns=pipeline.feature_names_in_))
+        return BackgroundExplainer(model, background)
+
+
+def explainer_for(hm: LoadedModel):
+    """SHAP explainer for a habit model version, built once and shared by /api/shap and the summaries."""
+    key = model_key(hm)
+    with _explainer_lock:
+        explainer = _explainers.get(key)
+        if explainer is None:
+            explainer = _explainers[key] = make_explainer(hm.artifact)
+        return explainer
+
+
+def shap_values(hm: LoadedModel, X: pd.DataFrame) -> np.ndarray:
+    return explainer_for(hm).shap_values(hm.artifact.named_steps["scaler"].transform(X))
+
+
+# ================= SUMMARY =================
+class ShapSummary:
+    """Additive SHAP statistics for one model version: every field is a running sum,
+    so new rows fold in without revisiting old ones."""
+
+    def __init__(self, model: str, features: List[str]):
+        self.model = model
+        self.features = features
+        n = len(features)
+        self.edges = [np.linspace(lo, hi, 3 if hi - lo == 1 else N_BINS + 1) for lo, hi in FEATURE_RANGES]
+        self.rows = 0
+        self.reference_rows = 0
+        self.reference_source = "synthetic"
+        self.sum_abs = np.zeros(n)
+        self.sum = np.zeros(n)
+        self.by_range: Dict[str, dict] = {}
+        self.dep_sum = [np.zeros(len(e) - 1) for e in self.edges]
+        self.dep_count = [np.zeros(len(e) - 1, dtype=np.int64) for e in self.edges]
+        self.updated_at = time.time()
+
+    def add(self, X: np.ndarray, values: np.ndarray, mood_ranges: List[str]):
+        self.rows += len(X)
+        self.sum_abs += np.abs(values).sum(axis=0)
+        self.sum += values.sum(axis=0)
+        for label in set(mood_ranges):
+            mask = np.array([m == label for m in mood_ranges])
+            group = self.by_range.setdefault(label, {"rows": 0, "sum_abs": np.zeros(len(self.features))})
+            group["rows"] += int(mask.sum())
+            group["sum_abs"] += np.abs(values[mask]).sum(axis=0)
+        for f, edges in enumerate(self.edges):
+            b = np.clip(np.searchsorted(edges, X[:, f], side="right") - 1, 0, len(edges) - 2)
+            np.add.at(self.dep_sum[f], b, values[:, f])
+            np.add.at(self.dep_count[f], b, 1)
+        self.updated_at = time.time()
+
+    def to_dict(self) -> dict:
+        rows = max(self.rows, 1)
+        return {
+            "model": self.model,
+            "rows": self.rows,
+            "reference_rows": self.reference_rows,
+            "reference_source": self.reference_source,
+            "updated_at": self.updated_at,
+            "mean_abs_shap": {f: round(float(v) / rows, 6) for f, v in zip(self.features, self.sum_abs)},
+            "mean_shap": {f: round(float(v) / rows, 6) for f, v in zip(self.features, self.sum)},
+            "by_mood_range": {
+                label: {
+                    "rows": g["rows"],
+                    "mean_abs_shap": {f: round(float(v) / max(g["rows"], 1), 6) for f, v in zip(self.features, g["sum_abs"])},
+                }
+                for label, g in sorted(self.by_range.items())
+            },
+            "dependence": {
+                f: {
+                    "bin_edges": [round(float(e), 4) for e in self.edges[i]],
+                    "mean_shap": [round(float(s) / c, 6) if c else None for s, c in zip(self.dep_sum[i], self.dep_count[i])],
+                    "rows": self.dep_count[i].tolist(),
+                }
+                for i, f in enumerate(self.features)
+            },
+        }
+
+    def state(self) -> dict:
+        # Raw sums, so a restart picks up where it left off
+        return {
+            "model": self.model, "features": self.features, "rows": self.rows, "reference_rows": self.reference_rows,
+            "reference_source": self.reference_source,
+            "sum_abs": self.sum_abs.tolist(), "sum": self.sum.tolist(), "updated_at": self.updated_at,
+            "by_range": {k: {"rows": g["rows"], "sum_abs": g["sum_abs"].tolist()} for k, g in self.by_range.items()},
+            "dep_sum": [d.tolist() for d in self.dep_sum], "dep_count": [d.tolist() for d in self.dep_count],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "ShapSummary":
+        s = cls(state["model"], state["features"])
+        s.rows, s.reference_rows, s.updated_at = state["rows"], state["reference_rows"], state["updated_at"]
+        s.reference_source = state.get("reference_source", "synthetic")
+        s.sum_abs, s.sum = np.array(state["sum_abs"]), np.array(state["sum"])
+        s.by_range = {k: {"rows": g["rows"], "sum_abs": np.array(g["sum_abs"])} for k, g in state["by_range"].items()}
+        s.dep_sum = [np.array(d) for d in state["dep_sum"]]
+        s.dep_count = [np.array(d, dtype=np.int64) for d in state["dep_count"]]
+        return s
+
+
+# ================= BACKGROUND SERVICE =================
+class ShapSummaryService:
+    """Keeps a ShapSummary per habit model version up to date on a background thread.
+
+    For each newly active model it first explains the reference rows, then folds
+    in rows handed to `submit` (e.g. from /api/habits/ingest), which also feed
+    the INGESTED reservoir of real rows. Sums and the reservoir are persisted to
+    SUMMARY_DIR so a restart does not recompute them. The worker only holds
+    `_lock` to fold computed values in, readers hold it to snapshot.
+    """
+
+    def __init__(self, features: List[str], mood_ranges: Callable[[LoadedModel, List[List[float]]], List[str]],
+                 directory: str = SUMMARY_DIR):
+        self.features = features
+        self.mood_ranges = mood_ranges
+        self.directory = directory
+        self._summaries: Dict[str, ShapSummary] = {}
+        self._status: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[List[List[float]]]" = queue.Queue(maxsize=QUEUE_BATCHES)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- API ----------
+    def start(self):
+        if self._thread is None:
+            INGESTED.load(self._reservoir_path())
+            self._thread = threading.Thread(target=self._run, name="shap-summary", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def submit(self, rows: List[List[float]]):
+        # Never blocks a request: when the worker is behind, the rows are counted and dropped
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            metrics.inc("shap_summary.dropped_rows", len(rows))
+
+    def summary(self, hm: LoadedModel) -> Optional[dict]:
+        s = self._summaries.get(model_key(hm))
+        if s is None:
+            return None
+        with self._lock:
+            snapshot = s.to_dict()
+        return {**snapshot, "state": self._status.get(s.model, "ready")}
+
+    def status(self, hm: LoadedModel) -> str:
+        return self._status.get(model_key(hm), "pending")
+
+    # ---------- worker ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _reservoir_path(self) -> str:
+        return os.path.join(self.directory, "ingested_reference.json")
+
+    def _write(self, path: str, state: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def _persist(self, s: ShapSummary):
+        with self._lock:
+            state = s.state()
+        self._write(self._path(s.model), state)
+        self._write(self._reservoir_path(), INGESTED.state())
+
+    def _explain(self, hm: LoadedModel, s: ShapSummary, rows: List[List[float]]):
+        X = np.asarray(rows, dtype=np.float64)
+        values = shap_values(hm, pd.DataFrame(X, columns=self.features))
+        mood_ranges = self.mood_ranges(hm, rows)
+        with self._lock:
+            s.add(X, values, mood_ranges)
+
+    def _prepare(self, hm: LoadedModel) -> ShapSummary:
+        key = model_key(hm)
+        path = self._path(key)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                s = ShapSummary.from_state(json.load(f))
+            self._summaries[key] = s
+            self._status[key] = "ready"
+            return s
+
+        s = ShapSummary(key, self.features)
+        reference, s.reference_source = reference_rows()
+        self._summaries[key] = s
+        self._status[key] = "computing"
+        t0 = time.perf_counter()
+        for i in range(0, len(reference), BATCH_ROWS):
+            if self._stop.is_set() or REGISTRY.active("habit") is not hm:
+                return s
+            self._explain(hm, s, reference[i: i + BATCH_ROWS])
+            with self._lock:
+                s.reference_rows = s.rows
+        self._status[key] = "ready"
+        self._persist(s)
+        print(f"SHAP summary for habit {key}: {s.rows} {s.reference_source} reference rows in {time.perf_counter() - t0:.1f}s")
+        return s
+
+    def _run(self):
+        last_persist = time.monotonic()
+        while not self._stop.is_set():
+            hm = REGISTRY.active("habit")
+            if hm is None:
+                self._stop.wait(1.0)
+                continue
+            try:
+                s = self._summaries.get(model_key(hm))
+                if s is None or self._status.get(s.model) == "computing":
+                    s = self._prepare(hm)
+                    continue
+                try:
+                    rows = self._queue.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                while len(rows) < BATCH_ROWS * 8:
+                    try:
+                        rows = rows + self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                self._explain(hm, s, rows)
+                INGESTED.add(rows)
+                metrics.inc("shap_summary.rows", len(rows))
+                if time.monotonic() - last_persist >= PERSIST_EVERY_S:
+                    self._persist(s)
+                    last_persist = time.monotonic()
+            except Exception as e:
+                print(f"SHAP summary update failed: {e}")
+                self._stop.wait(5.0)
+
+
+# ================= REFERENCE ROWS =================
+class ReservoirSample:
+    """Uniform sample of up to `capacity` rows out of every row ever added (reservoir sampling)."""
+
+    def __init__(self, capacity: int = REFERENCE_ROWS, seed: int = 0):
+        self.capacity = capacity
+        self.seen = 0
+        self._rows: List[List[float]] = []
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def add(self, rows: List[List[float]]):
+        with self._lock:
+            for row in rows:
+                self.seen += 1
+                if len(self._rows) < self.capacity:
+                    self._rows.append(list(row))
+                else:
+                    j = int(self._rng.integers(0, self.seen))
+                    if j < self.capacity:
+                        self._rows[j] = list(row)
+
+    def rows(self) -> List[List[float]]:
+        with self._lock:
+            return list(self._rows)
+
+    def state(self) -> dict:
+        with self._lock:
+            return {"seen": self.seen, "rows": list(self._rows)}
+
+    def load(self, path: str):
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            with self._lock:
+                self.seen, self._rows = state["seen"], state["rows"][: self.capacity]
+
+
+# Real rows seen by /api/habits/ingest, the reference once there are enough of them
+INGESTED = ReservoirSample()
+
+JOURNALING_TRUE = {"1", "1.0", "true", "yes", "y"}
+
+
+def csv_rows(path: str) -> np.ndarray:
+    """Habit rows from a CSV with either the API field names or the training dataset's column names."""
+    df = pd.read_csv(path)
+    columns = (["sleep_hours", "workout_min", "journaling", "reading_min", "screen_time"] if "sleep_hours" in df.columns
+               else ["Sleep_Hours", "Workout_Duration_Min", "Journaling (Y/N)", "Reading_Min", "Screen_Time_Hours"])
+    df = df[columns].dropna()
+    journaling = df[columns[2]].map(lambda v: str(v).strip().lower() in JOURNALING_TRUE)
+    return np.column_stack([df[columns[0]], df[columns[1]], journaling, df[columns[3]], df[columns[4]]])
+
+
+def reference_rows() -> Tuple[List[List[float]], str]:
+    """Clamped habit rows to explain for a new model, and where they came from.
+
+    Real rows first: SHAP_REFERENCE_CSV, else the HABIT_DATASET training CSV,
+    else the ingested reservoir once it holds MIN_INGESTED_REFERENCE rows; a
+    seeded uniform sample over the clamp ranges only when there are none.
+    """
+    path = next((p for p in (REFERENCE_CSV, HABIT_DATASET) if p and os.path.exists(p)), None)
+    ingested = INGESTED.rows()
+    if path:
+        raw, source = csv_rows(path), os.path.basename(path)
+        if len(raw) > REFERENCE_ROWS:
+            raw = raw[np.random.default_rng(0).choice(len(raw), size=REFERENCE_ROWS, replace=False)]
+    elif len(ingested) >= MIN_INGESTED_REFERENCE:
+        raw, source = np.asarray(ingested, dtype=np.float64), "ingested"
+    else:
+        source = "synthetic"
+        rng = np.random.default_rng(0)
+        n = REFERENCE_ROWS
+        raw = np.column_stack([
+            rng.uniform(4.7, 9.4, n).round(1),
+            rng.integers(0, 61, n),
+            rng.integers(0, 2, n),
+            rng.integers(0, 61, n),
+            rng.uniform(3, 8.1, n).round(1),
+        ])
+    lo = np.array([r[0] for r in FEATURE_RANGES], dtype=np.float64)
+    hi = np.array([r[1] for r in FEATURE_RANGES], dtype=np.float64)
+    return np.clip(raw.astype(np.float64), lo, hi).tolist(), source
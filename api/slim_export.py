@@ -0,0 +1,199 @@
+"""Write compact inference-only copies of the emotion and intent artifacts.
+
+    python slim_export.py                      # -> data/slim/, with a before/after report
+    python slim_export.py --min-agreement 0.999
+    python model_registry.py register intent data/slim/intent_model_best_final.joblib slim-1
+
+Each artifact is stripped of training-only attributes, its linear coefficients
+are stored as float32, and vocabulary terms whose largest possible contribution
+(max |coef| x idf) is negligible are dropped. The pruning level is the largest
+one that still agrees with the original model on at least --min-agreement of
+the evaluation texts (intent patterns and responses).
+"""
+import argparse
+import copy
+import json
+import os
+import pickle
+import subprocess
+import sys
+from typing import Callable, List, Tuple
+
+import joblib
+import numpy as np
+
+from linear_engine import BASE_DIR, DATA_DIR, EMOTION_PKL, INTENT_JOBLIB
+
+OUT_DIR = os.path.join(DATA_DIR, "slim")
+INTENTS_PATH = os.path.join(DATA_DIR, "intents chatbot nd4.json")
+PRUNE_QUANTILES = (0.0, 0.01, 0.02, 0.05, 0.1, 0.2, 0.3)  # pruning shifts the L2 norm, so agreement drops fast
+TRAINING_ONLY = ("stop_words_", "n_iter_")
+
+
+# ================= SLIMMING =================
+def _strip(obj):
+    for attr in TRAINING_ONLY:
+        if attr in vars(obj):
+            delattr(obj, attr)
+
+
+def _term_weights(vec, coefs: List[np.ndarray], offset: int) -> np.ndarray:
+    # Largest contribution a single occurrence of each term can make to any class score
+    cols = slice(offset, offset + len(vec.vocabulary_))
+    top = np.max([np.abs(c[:, cols]).max(axis=0) for c in coefs], axis=0)
+    return top * vec.idf_
+
+
+def _prune_vectorizer(vec, keep: np.ndarray):
+    """Keep only the vocabulary columns in `keep` (sorted old indices); returns them for slicing coef_."""
+    terms = np.empty(len(vec.vocabulary_), dtype=object)
+    for term, j in vec.vocabulary_.items():
+        terms[j] = term
+    idf = vec.idf_[keep]
+    vec.vocabulary_ = {terms[j]: i for i, j in enumerate(keep)}
+    vec.idf_ = idf
+    if hasattr(vec, "_tfidf"):
+        vec._tfidf.n_features_in_ = len(keep)
+    _strip(vec)
+    return keep
+
+
+def slim_emotion(data: dict, quantile: float) -> dict:
+    data = copy.deepcopy(data)
+    vec, clf = data["vectorizer"], data["clf"]
+    weights = _term_weights(vec, [clf.coef_], 0)
+    keep = np.flatnonzero(weights >= np.quantile(weights, quantile)) if quantile > 0 else np.arange(len(weights))
+    _prune_vectorizer(vec, keep)
+    clf.coef_ = np.ascontiguousarray(clf.coef_[:, keep], dtype=np.float32)
+    clf.n_features_in_ = len(keep)
+    _strip(clf)
+    return data
+
+
+def slim_intent(bundle: dict, quantile: float) -> dict:
+    bundle = copy.deepcopy(bundle)
+    pipeline = bundle["pipeline"]
+    features = pipeline.steps[0][1]
+    calibrated = pipeline.steps[-1][1]
+    estimators = [cc.estimator for cc in calibrated.calibrated_classifiers_]
+    coefs = [est.coef_ for est in estimators]
+
+    vecs = [t for _, t in features.transformer_list]
+    keep_cols, offset = [], 0
+    for vec in vecs:
+        weights = _term_weights(vec, coefs, offset)
+        keep = np.flatnonzero(weights >= np.quantile(weights, quantile)) if quantile > 0 else np.arange(len(weights))
+        _prune_vectorizer(vec, keep)
+        keep_cols.append(keep + offset)
+        offset += len(weights)
+    cols = np.concatenate(keep_cols)
+    for est in estimators:
+        est.coef_ = np.ascontiguousarray(est.coef_[:, cols], dtype=np.float32)
+        est.n_features_in_ = len(cols)
+        _strip(est)
+    calibrated.n_features_in_ = len(cols)
+    return bundle
+
+
+# ================= EVALUATION =================
+def eval_texts() -> List[str]:
+    with open(INTENTS_PATH, "r", encoding="utf-8") as f:
+        intents = json.load(f)["intents"]
+    return [t for i in intents for t in i.get("patterns", []) + i.get("responses", []) if t.strip()]
+
+
+def emotion_predict(data: dict, texts: List[str]) -> np.ndarray:
+    return data["clf"].predict(data["vectorizer"].transform(texts))
+
+
+def intent_predict(bundle: dict, texts: List[str]) -> np.ndarray:
+    return bundle["pipeline"].predict(texts)
+
+
+def choose(name: str, original, slim_fn: Callable, predict_fn: Callable, texts: List[str],
+           min_agreement: float) -> Tuple[object, float, float]:
+    # Most aggressive pruning level that keeps agreement with the original model
+    reference = predict_fn(original, texts)
+    best = None
+    for q in PRUNE_QUANTILES:
+        slim = slim_fn(original, q)
+        agreement = float(np.mean(predict_fn(slim, texts) == reference))
+        if agreement < min_agreement:
+            if best is None:  # even the unpruned float32 copy disagrees too often
+                raise SystemExit(
+                    f"{name}: no slim copy reaches --min-agreement {min_agreement} "
+                    f"(unpruned float32 agrees on {agreement:.4f}); keep the full model or lower the floor"
+                )
+            break
+        best = (slim, q, agreement)
+    return best
+
+
+# ================= REPORT =================
+LOAD_PROBE = """
+import json, os, pickle, sys, time, joblib
+def rss():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+import sklearn.linear_model, sklearn.svm, sklearn.calibration, sklearn.pipeline, sklearn.feature_extraction.text
+before = rss()
+t0 = time.perf_counter()
+path = sys.argv[1]
+if path.endswith(".pkl"):
+    with open(path, "rb") as f:
+        obj = pickle.load(f)
+else:
+    obj = joblib.load(path)
+print(json.dumps({"load_ms": (time.perf_counter() - t0) * 1000, "rss_bytes": rss() - before}))
+"""
+
+
+def probe(path: str) -> dict:
+    # Fresh interpreter per measurement so earlier loads don't skew RSS
+    out = subprocess.run([sys.executable, "-c", LOAD_PROBE, path], capture_output=True, text=True, check=True, cwd=BASE_DIR)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def report(name: str, before: str, after: str, quantile: float, agreement: float, n_terms: Tuple[int, int]):
+    b, a = probe(before), probe(after)
+    size_b, size_a = os.path.getsize(before), os.path.getsize(after)
+    print(f"\n{name}: pruned {n_terms[0] - n_terms[1]}/{n_terms[0]} terms (quantile {quantile}), agreement {agreement:.2%}")
+    print(f"  {'':10}{'before':>12}{'after':>12}")
+    print(f"  {'file':10}{size_b / 1024:>10.0f}KB{size_a / 1024:>10.0f}KB")
+    print(f"  {'load':10}{b['load_ms']:>10.1f}ms{a['load_ms']:>10.1f}ms")
+    print(f"  {'RSS':10}{b['rss_bytes'] / 1024:>10.0f}KB{a['rss_bytes'] / 1024:>10.0f}KB")
+
+
+def vocab_size(vecs) -> int:
+    return sum(len(v.vocabulary_) for v in vecs)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Export slim emotion/intent artifacts and report the savings.")
+    p.add_argument("--out-dir", default=OUT_DIR)
+    p.add_argument("--min-agreement", type=float, default=0.995)
+    args = p.parse_args(argv)
+    os.makedirs(args.out_dir, exist_ok=True)
+    texts = eval_texts()
+    print(f"Evaluating agreement on {len(texts)} texts")
+
+    with open(EMOTION_PKL, "rb") as f:
+        emotion = pickle.load(f)
+    slim, q, agreement = choose("emotion", emotion, slim_emotion, emotion_predict, texts, args.min_agreement)
+    out = os.path.join(args.out_dir, os.path.basename(EMOTION_PKL))
+    with open(out, "wb") as f:
+        pickle.dump(slim, f, protocol=pickle.HIGHEST_PROTOCOL)
+    report("emotion", EMOTION_PKL, out, q, agreement, (vocab_size([emotion["vectorizer"]]), vocab_size([slim["vectorizer"]])))
+
+    intent = joblib.load(INTENT_JOBLIB)
+    slim, q, agreement = choose("intent", intent, slim_intent, intent_predict, texts, args.min_agreement)
+    out = os.path.join(args.out_dir, os.path.basename(INTENT_JOBLIB))
+    joblib.dump(slim, out)
+    vecs = lambda b: [t for _, t in b["pipeline"].steps[0][1].transformer_list]
+    report("intent", INTENT_JOBLIB, out, q, agreement, (vocab_size(vecs(intent)), vocab_size(vecs(slim))))
+
+
+if __name__ == "__main__":
+    main()
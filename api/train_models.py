@@ -0,0 +1,313 @@
+"""Rebuild the emotion, intent and habit artifacts from their source data.
+
+    python train_models.py intent                          # data/intents chatbot nd4.json
+    python train_models.py emotion --emotion-dir .         # train.txt / val.txt / test.txt
+    python train_models.py habit --habit-csv habits.csv
+    python train_models.py all --jobs 8 --register v3
+    python train_models.py intent --search                 # grid-search C instead
+
+Hyperparameters are read from the shipped artifacts (the legacy paths the
+registry loads), so a rebuild reproduces the deployed settings; SHIPPED_PARAMS
+is only used when an artifact is missing. --search scores the *_GRID candidates
+in parallel (--jobs, default: all cores) and trains with the winner instead.
+Every random state is fixed, and each artifact gets a `<file>.json` report with
+the data hash, config, parameters, where they came from and scores. Artifacts
+keep the layout the API loads: {"clf", "vectorizer"} for emotion, the intent
+bundle with merge_map / confidence_threshold / fact_tag, and a scaler+model
+Pipeline for habits.
+
+Fitted vectorizers and their feature matrices are cached under data/cache/
+keyed by a hash of the source files and the feature config. This is not a
+speed-up on the shipped intent data: building its features takes ~80 ms and
+loading them ~17 ms (median of 7, one core), against seconds of classifier
+fitting, so whole-run timings are noise either way. It only saves
+tokenization, which matters for a large emotion corpus (not measured here:
+the splits don't ship with the tree).
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import time
+from typing import Callable, List, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV, KFold, StratifiedKFold
+from sklearn.pipeline import FeatureUnion, Pipeline
+from sklearn.preprocessing import MinMaxScaler
+from sklearn.svm import LinearSVC
+
+from linear_engine import BASE_DIR, DATA_DIR
+
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+OUT_DIR = os.path.join(DATA_DIR, "trained")
+INTENTS_PATH = os.path.join(DATA_DIR, "intents chatbot nd4.json")
+SEED = 42
+
+# ================= CONFIG =================
+# Same feature settings as the shipped artifacts
+INTENT_FEATURES = {
+    "word": {"analyzer": "word", "ngram_range": [1, 2], "min_df": 2, "sublinear_tf": True},
+    "char": {"analyzer": "char_wb", "ngram_range": [3, 4], "min_df": 2},
+}
+INTENT_C_GRID = [0.1, 0.25, 0.5, 1.0, 2.0]
+INTENT_BUNDLE = {
+    "merge_map": {
+        "morning": "greeting", "night": "greeting", "afternoon": "greeting", "evening": "greeting", "casual": "greeting",
+        "sad": "distress", "stressed": "distress", "depressed": "distress", "anxious": "distress", "scared": "distress",
+        "worthless": "distress", "default": "fallback", "no-approach": "fallback", "something-else": "fallback",
+        "not-talking": "fallback", "neutral-response": "fallback", "skill": "help", "learn-mental-health": "learn",
+        "learn-more": "learn", "mental-health-fact": "learn", "user-meditation": "meditation", "ask": "query",
+        "about": "query", "problem": "query", "hate-me": "negative", "hate-you": "negative", "stupid": "negative",
+        "wrong": "negative", "user-agree": "affirmation", "understand": "affirmation",
+    },
+    "confidence_threshold": 0.3,
+    "fact_tag": "fact",
+}
+
+EMOTION_FEATURES = {"analyzer": "word", "ngram_range": [1, 2], "max_features": 5000, "stop_words": "english"}
+EMOTION_C_GRID = [0.1, 0.25, 0.5, 1.0, 2.0, 4.0]
+EMOTION_SPLITS = ("train.txt", "val.txt", "test.txt")   # JSON lists of {"sentence", "emotion"}
+
+HABIT_COLUMNS = ["Sleep_Hours", "Workout_Duration_Min", "Journaling (Y/N)", "Reading_Min", "Screen_Time_Hours"]
+HABIT_TARGET = "Mood_Score"
+HABIT_GRID = {"model__n_estimators": [200, 400], "model__max_depth": [None, 12], "model__min_samples_leaf": [1, 3]}
+
+# Used only when the shipped artifact is missing; otherwise shipped_params reads the real values
+SHIPPED_PARAMS = {
+    "intent": {"C": 0.5, "max_iter": 1000},
+    "emotion": {"C": 0.5},
+    "habit": {"model__n_estimators": 400, "model__max_depth": None, "model__min_samples_leaf": 1},
+}
+
+
+def shipped_params(kind: str) -> Tuple[dict, str]:
+    """Hyperparameters of the shipped artifact for `kind`; returns (params, source)."""
+    from model_registry import KINDS
+    path = KINDS[kind].legacy_path
+    if not os.path.exists(path):
+        return dict(SHIPPED_PARAMS[kind]), "config"
+    artifact = KINDS[kind].load(path)
+    if kind == "intent":
+        estimator = artifact["pipeline"].named_steps["svm"].estimator
+    elif kind == "emotion":
+        estimator = artifact["clf"]
+    else:
+        estimator = artifact.named_steps["model"]
+    prefix = "model__" if kind == "habit" else ""
+    values = estimator.get_params()
+    return {k: values[k[len(prefix):]] for k in SHIPPED_PARAMS[kind]}, os.path.relpath(path, BASE_DIR)
+
+
+# ================= CACHE =================
+def hash_files(paths: List[str]) -> str:
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_config(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def cached(name: str, key: str, build: Callable[[], dict], refresh: bool = False) -> Tuple[dict, bool]:
+    """Load data/cache/<name>-<key>.joblib, or build and store it; returns (value, cache hit)."""
+    path = os.path.join(CACHE_DIR, f"{name}-{key[:16]}.joblib")
+    if os.path.exists(path) and not refresh:
+        return joblib.load(path), True
+    value = build()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = path + ".tmp"
+    joblib.dump(value, tmp)
+    os.replace(tmp, path)
+    return value, False
+
+
+def vectorizer(config: dict) -> TfidfVectorizer:
+    return TfidfVectorizer(**{k: tuple(v) if isinstance(v, list) else v for k, v in config.items()})
+
+
+# ================= INTENT =================
+def intent_label(tag: str) -> str:
+    # Same normalisation chatbot_engine.normalize_tag applies to predictions
+    if re.fullmatch(r"fact-\d+", tag or ""):
+        return INTENT_BUNDLE["fact_tag"]
+    return INTENT_BUNDLE["merge_map"].get(tag, tag)
+
+
+def train_intent(args) -> Tuple[str, object, dict]:
+    with open(INTENTS_PATH, "r", encoding="utf-8") as f:
+        intents = json.load(f)["intents"]
+    texts, labels = [], []
+    for intent in intents:
+        for p in intent.get("patterns", []):
+            if p.strip():
+                texts.append(p)
+                labels.append(intent_label(intent["tag"]))
+
+    def build():
+        union = FeatureUnion([(name, vectorizer(cfg)) for name, cfg in INTENT_FEATURES.items()])
+        return {"union": union, "X": union.fit_transform(texts)}
+
+    key = hash_config(hash_files([INTENTS_PATH]), INTENT_FEATURES, INTENT_BUNDLE, sklearn.__version__)
+    feats, hit = cached("intent", key, build, args.refresh)
+    X, y = feats["X"], np.array(labels)
+
+    params, source = shipped_params("intent")
+    max_iter = params["max_iter"]  # --search only varies C
+    if args.search:
+        svm = LinearSVC(loss="hinge", class_weight="balanced", random_state=SEED, max_iter=max_iter)
+        search = GridSearchCV(svm, {"C": INTENT_C_GRID}, cv=StratifiedKFold(5, shuffle=True, random_state=SEED),
+                              scoring="accuracy", n_jobs=args.jobs)
+        search.fit(X, y)
+        best, source, scores = search.best_params_["C"], "search", {"cv_accuracy": round(search.best_score_, 4)}
+    else:
+        best, scores = params["C"], {}
+    calibrated = CalibratedClassifierCV(
+        LinearSVC(C=best, loss="hinge", class_weight="balanced", random_state=SEED, max_iter=max_iter),
+        cv=3, method="sigmoid",
+    ).fit(X, y)
+    bundle = {"pipeline": Pipeline([("features", feats["union"]), ("svm", calibrated)]), **INTENT_BUNDLE}
+    report = {
+        "data_hash": key, "cache_hit": hit, "samples": len(texts), "classes": len(set(labels)),
+        "features": X.shape[1], "best_params": {"C": best, "max_iter": max_iter}, "params_source": source, **scores,
+        "train_accuracy": round(float(np.mean(bundle["pipeline"].predict(texts) == y)), 4),
+    }
+    return "intent_model_best_final.joblib", bundle, report
+
+
+# ================= EMOTION =================
+def train_emotion(args) -> Tuple[str, object, dict]:
+    paths = [os.path.join(args.emotion_dir, name) for name in EMOTION_SPLITS]
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        raise SystemExit(f"Emotion splits not found: {', '.join(missing)} (set --emotion-dir)")
+    splits = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        splits.append(([r["sentence"] for r in rows], np.array([r["emotion"] for r in rows])))
+
+    def build():
+        vec = vectorizer(EMOTION_FEATURES)
+        return {"vectorizer": vec, "X": [vec.fit_transform(splits[0][0])] + [vec.transform(t) for t, _ in splits[1:]]}
+
+    key = hash_config(hash_files(paths), EMOTION_FEATURES, sklearn.__version__)
+    feats, hit = cached("emotion", key, build, args.refresh)
+    (X_train, X_val, X_test), (y_train, y_val, y_test) = feats["X"], [y for _, y in splits]
+
+    # The splits are given, so candidates are scored on val rather than by cross-validation
+    def fit(C: float):
+        clf = LogisticRegression(C=C, class_weight="balanced", max_iter=5000).fit(X_train, y_train)
+        return float(np.mean(clf.predict(X_val) == y_val)), C, clf
+
+    if args.search:
+        scored = Parallel(n_jobs=args.jobs)(delayed(fit)(C) for C in EMOTION_C_GRID)
+        val_acc, best, clf = max(scored, key=lambda s: (s[0], -s[1]))
+        source = "search"
+    else:
+        params, source = shipped_params("emotion")
+        val_acc, best, clf = fit(params["C"])
+    artifact = {"clf": clf, "vectorizer": feats["vectorizer"], "model_type": "tfidf_lr"}
+    report = {
+        "data_hash": key, "cache_hit": hit, "samples": [len(t) for t, _ in splits], "features": X_train.shape[1],
+        "best_params": {"C": best}, "params_source": source, "val_accuracy": round(val_acc, 4),
+        "test_accuracy": round(float(np.mean(clf.predict(X_test) == y_test)), 4),
+    }
+    return "emotion_model.pkl", artifact, report
+
+
+# ================= HABIT =================
+def train_habit(args) -> Tuple[str, object, dict]:
+    if not args.habit_csv or not os.path.exists(args.habit_csv):
+        raise SystemExit(f"Habit dataset not found: {args.habit_csv!r} (set --habit-csv)")
+    # Five numeric columns: nothing to vectorize, so no feature cache
+    df = pd.read_csv(args.habit_csv)
+    missing = [c for c in HABIT_COLUMNS + [args.habit_target] if c not in df.columns]
+    if missing:
+        raise SystemExit(f"{args.habit_csv} is missing columns: {', '.join(missing)}")
+    df = df[HABIT_COLUMNS + [args.habit_target]].dropna()
+    X, y = df[HABIT_COLUMNS], df[args.habit_target].to_numpy(dtype=np.float64)
+
+    pipeline = Pipeline([("scaler", MinMaxScaler()), ("model", RandomForestRegressor(random_state=SEED))])
+    cv = KFold(5, shuffle=True, random_state=SEED)
+    if args.search:
+        grid, source = HABIT_GRID, "search"
+    else:
+        params, source = shipped_params("habit")
+        grid = {k: [v] for k, v in params.items()}
+    # A one-point grid when using the shipped params, so the report carries the same cv_mae either way
+    search = GridSearchCV(pipeline, grid, cv=cv, scoring="neg_mean_absolute_error", n_jobs=args.jobs)
+    search.fit(X, y)
+    report = {
+        "data_hash": hash_files([args.habit_csv]), "cache_hit": False, "samples": len(df),
+        "best_params": search.best_params_, "params_source": source, "cv_mae": round(-search.best_score_, 4),
+    }
+    return "mood_score_model.pkl", search.best_estimator_, report
+
+
+# ================= RUN =================
+TRAINERS = {"emotion": train_emotion, "intent": train_intent, "habit": train_habit}
+
+
+def save(kind: str, filename: str, artifact, report: dict, out_dir: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, filename)
+    if kind == "emotion":
+        with open(path, "wb") as f:
+            pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+        joblib.dump(artifact, path)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"kind": kind, "sklearn": sklearn.__version__, **report}, f, indent=2)
+    return path
+
+
+def run(args) -> List[str]:
+    kinds = list(TRAINERS) if args.kind == "all" else [args.kind]
+    written = []
+    for kind in kinds:
+        t0 = time.perf_counter()
+        filename, artifact, report = TRAINERS[kind](args)
+        report["train_s"] = round(time.perf_counter() - t0, 2)
+        path = save(kind, filename, artifact, report, args.out_dir)
+        written.append(path)
+        print(f"{kind}: {path} in {report['train_s']}s (feature cache {'hit' if report['cache_hit'] else 'miss'})")
+        print("  " + json.dumps({k: v for k, v in report.items() if k not in ("data_hash", "cache_hit", "train_s")}))
+        if args.register:
+            from model_registry import REGISTRY
+            REGISTRY.register(kind, path, args.register, f"train_models.py {json.dumps(report['best_params'])}",
+                              extra_files=[path + ".json"])
+            print(f"  registered as {kind} {args.register}")
+    return written
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Train the emotion / intent / habit models from source data.")
+    p.add_argument("kind", choices=["all", *TRAINERS])
+    p.add_argument("--out-dir", default=OUT_DIR)
+    p.add_argument("--search", action="store_true", help="grid-search hyperparameters instead of reusing the shipped ones")
+    p.add_argument("--jobs", type=int, default=-1, help="parallel hyperparameter fits (-1: all cores)")
+    p.add_argument("--emotion-dir", default=BASE_DIR, help="folder with train.txt / val.txt / test.txt")
+    p.add_argument("--habit-csv", default=os.getenv("HABIT_DATASET"))
+    p.add_argument("--habit-target", default=HABIT_TARGET)
+    p.add_argument("--refresh", action="store_true", help="rebuild cached feature matrices")
+    p.add_argument("--register", metavar="VERSION", help="also register each artifact in the model registry")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())